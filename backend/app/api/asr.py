@@ -1,72 +1,368 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response, WebSocket, WebSocketDisconnect, \
+    UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 from ..db import database, models
-from ..schemas.asr import ASRTaskCreate, ASRTaskOut, ASRResultOut
-from ..services import asr_service
+from ..schemas.asr import ASRTaskCreate, ASRTaskOut, ASRResultOut, ASRBatchCreate, TaskGroupOut, TaskGroupResultItem
+from ..schemas.summary import SummaryOptions
+from ..services import result_cache, job_queue, asr_jobs, summary_jobs, summary_service, scheduling, punctuation, \
+    llm_client
+from ..services.task_events import broker
+from ..services.live_asr import LiveSession
+from .audio import save_upload, SUPPORTED_EXTS
+from .listing import PageParams, TaskFilters, paginate
+from datetime import datetime
+import asyncio
 import json
+import os
 
 router = APIRouter(prefix="/asr", tags=["语音识别任务"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
+async def get_db():
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def get_submitter(request: Request, x_submitter: Optional[str] = Header(None)) -> str:
+    # 提交方标识：优先使用请求头，其次客户端地址
+    return x_submitter or (request.client.host if request.client else "anonymous")
+
+def _check_options(model_params: Optional[dict], priority: str, auto_summary: Optional[SummaryOptions]):
+    """校验任务参数，不合法时返回400"""
+    if priority not in scheduling.PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"不支持的优先级: {priority}")
+    if auto_summary and auto_summary.algo not in summary_service.SUMMARY_ALGOS:
+        raise HTTPException(status_code=400, detail=f"不支持的摘要算法: {auto_summary.algo}")
+    try:
+        punctuation.split_params(model_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _create_tasks(db: Session, audios: List[models.AudioFile], model_name: str, model_params: Optional[dict],
+                  priority: str, submitter: str, group: Optional[models.TaskGroup] = None,
+                  auto_summary: Optional[SummaryOptions] = None) -> List[models.ASRTask]:
+    """创建识别任务并写入队列，由调用方提交事务；接口中经AsyncSession.run_sync调用
+
+    按音频内容+模型配置查缓存，命中的直接生成已完成的任务和结果；其余任务和队列记录在同一事务中写入，
+    进程重启不会丢失。带auto_summary的任务识别完成后自动排队生成摘要，缓存命中的任务立即排队。
+    """
+    _check_options(model_params, priority, auto_summary)
+    # 摘要参数随任务保存，去掉密钥
+    summary_options = dict(auto_summary.dict(), config=llm_client.strip_secrets(auto_summary.config)) \
+        if auto_summary else None
+    keys = {}
+    if result_cache.CACHE_ENABLED:
+        for audio in audios:
+            if audio.content_hash:
+                keys[audio] = result_cache.make_key(audio.content_hash, model_name, model_params)
+    cached = result_cache.lookup_many(db, keys.values())
+    delay = 0.0
+    if any(keys.get(a) not in cached for a in audios):
+        admitted, delay, backlog = scheduling.admit(db, priority)
+        if not admitted:
+            raise HTTPException(status_code=429, detail=f"任务积压过多（预计{backlog:.0f}秒），请稍后再试",
+                                headers={"Retry-After": str(int(backlog - scheduling.ADMISSION_MAX_BACKLOG) + 1)})
+    params_json = json.dumps(model_params or {})
+    now = datetime.utcnow()
+    tasks = []
+    for audio in audios:
+        db_task = models.ASRTask(
+            audio_file=audio,
+            group=group,
+            model_name=model_name,
+            model_params=params_json,
+            submitter=submitter,
+            priority=priority,
+            status="pending",
+            progress=0.0,
+            summary_options=summary_options
+        )
+        entry = cached.get(keys.get(audio))
+        if entry:
+            db_task.status = "finished"
+            db_task.progress = 1.0
+            db_task.start_time = db_task.finish_time = now
+            db_task.result = models.ASRResult(recognized_text=entry.recognized_text, segments=entry.segments or None)
+        tasks.append(db_task)
+    db.add_all(tasks)
+    db.flush()
+    for db_task in tasks:
+        if db_task.status == "pending":
+            asr_jobs.enqueue_asr_task(db, db_task, delay=delay)
+        else:
+            summary_jobs.chain_summary(db, db_task)
+    return tasks
+
+async def _load_audios(db: AsyncSession, audio_file_ids: List[int]) -> List[models.AudioFile]:
+    found = {a.id: a for a in await db.scalars(
+        select(models.AudioFile).where(models.AudioFile.id.in_(set(audio_file_ids))))}
+    missing = [i for i in audio_file_ids if i not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"音频文件不存在: {missing}")
+    return [found[i] for i in audio_file_ids]
+
+async def _fill_hashes(audios: List[models.AudioFile]):
+    """旧记录没有内容哈希时在线程池中计算并回填，随任务一起提交，不在事件循环里读文件"""
+    if not result_cache.CACHE_ENABLED:
+        return
+    for audio in audios:
+        if not audio.content_hash:
+            try:
+                audio.content_hash = await run_in_threadpool(result_cache.hash_file, audio.filepath)
+            except OSError:
+                pass
 
 @router.post("/submit", response_model=ASRTaskOut)
-def submit_asr(task: ASRTaskCreate, db: Session = Depends(get_db)):
-    audio = db.query(models.AudioFile).filter(models.AudioFile.id == task.audio_file_id).first()
-    if not audio:
-        raise HTTPException(status_code=404, detail="音频文件不存在")
-    db_task = models.ASRTask(
-        audio_file_id=task.audio_file_id,
-        model_name=task.model_name,
-        model_params=json.dumps(task.model_params or {}),
-        status="pending",
-        progress=0.0
-    )
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
-    task_id = db_task.id
-    # 提交异步任务
-    future = asr_service.submit_asr_task(audio.filepath, task.model_name, task.model_params)
-    # 回调中用独立Session
-    def callback(fut):
-        try:
-            text = fut.result()
-            with database.SessionLocal() as db2:
-                db_task2 = db2.query(models.ASRTask).filter(models.ASRTask.id == task_id).first()
-                db_task2.status = "finished"
-                db_task2.progress = 1.0
-                result = models.ASRResult(task_id=db_task2.id, recognized_text=text)
-                db2.add(result)
-                db2.commit()
-        except Exception as e:
-            with database.SessionLocal() as db2:
-                db_task2 = db2.query(models.ASRTask).filter(models.ASRTask.id == task_id).first()
-                db_task2.status = "failed"
-                db2.commit()
-    future.add_done_callback(callback)
+async def submit_asr(task: ASRTaskCreate, db: AsyncSession = Depends(get_db),
+                     submitter: str = Depends(get_submitter)):
+    audios = await _load_audios(db, [task.audio_file_id])
+    await _fill_hashes(audios)
+    db_task, = await db.run_sync(_create_tasks, audios, task.model_name, task.model_params, task.priority,
+                                 task.submitter or submitter, auto_summary=task.auto_summary)
+    await db.commit()
+    job_queue.notify()
     return db_task
 
+# 单次批量提交的音频数上限
+BATCH_SUBMIT_MAX = int(os.getenv("ASR_BATCH_SUBMIT_MAX", "500"))
+
+async def _create_group(db: AsyncSession, audios: List[models.AudioFile], model_name: str,
+                        model_params: Optional[dict], priority: str, submitter: str,
+                        auto_summary: Optional[SummaryOptions] = None) -> dict:
+    """创建任务分组及组内任务，提交事务后返回分组汇总"""
+    await _fill_hashes(audios)
+    def create(sync_db: Session) -> models.TaskGroup:
+        group = models.TaskGroup(submitter=submitter, model_name=model_name, total=len(audios))
+        sync_db.add(group)
+        _create_tasks(sync_db, audios, model_name, model_params, priority, submitter, group=group,
+                      auto_summary=auto_summary)
+        return group
+    group = await db.run_sync(create)
+    await db.commit()
+    job_queue.notify()
+    return await db.run_sync(_group_out, group)
+
+@router.post("/submit/batch", response_model=TaskGroupOut)
+async def submit_asr_batch(batch: ASRBatchCreate, db: AsyncSession = Depends(get_db),
+                           submitter: str = Depends(get_submitter)):
+    """一次提交多个音频，所有任务在一个事务中写入，返回任务分组"""
+    if not batch.audio_file_ids:
+        raise HTTPException(status_code=400, detail="音频文件列表为空")
+    if len(batch.audio_file_ids) > BATCH_SUBMIT_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多提交{BATCH_SUBMIT_MAX}个音频")
+    audios = await _load_audios(db, batch.audio_file_ids)
+    return await _create_group(db, audios, batch.model_name, batch.model_params, batch.priority,
+                               batch.submitter or submitter, auto_summary=batch.auto_summary)
+
+@router.post("/upload_submit", response_model=TaskGroupOut)
+async def upload_and_submit(files: List[UploadFile] = File(...), model_name: str = Form(...),
+                            model_params: str = Form("{}"), priority: str = Form("normal"),
+                            auto_summary: Optional[str] = Form(None),
+                            db: AsyncSession = Depends(get_db), submitter: str = Depends(get_submitter)):
+    """上传多个音频并立即提交识别，音频记录和识别任务在一个事务中写入
+
+    model_params、auto_summary为JSON字符串，含义与 /asr/submit 相同；参数在保存文件前校验。
+    """
+    if len(files) > BATCH_SUBMIT_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多提交{BATCH_SUBMIT_MAX}个音频")
+    for file in files:
+        if not file.filename.lower().endswith(SUPPORTED_EXTS):
+            raise HTTPException(status_code=400, detail=f"不支持的音频格式: {file.filename}")
+    try:
+        params = json.loads(model_params or "{}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="模型参数不是合法的JSON")
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="模型参数必须是JSON对象")
+    summary = None
+    if auto_summary:
+        try:
+            summary = SummaryOptions(**json.loads(auto_summary))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="自动摘要参数不合法")
+    _check_options(params, priority, summary)
+    audios = [await save_upload(file) for file in files]
+    db.add_all(audios)
+    return await _create_group(db, audios, model_name, params, priority, submitter, auto_summary=summary)
+
+def _group_out(db: Session, group: models.TaskGroup, with_tasks: bool = False) -> dict:
+    """汇总分组内任务的状态和进度，只做聚合查询，不加载全部任务"""
+    task = models.ASRTask
+    rows = db.query(task.status, func.count(task.id), func.sum(task.progress), func.max(task.finish_time)) \
+        .filter(task.group_id == group.id).group_by(task.status).all()
+    counts = {status: n for status, n, _, _ in rows}
+    done = counts.get("finished", 0) + counts.get("failed", 0)
+    total = sum(counts.values())
+    progress = sum(n if status in ("finished", "failed") else (p or 0.0) for status, n, p, _ in rows)
+    if done < total:
+        status = "running" if counts.get("running") or done else "pending"
+        finish_time = None
+    else:
+        status = "failed" if counts.get("failed") else "finished"
+        finish_time = max((f for _, _, _, f in rows if f), default=None)
+    tasks = db.query(task).filter(task.group_id == group.id).order_by(task.id).all() if with_tasks else []
+    return dict(id=group.id, submitter=group.submitter, model_name=group.model_name, total=group.total,
+                create_time=group.create_time, status=status, progress=round(progress / total, 4) if total else 0.0,
+                counts=counts, finish_time=finish_time, tasks=tasks)
+
+async def _get_group(db: AsyncSession, group_id: int) -> models.TaskGroup:
+    group = await db.get(models.TaskGroup, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="任务分组不存在")
+    return group
+
+@router.get("/group/{group_id}", response_model=TaskGroupOut)
+async def get_group_progress(group_id: int, with_tasks: bool = False, db: AsyncSession = Depends(get_db)):
+    """分组的汇总进度，with_tasks=true时附带各任务状态"""
+    return await db.run_sync(_group_out, await _get_group(db, group_id), with_tasks=with_tasks)
+
+@router.get("/group/{group_id}/results", response_model=List[TaskGroupResultItem])
+async def get_group_results(group_id: int, db: AsyncSession = Depends(get_db)):
+    await _get_group(db, group_id)
+    rows = (await db.execute(
+        select(models.ASRTask.id, models.ASRTask.audio_file_id, models.AudioFile.filename,
+               models.ASRTask.status, models.ASRResult.recognized_text)
+        .outerjoin(models.AudioFile, models.AudioFile.id == models.ASRTask.audio_file_id)
+        .outerjoin(models.ASRResult, models.ASRResult.task_id == models.ASRTask.id)
+        .where(models.ASRTask.group_id == group_id).order_by(models.ASRTask.id))).all()
+    return [TaskGroupResultItem(task_id=r[0], audio_file_id=r[1], filename=r[2], status=r[3], recognized_text=r[4])
+            for r in rows]
+
 @router.get("/list", response_model=List[ASRTaskOut])
-def list_asr_tasks(db: Session = Depends(get_db)):
+async def list_asr_tasks(response: Response, filters: TaskFilters = Depends(), page: PageParams = Depends(),
+                         db: AsyncSession = Depends(get_db)):
     # 只返回 audio_file_id 不为 None 的任务，防止脏数据导致响应校验失败
-    return db.query(models.ASRTask).filter(models.ASRTask.audio_file_id != None).all()
+    query = filters.apply(select(models.ASRTask)).where(models.ASRTask.audio_file_id.isnot(None))
+    return await paginate(db, query, models.ASRTask.id, page, response)
+
+@router.get("/cache/stats")
+async def get_cache_stats(db: AsyncSession = Depends(get_db)):
+    return await db.run_sync(result_cache.stats)
 
 @router.get("/progress/{task_id}", response_model=ASRTaskOut)
-def get_task_progress(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(models.ASRTask).filter(models.ASRTask.id == task_id).first()
+async def get_task_progress(task_id: int, db: AsyncSession = Depends(get_db)):
+    task = await db.get(models.ASRTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     return task
 
 @router.get("/result/{task_id}", response_model=ASRResultOut)
-def get_asr_result(task_id: int, db: Session = Depends(get_db)):
-    result = db.query(models.ASRResult).filter(models.ASRResult.task_id == task_id).first()
+async def get_asr_result(task_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.scalar(select(models.ASRResult).where(models.ASRResult.task_id == task_id))
     if not result:
         raise HTTPException(status_code=404, detail="结果不存在")
-    return result 
\ No newline at end of file
+    return result
+
+# 无事件时的保活间隔（秒），超时后才回查一次数据库，防止任务在其他进程中完成而错过final事件
+STREAM_IDLE_SECONDS = 15
+
+async def _load_final_event(task_id: int):
+    async with database.AsyncSessionLocal() as db:
+        task = await db.get(models.ASRTask, task_id, options=[selectinload(models.ASRTask.result)])
+        if not task:
+            return None, False
+        if task.status == "finished":
+            text = task.result.recognized_text if task.result else ""
+            return {"type": "final", "status": "finished", "text": text or ""}, True
+        if task.status == "failed":
+            return {"type": "final", "status": "failed"}, True
+        return None, True
+
+async def _task_events(task_id: int):
+    """任务事件流：先回放已识别的片段，然后实时推送，直到final事件"""
+    sub = broker.subscribe(task_id)
+    try:
+        final, exists = await _load_final_event(task_id)
+        if not exists:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if final:
+            yield final
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=STREAM_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                final, _ = await _load_final_event(task_id)
+                if final:
+                    yield final
+                    return
+                yield {"type": "ping"}
+                continue
+            yield event
+            if event.get("type") == "final":
+                return
+    finally:
+        broker.unsubscribe(task_id, sub)
+
+@router.get("/stream/{task_id}")
+async def stream_asr_result(task_id: int):
+    """以Server-Sent Events推送识别片段和最终结果"""
+    events = _task_events(task_id)
+    # 先取第一条事件，任务不存在时能直接返回404
+    first = await events.__anext__()
+
+    async def sse():
+        event = first
+        try:
+            while True:
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event["type"] == "final":
+                    return
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    return
+        finally:
+            await events.aclose()
+    return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.websocket("/live")
+async def live_asr(websocket: WebSocket, model_name: str = "funasr", model_params: str = "{}"):
+    """实时识别：客户端发送16kHz单声道s16le PCM二进制帧，发送文本"end"结束会话
+
+    服务端返回 {"type": "partial"|"final", "start", "end", "text"}，最后返回 {"type": "end"}。
+    """
+    await websocket.accept()
+    try:
+        params = json.loads(model_params or "{}")
+        session = await run_in_threadpool(LiveSession, model_name, params)
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"模型加载失败: {e}"})
+        await websocket.close(code=1011)
+        return
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                events = await run_in_threadpool(session.feed, message["bytes"])
+            elif (message.get("text") or "").strip() == "end":
+                for event in await run_in_threadpool(session.flush):
+                    await websocket.send_json(event)
+                await websocket.send_json({"type": "end"})
+                await websocket.close()
+                return
+            else:
+                continue
+            for event in events:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
+@router.websocket("/ws/{task_id}")
+async def websocket_asr_result(websocket: WebSocket, task_id: int):
+    """以WebSocket推送识别片段和最终结果"""
+    await websocket.accept()
+    try:
+        async for event in _task_events(task_id):
+            await websocket.send_json(event)
+        await websocket.close()
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=1008)
+    except WebSocketDisconnect:
+        pass
@@ -1,59 +1,108 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import datetime
 import os
-import shutil
+import uuid
+import hashlib
+import aiofiles
+import aiofiles.os
 from ..db import database, models
 from ..schemas.audio import AudioFileOut
+from ..services.audio_probe import probe_audio
+from ..services.audio_cache import remove_decoded
+from .listing import PageParams, paginate
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/audio", tags=["音频管理"])
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+SUPPORTED_EXTS = (".wav", ".mp3", ".flac")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def get_db():
-    db = database.SessionLocal()
-    try:
+async def get_db():
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 class UploadResponse(BaseModel):
     id: int
     filename: str
     filepath: str
 
+async def save_upload(file: UploadFile) -> models.AudioFile:
+    """分块写入上传文件并同时计算sha256，按内容寻址存储，相同内容只保留一份"""
+    ext = os.path.splitext(file.filename)[1].lower()
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}{ext}")
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+        content_hash = sha.hexdigest()
+        save_dir = os.path.join(UPLOAD_DIR, content_hash[:2])
+        save_path = os.path.join(save_dir, content_hash + ext)
+        await aiofiles.os.makedirs(save_dir, exist_ok=True)
+        if await aiofiles.os.path.exists(save_path):
+            await aiofiles.os.remove(tmp_path)
+        else:
+            await aiofiles.os.replace(tmp_path, save_path)
+    except Exception:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+        raise
+    duration, samplerate = await run_in_threadpool(probe_audio, save_path)
+    return models.AudioFile(filename=file.filename, filepath=save_path, content_hash=content_hash,
+                            size=size, duration=duration, samplerate=samplerate)
+
 @router.post("/upload", response_model=List[UploadResponse])
-def upload_audio(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
-    responses = []
+async def upload_audio(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_db)):
     for file in files:
-        if not file.filename.lower().endswith((".wav", ".mp3", ".flac")):
+        if not file.filename.lower().endswith(SUPPORTED_EXTS):
             raise HTTPException(status_code=400, detail=f"不支持的音频格式: {file.filename}")
-        save_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        # 这里只做简单示例，实际可用音频库提取时长/采样率
-        audio_obj = models.AudioFile(filename=file.filename, filepath=save_path)
-        db.add(audio_obj)
-        db.commit()
-        db.refresh(audio_obj)
-        responses.append(UploadResponse(id=audio_obj.id, filename=audio_obj.filename, filepath=audio_obj.filepath))
-    return responses
+    audio_objs = [await save_upload(file) for file in files]
+    # 多文件上传在一个事务中写入
+    db.add_all(audio_objs)
+    await db.commit()
+    return [UploadResponse(id=a.id, filename=a.filename, filepath=a.filepath) for a in audio_objs]
 
 @router.get("/list", response_model=List[AudioFileOut])
-def list_audio(db: Session = Depends(get_db)):
-    return db.query(models.AudioFile).all()
+async def list_audio(response: Response, filename: Optional[str] = None, content_hash: Optional[str] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    query = select(models.AudioFile)
+    if filename:
+        query = query.where(models.AudioFile.filename.contains(filename))
+    if content_hash:
+        query = query.where(models.AudioFile.content_hash == content_hash)
+    if since:
+        query = query.where(models.AudioFile.upload_time >= since)
+    if until:
+        query = query.where(models.AudioFile.upload_time < until)
+    return await paginate(db, query, models.AudioFile.id, page, response)
 
 @router.delete("/delete/{audio_id}")
-def delete_audio(audio_id: int, db: Session = Depends(get_db)):
-    audio = db.query(models.AudioFile).filter(models.AudioFile.id == audio_id).first()
+async def delete_audio(audio_id: int, db: AsyncSession = Depends(get_db)):
+    audio = await db.get(models.AudioFile, audio_id)
     if not audio:
         raise HTTPException(status_code=404, detail="音频文件不存在")
-    try:
-        os.remove(audio.filepath)
-    except Exception:
-        pass
-    db.delete(audio)
-    db.commit()
+    # 相同内容的文件可能被多条记录共享，最后一条记录删除时才删除文件
+    shared = await db.scalar(select(models.AudioFile.id).where(
+        models.AudioFile.filepath == audio.filepath, models.AudioFile.id != audio.id).limit(1))
+    if not shared:
+        try:
+            await aiofiles.os.remove(audio.filepath)
+        except Exception:
+            pass
+        await run_in_threadpool(remove_decoded, audio.filepath)
+    await db.delete(audio)
+    await db.commit()
     return {"msg": "删除成功"} 
\ No newline at end of file
@@ -1,35 +1,83 @@
 from fastapi import APIRouter, HTTPException, Depends, Response
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
 from ..db import database, models
-import json
+from ..services import subtitles, bulk_export
+from .listing import TaskFilters
 
 router = APIRouter(prefix="/export", tags=["结果导出"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
+# 导出格式 -> (媒体类型, 扩展名)
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "json": ("application/json", "json"),
+    "srt": ("application/x-subrip; charset=utf-8", "srt"),
+    "vtt": ("text/vtt", "vtt"),
+}
+
+async def get_db():
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.get("/result/{task_id}")
-def export_result(task_id: int, format: str = "txt", db: Session = Depends(get_db)):
-    result = db.query(models.ASRResult).filter(models.ASRResult.task_id == task_id).first()
+async def export_result(task_id: int, format: str = "txt", db: AsyncSession = Depends(get_db)):
+    """导出识别结果：txt全文；json含摘要和句级时间戳；srt/vtt按句生成字幕
+
+    没有时间戳的旧结果整段作为一条字幕，时长取音频时长。
+    """
+    result = await db.scalar(select(models.ASRResult).where(models.ASRResult.task_id == task_id))
     if not result:
         raise HTTPException(status_code=404, detail="结果不存在")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式")
+    media_type, ext = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f"attachment; filename=asr_{task_id}.{ext}"}
     if format == "txt":
-        content = result.recognized_text or ""
-        return Response(content, media_type="text/plain", headers={"Content-Disposition": f"attachment; filename=asr_{task_id}.txt"})
-    elif format == "json":
-        data = {
+        return Response(result.recognized_text or "", media_type=media_type, headers=headers)
+    segments = result.segments
+    if not segments:
+        duration = await db.scalar(select(models.AudioFile.duration).join(
+            models.ASRTask, models.ASRTask.audio_file_id == models.AudioFile.id).where(models.ASRTask.id == task_id))
+        segments = subtitles.fallback_segments(result.recognized_text, duration)
+    if format == "json":
+        header = {
             "recognized_text": result.recognized_text,
             "summary": result.summary,
             "summary_algo": result.summary_algo
         }
-        return Response(json.dumps(data, ensure_ascii=False), media_type="application/json", headers={"Content-Disposition": f"attachment; filename=asr_{task_id}.json"})
+        parts = subtitles.iter_json(header, segments)
     elif format == "srt":
-        # 简单SRT格式占位
-        srt_content = f"1\n00:00:00,000 --> 00:00:10,000\n{result.recognized_text or ''}\n"
-        return Response(srt_content, media_type="text/plain", headers={"Content-Disposition": f"attachment; filename=asr_{task_id}.srt"})
+        parts = subtitles.iter_srt(segments)
     else:
-        raise HTTPException(status_code=400, detail="不支持的导出格式") 
\ No newline at end of file
+        parts = subtitles.iter_vtt(segments)
+    return StreamingResponse(subtitles.buffered(parts), media_type=media_type, headers=headers)
+
+@router.get("/bulk")
+async def export_bulk(format: str = "zip", include: Optional[str] = None, task_ids: Optional[str] = None,
+                filters: TaskFilters = Depends()):
+    """批量导出识别结果，边查询边输出，内存占用与导出数量无关
+
+    format: zip（每个结果若干文件）或 jsonl（每个结果一行）
+    include: 逗号分隔的导出内容 text、summary、segments、srt、vtt，默认zip为text,summary,srt，jsonl为text,summary,segments
+    task_ids: 逗号分隔的任务ID；其余过滤条件与任务列表相同（model_name、since、until等）
+    """
+    if format not in bulk_export.FORMATS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式")
+    try:
+        contents = bulk_export.parse_contents(include, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        ids = [int(v) for v in task_ids.split(",") if v.strip()] if task_ids else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="任务ID格式错误")
+    batches = bulk_export.iter_batches(filters, ids, contents)
+    filename = f"asr_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if format == "jsonl":
+        return StreamingResponse(bulk_export.iter_jsonl(batches, contents), media_type="application/x-ndjson",
+                                 headers=headers)
+    return StreamingResponse(bulk_export.iter_zip(batches, contents), media_type="application/zip", headers=headers)
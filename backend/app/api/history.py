@@ -1,42 +1,94 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from datetime import datetime
 from ..db import database, models
 from ..schemas.asr import ASRTaskOut, ASRResultOut
+from ..services import search_index, job_queue, asr_jobs
+from .listing import PageParams, TaskFilters, paginate, MAX_LIMIT
 
 router = APIRouter(prefix="/history", tags=["历史记录"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
+async def get_db():
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.get("/tasks", response_model=List[ASRTaskOut])
-def list_tasks(db: Session = Depends(get_db)):
-    return db.query(models.ASRTask).all()
+async def list_tasks(response: Response, filters: TaskFilters = Depends(), page: PageParams = Depends(),
+                     db: AsyncSession = Depends(get_db)):
+    return await paginate(db, filters.apply(select(models.ASRTask)), models.ASRTask.id, page, response)
+
+# 列表默认不返回的大文本列
+RESULT_TEXT_COLUMNS = ("recognized_text", "summary", "segments")
 
 @router.get("/results", response_model=List[ASRResultOut])
-def list_results(db: Session = Depends(get_db)):
-    return db.query(models.ASRResult).all()
+async def list_results(response: Response, task_id: Optional[int] = None, audio_file_id: Optional[int] = None,
+                       model_name: Optional[str] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, include_text: bool = False, page: PageParams = Depends(),
+                       db: AsyncSession = Depends(get_db)):
+    """识别结果列表，默认不返回识别文本、摘要和时间戳，include_text=true时返回全文"""
+    result = models.ASRResult
+    if include_text:
+        query = select(result)
+    else:
+        # 只查询需要的列，大文本不会被读出
+        query = select(*[col for col in result.__table__.columns if col.name not in RESULT_TEXT_COLUMNS])
+    if task_id is not None:
+        query = query.filter(result.task_id == task_id)
+    if audio_file_id is not None or model_name:
+        query = query.join(models.ASRTask, models.ASRTask.id == result.task_id)
+        if audio_file_id is not None:
+            query = query.filter(models.ASRTask.audio_file_id == audio_file_id)
+        if model_name:
+            query = query.filter(models.ASRTask.model_name == model_name)
+    if since:
+        query = query.filter(result.create_time >= since)
+    if until:
+        query = query.filter(result.create_time < until)
+    rows = await paginate(db, query, result.id, page, response)
+    if include_text:
+        return rows
+    omitted = dict.fromkeys(RESULT_TEXT_COLUMNS)
+    return [dict(row._asdict(), **omitted) for row in rows]
+
+@router.get("/search")
+async def search_results(q: str, field: str = "all", model_name: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         limit: int = Query(20, ge=1), offset: int = Query(0, ge=0),
+                         db: AsyncSession = Depends(get_db)):
+    """全文检索识别文本和摘要
+
+    q中用双引号包含短语，多个词需同时匹配；field可选all、text、summary。
+    返回按相关度排序的结果和高亮片段。
+    """
+    if field not in ("all", "text", "summary"):
+        raise HTTPException(status_code=400, detail=f"不支持的检索字段: {field}")
+    try:
+        return await db.run_sync(search_index.search, q, field=field, model_name=model_name, since=since,
+                                 until=until, limit=min(limit, MAX_LIMIT), offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/task/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(models.ASRTask).filter(models.ASRTask.id == task_id).first()
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    task = await db.get(models.ASRTask, task_id, options=[selectinload(models.ASRTask.result)])
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     if task.result:
-        db.delete(task.result)
-    db.delete(task)
-    db.commit()
+        await db.delete(task.result)
+    await db.delete(task)
+    # 未完成的队列任务随任务一起删除，worker不会再去执行已删除的任务
+    await db.run_sync(job_queue.cancel, asr_jobs.JOB_KIND, [task_id])
+    await db.commit()
     return {"msg": "删除成功"}
 
 @router.delete("/result/{result_id}")
-def delete_result(result_id: int, db: Session = Depends(get_db)):
-    result = db.query(models.ASRResult).filter(models.ASRResult.id == result_id).first()
+async def delete_result(result_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.get(models.ASRResult, result_id)
     if not result:
         raise HTTPException(status_code=404, detail="结果不存在")
-    db.delete(result)
-    db.commit()
+    await db.delete(result)
+    await db.commit()
     return {"msg": "删除成功"} 
\ No newline at end of file
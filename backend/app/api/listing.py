@@ -0,0 +1,86 @@
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+from ..db import models
+import base64
+import json
+import os
+
+# 列表接口默认/最大分页大小
+DEFAULT_LIMIT = int(os.getenv("ASR_LIST_DEFAULT_LIMIT", "200"))
+MAX_LIMIT = int(os.getenv("ASR_LIST_MAX_LIMIT", "1000"))
+# 下一页游标通过响应头返回，保持列表响应体不变
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class PageParams:
+    """按主键的游标分页：翻页只走主键索引，不随偏移量变慢"""
+
+    def __init__(self, limit: int = Query(DEFAULT_LIMIT, ge=1), cursor: Optional[str] = None, order: str = "desc"):
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail=f"不支持的排序方式: {order}")
+        self.limit = min(limit, MAX_LIMIT)
+        self.order = order
+        self.after_id = decode_cursor(cursor) if cursor else None
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+async def paginate(db: AsyncSession, query: Select, id_column, page: PageParams, response: Response) -> list:
+    """取一页数据，多取一条判断是否还有下一页，有则在响应头中返回游标
+
+    select(模型)返回ORM对象，select(列...)返回Row。
+    """
+    descending = page.order == "desc"
+    if page.after_id is not None:
+        query = query.where(id_column < page.after_id if descending else id_column > page.after_id)
+    query = query.order_by(id_column.desc() if descending else id_column.asc()).limit(page.limit + 1)
+    result = await db.execute(query)
+    rows = list(result.scalars() if len(query.column_descriptions) == 1 else result)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
+
+def _split(value: Optional[str]):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+class TaskFilters:
+    """识别任务列表的过滤条件，status可用逗号分隔多个"""
+
+    def __init__(self, status: Optional[str] = None, model_name: Optional[str] = None,
+                 audio_file_id: Optional[int] = None, group_id: Optional[int] = None,
+                 submitter: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None):
+        self.status = _split(status)
+        self.model_name = model_name
+        self.audio_file_id = audio_file_id
+        self.group_id = group_id
+        self.submitter = submitter
+        self.since = since
+        self.until = until
+
+    def apply(self, query: Select) -> Select:
+        task = models.ASRTask
+        if self.status:
+            query = query.filter(task.status.in_(self.status))
+        if self.model_name:
+            query = query.filter(task.model_name == self.model_name)
+        if self.audio_file_id is not None:
+            query = query.filter(task.audio_file_id == self.audio_file_id)
+        if self.group_id is not None:
+            query = query.filter(task.group_id == self.group_id)
+        if self.submitter:
+            query = query.filter(task.submitter == self.submitter)
+        if self.since:
+            query = query.filter(task.submit_time >= self.since)
+        if self.until:
+            query = query.filter(task.submit_time < self.until)
+        return query
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.db.database import AsyncSessionLocal
 from app.db.models import ModelInfo
 from app.schemas.model import ModelInfoSchema, ModelRegisterSchema, ModelSwitchSchema, ModelConfigUpdateSchema
 from typing import List
@@ -8,118 +10,133 @@ from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
 import os
 import shutil
-import requests
+from app.services import model_download
 from app.services.model_manager import ModelManager
 
 router = APIRouter(prefix="/api/models", tags=["模型管理"])
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def _get_model(db: AsyncSession, id: int) -> ModelInfo:
+    model = await db.get(ModelInfo, id)
+    if not model:
+        raise HTTPException(status_code=404, detail="模型不存在")
+    return model
 
 @router.get("", response_model=List[ModelInfoSchema])
-def list_models(db: Session = Depends(get_db)):
-    models = db.query(ModelInfo).all()
-    return models
+async def list_models(db: AsyncSession = Depends(get_db)):
+    return (await db.scalars(select(ModelInfo))).all()
 
 @router.post("/download", response_model=ModelInfoSchema)
-def register_model(data: ModelRegisterSchema, db: Session = Depends(get_db)):
-    # 远程下载
+async def register_model(data: ModelRegisterSchema, db: AsyncSession = Depends(get_db)):
+    """注册模型；带remote_url时立即返回"下载中"的记录，文件在后台并行下载并校验，进度见progress字段"""
     local_path = data.local_path
     if data.remote_url:
-        filename = data.remote_url.split("/")[-1]
-        local_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "asr-models", data.name)
-        os.makedirs(local_dir, exist_ok=True)
-        local_path = os.path.join(local_dir, filename)
-        try:
-            with requests.get(data.remote_url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-            size = os.path.getsize(local_path)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"模型下载失败: {e}")
-    else:
-        size = data.size
+        local_path = model_download.local_path_for(data.name, data.remote_url)
     model = ModelInfo(
         name=data.name,
         display_name=data.display_name,
         type=data.type,
-        status="已加载",  # 简化：注册即视为可用
+        status=model_download.STATUS_DOWNLOADING if data.remote_url else "已加载",  # 简化：注册即视为可用
         local_path=local_path,
         config=data.config,
         version=data.version,
-        size=size
+        size=None if data.remote_url else data.size,
+        remote_url=data.remote_url,
+        sha256=data.sha256.lower() if data.sha256 else None,
+        progress=0.0 if data.remote_url else None
     )
     db.add(model)
     try:
-        db.commit()
-        db.refresh(model)
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="模型名称已存在")
+    if data.remote_url:
+        model_download.start(model.id, data.remote_url, local_path, model.sha256)
+    return model
+
+@router.post("/{id}/resume", response_model=ModelInfoSchema)
+async def resume_download(id: int, db: AsyncSession = Depends(get_db)):
+    """继续下载失败的模型，已完成的分段不会重新下载"""
+    model = await _get_model(db, id)
+    if not model.remote_url:
+        raise HTTPException(status_code=400, detail="模型没有下载地址")
+    if model_download.is_downloading(id):
+        raise HTTPException(status_code=400, detail="模型正在下载")
+    if model.status != model_download.STATUS_FAILED:
+        raise HTTPException(status_code=400, detail=f"模型{model.status}，无需下载")
+    model.status = model_download.STATUS_DOWNLOADING
+    model.error = None
+    await db.commit()
+    model_download.start(model.id, model.remote_url, model.local_path, model.sha256)
     return model
 
 @router.post("/switch")
-def switch_model(data: ModelSwitchSchema, db: Session = Depends(get_db)):
-    model = db.query(ModelInfo).filter(ModelInfo.id == data.id).first()
-    if not model:
-        raise HTTPException(status_code=404, detail="模型不存在")
+async def switch_model(data: ModelSwitchSchema, db: AsyncSession = Depends(get_db)):
+    model = await _get_model(db, data.id)
+    if model.status in (model_download.STATUS_DOWNLOADING, model_download.STATUS_FAILED):
+        raise HTTPException(status_code=400, detail=f"模型{model.status}，不能切换")
     # 这里可扩展为写入配置表/文件，或更新所有模型的status字段
-    # 简化：将所有同类型模型status设为"未激活"，当前设为"已激活"
-    db.query(ModelInfo).filter(ModelInfo.type == model.type).update({ModelInfo.status: "未激活"})
+    # 简化：将所有同类型模型status设为"未激活"，当前设为"已激活"；下载中和下载失败的模型保持原状态
+    await db.execute(update(ModelInfo).where(
+        ModelInfo.type == model.type,
+        ModelInfo.status.notin_([model_download.STATUS_DOWNLOADING, model_download.STATUS_FAILED])
+    ).values(status="未激活").execution_options(synchronize_session=False))
     model.status = "已激活"
-    db.commit()
+    await db.commit()
     return {"message": f"已切换到模型：{model.display_name}"}
 
+def _remove_path(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.isfile(path):
+        os.remove(path)
+
 @router.delete("/{id}")
-def delete_model(id: int, delete_file: bool = False, db: Session = Depends(get_db)):
-    model = db.query(ModelInfo).filter(ModelInfo.id == id).first()
-    if not model:
-        raise HTTPException(status_code=404, detail="模型不存在")
+async def delete_model(id: int, delete_file: bool = False, db: AsyncSession = Depends(get_db)):
+    model = await _get_model(db, id)
+    await model_download.cancel(id)
     if delete_file and model.local_path:
         try:
-            if os.path.isdir(model.local_path):
-                shutil.rmtree(model.local_path)
-            elif os.path.isfile(model.local_path):
-                os.remove(model.local_path)
+            await run_in_threadpool(_remove_path, model.local_path)
+            await model_download.remove_partial(model.local_path)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"文件删除失败: {e}")
-    db.delete(model)
-    db.commit()
+    await db.delete(model)
+    await db.commit()
     return {"message": "模型已删除"}
 
 @router.post("/{id}/load")
-def load_model(id: int, db: Session = Depends(get_db)):
-    model = db.query(ModelInfo).filter(ModelInfo.id == id).first()
-    if not model:
-        raise HTTPException(status_code=404, detail="模型不存在")
-    ok, msg = ModelManager.instance().load_model(model)
+async def load_model(id: int, db: AsyncSession = Depends(get_db)):
+    model = await _get_model(db, id)
+    if model.status in (model_download.STATUS_DOWNLOADING, model_download.STATUS_FAILED):
+        raise HTTPException(status_code=400, detail=f"模型{model.status}，不能加载")
+    # 加载模型耗时较长，在线程池中执行
+    ok, msg = await run_in_threadpool(ModelManager.instance().load_model, model)
     if not ok:
         raise HTTPException(status_code=400, detail=msg)
     return {"message": msg}
 
 @router.post("/{id}/unload")
-def unload_model(id: int, db: Session = Depends(get_db)):
-    model = db.query(ModelInfo).filter(ModelInfo.id == id).first()
-    if not model:
-        raise HTTPException(status_code=404, detail="模型不存在")
-    ok, msg = ModelManager.instance().unload_model(model)
+async def unload_model(id: int, db: AsyncSession = Depends(get_db)):
+    model = await _get_model(db, id)
+    ok, msg = await run_in_threadpool(ModelManager.instance().unload_model, model)
     if not ok:
         raise HTTPException(status_code=400, detail=msg)
     return {"message": msg}
 
 @router.patch("/{id}/config", response_model=ModelInfoSchema)
-def update_model_config(id: int, data: ModelConfigUpdateSchema, db: Session = Depends(get_db)):
-    model = db.query(ModelInfo).filter(ModelInfo.id == id).first()
-    if not model:
-        raise HTTPException(status_code=404, detail="模型不存在")
+async def update_model_config(id: int, data: ModelConfigUpdateSchema, db: AsyncSession = Depends(get_db)):
+    model = await _get_model(db, id)
     model.config = data.config
-    db.commit()
-    db.refresh(model)
-    return model 
\ No newline at end of file
+    await db.commit()
+    await db.refresh(model)
+    return model
+
+
+@router.get("/pool/stats")
+def model_pool_stats():
+    return ModelManager.instance().stats()
@@ -1,27 +1,78 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from datetime import datetime
 from ..db import database, models
-from ..schemas.summary import SummaryRequest, SummaryOut
-from ..services.summary_service import generate_summary
+from ..schemas.summary import SummaryRequest, SummaryOut, SummarySubmit, SummaryTaskOut
+from ..services import job_queue, summary_jobs
+from ..services.summary_service import generate_summary_async
+from .asr import get_submitter
+from .listing import PageParams, paginate
 
 router = APIRouter(prefix="/summary", tags=["摘要生成"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
+async def get_db():
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def _load_result(db: AsyncSession, task_id: int) -> models.ASRResult:
+    result = await db.scalar(select(models.ASRResult).where(models.ASRResult.task_id == task_id))
+    if not result:
+        raise HTTPException(status_code=404, detail="识别结果不存在")
+    return result
 
 @router.post("/generate", response_model=SummaryOut)
-def generate_summary_api(req: SummaryRequest, db: Session = Depends(get_db)):
-    task = db.query(models.ASRTask).filter(models.ASRTask.id == req.task_id).first()
+async def generate_summary_api(req: SummaryRequest, db: AsyncSession = Depends(get_db)):
+    result = await _load_result(db, req.task_id)
+    # 等待大模型响应前结束读事务，不占用数据库连接
+    await db.commit()
+    summary = await generate_summary_async(result.recognized_text or "", algo=req.algo, length=req.length,
+                                           detail=req.detail, config=req.config)
+    # 写入数据库
+    result.summary = summary
+    result.summary_algo = req.algo
+    await db.commit()
+    return SummaryOut(summary=summary, algo=req.algo, length=req.length, detail=req.detail)
+
+@router.post("/submit", response_model=SummaryTaskOut)
+async def submit_summary(req: SummarySubmit, db: AsyncSession = Depends(get_db),
+                         submitter: str = Depends(get_submitter)):
+    """提交后台摘要任务，立即返回任务；相同结果、相同参数的任务仍在排队或运行时返回已有任务
+
+    config中的api_key不随任务保存，任务运行时使用服务端配置的密钥（DOUBAO_API_KEY/LLM_API_KEY）。
+    """
+    task = await db.get(models.ASRTask, req.task_id, options=[selectinload(models.ASRTask.result)])
     if not task or not task.result:
         raise HTTPException(status_code=404, detail="识别结果不存在")
-    text = task.result.recognized_text or ""
-    summary = generate_summary(text, algo=req.algo, length=req.length, detail=req.detail, config=req.config)
-    # 写入数据库
-    task.result.summary = summary
-    task.result.summary_algo = req.algo
-    db.commit()
-    return SummaryOut(summary=summary, algo=req.algo, length=req.length, detail=req.detail) 
\ No newline at end of file
+    delay = max((req.run_after - datetime.utcnow()).total_seconds(), 0.0) if req.run_after else 0.0
+
+    def create(sync_db: Session) -> models.SummaryTask:
+        return summary_jobs.create_summary_task(sync_db, task, req.algo, req.length, req.detail, req.config,
+                                                submitter=req.submitter or submitter,
+                                                priority=req.priority, delay=delay)
+    try:
+        summary_task = await db.run_sync(create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    job_queue.notify()
+    return summary_task
+
+@router.get("/task/{summary_task_id}", response_model=SummaryTaskOut)
+async def get_summary_task(summary_task_id: int, db: AsyncSession = Depends(get_db)):
+    summary_task = await db.get(models.SummaryTask, summary_task_id)
+    if not summary_task:
+        raise HTTPException(status_code=404, detail="摘要任务不存在")
+    return summary_task
+
+@router.get("/tasks", response_model=List[SummaryTaskOut])
+async def list_summary_tasks(response: Response, task_id: Optional[int] = None, status: Optional[str] = None,
+                             page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    query = select(models.SummaryTask)
+    if task_id is not None:
+        query = query.where(models.SummaryTask.task_id == task_id)
+    if status:
+        query = query.where(models.SummaryTask.status == status)
+    return await paginate(db, query, models.SummaryTask.id, page, response)
@@ -0,0 +1,134 @@
+"""数据库结构版本管理
+
+类似Alembic的轻量迁移：schema_version表记录已应用的版本，启动时按顺序执行未应用的迁移。
+新增的表由create_all按模型创建；修改已有表（加列、加索引等）或创建模型之外的对象（如全文索引）时
+在MIGRATIONS末尾追加一项。新数据库同样会执行全部迁移，迁移函数应当可重复执行。
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from .models import Base
+
+logger = logging.getLogger(__name__)
+
+_version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', _version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String),
+    Column('applied_at', DateTime),
+)
+
+
+def add_missing_columns(conn: Connection, table_name: str):
+    """为已有表补齐模型中新增的列，新增列需可空或带服务端默认值"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        return
+    table = Base.metadata.tables[table_name]
+    existing = {col["name"] for col in inspector.get_columns(table_name)}
+    for column in table.columns:
+        if column.name not in existing:
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column.name} {col_type}'))
+            logger.info(f"新增列: {table_name}.{column.name}")
+
+
+def create_missing_indexes(conn: Connection, table_name: str):
+    for index in Base.metadata.tables[table_name].indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _baseline(conn: Connection):
+    # 版本管理之前的数据库：create_all不会修改已有表，补齐之前新增的列和索引
+    for table in Base.metadata.sorted_tables:
+        add_missing_columns(conn, table.name)
+        create_missing_indexes(conn, table.name)
+
+
+def _task_list_indexes(conn: Connection):
+    # 任务列表、结果查询按状态、音频和任务过滤
+    for table_name in ('asr_tasks', 'asr_results'):
+        create_missing_indexes(conn, table_name)
+
+
+def _result_fulltext_index(conn: Connection):
+    # 识别文本和摘要的全文索引，仅SQLite（FTS5）；其他数据库检索时使用LIKE
+    from ..services import search_index
+    if not search_index.is_supported(conn):
+        return
+    search_index.create_index(conn)
+    indexed = search_index.rebuild_index(conn)
+    if indexed:
+        logger.info(f"已建立识别结果全文索引: {indexed}条")
+
+
+def _result_segments(conn: Connection):
+    add_missing_columns(conn, 'asr_results')
+
+
+def _task_summary_options(conn: Connection):
+    add_missing_columns(conn, 'asr_tasks')
+
+
+def _model_download_columns(conn: Connection):
+    add_missing_columns(conn, 'model_info')
+
+
+def _strip_summary_secrets(conn: Connection):
+    # 之前保存的摘要配置中去掉密钥，去重用的options_key同样包含配置，一并重新计算
+    from ..services import llm_client, summary_jobs
+    rows = conn.execute(text("SELECT id, algo, length, detail, config FROM summary_tasks "
+                             "WHERE config IS NOT NULL")).fetchall()
+    for row in rows:
+        config = json.loads(row.config) if isinstance(row.config, str) else row.config
+        stripped = llm_client.strip_secrets(config)
+        if stripped != config:
+            conn.execute(text("UPDATE summary_tasks SET config = :config, options_key = :key WHERE id = :id"),
+                         {"id": row.id, "config": json.dumps(stripped, ensure_ascii=False),
+                          "key": summary_jobs.options_key(row.algo, row.length, row.detail, stripped)})
+    rows = conn.execute(text("SELECT id, summary_options FROM asr_tasks WHERE summary_options IS NOT NULL")).fetchall()
+    for row in rows:
+        options = json.loads(row.summary_options) if isinstance(row.summary_options, str) else row.summary_options
+        stripped = llm_client.strip_secrets((options or {}).get("config"))
+        if options and stripped != options.get("config"):
+            options = dict(options, config=stripped)
+            conn.execute(text("UPDATE asr_tasks SET summary_options = :options WHERE id = :id"),
+                         {"id": row.id, "options": json.dumps(options, ensure_ascii=False)})
+
+
+# (版本号, 说明, 迁移函数)，版本号递增，已发布的迁移不要修改
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "补齐版本管理之前新增的列和索引", _baseline),
+    (2, "asr_tasks.status/audio_file_id、asr_results.task_id索引", _task_list_indexes),
+    (3, "识别结果全文索引", _result_fulltext_index),
+    (4, "asr_results.segments句级时间戳", _result_segments),
+    (5, "asr_tasks.summary_options自动摘要参数", _task_summary_options),
+    (6, "model_info下载地址、校验值和下载进度", _model_download_columns),
+    (7, "摘要配置中去掉api_key", _strip_summary_secrets),
+]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).scalar() or 0
+
+
+def _stamp(conn: Connection, version: int, description: str):
+    conn.execute(schema_version.insert().values(version=version, description=description,
+                                                applied_at=datetime.utcnow()))
+
+
+def upgrade(engine: Engine):
+    with engine.begin() as conn:
+        schema_version.create(bind=conn, checkfirst=True)
+        Base.metadata.create_all(bind=conn)
+        applied = current_version(conn)
+        for version, description, migrate in MIGRATIONS:
+            if version <= applied:
+                continue
+            logger.info(f"执行数据库迁移 {version}: {description}")
+            migrate(conn)
+            _stamp(conn, version, description)
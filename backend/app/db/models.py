@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -11,29 +11,51 @@ class AudioFile(Base):
     filepath = Column(String, nullable=False)
     duration = Column(Float)
     samplerate = Column(Integer)
+    content_hash = Column(String, index=True)  # 文件内容sha256，相同内容只存一份
+    size = Column(Integer)
     upload_time = Column(DateTime, default=datetime.utcnow)
     tasks = relationship('ASRTask', back_populates='audio_file')
 
+class TaskGroup(Base):
+    __tablename__ = 'task_groups'
+    id = Column(Integer, primary_key=True, index=True)
+    submitter = Column(String)
+    model_name = Column(String)
+    total = Column(Integer, default=0)
+    create_time = Column(DateTime, default=datetime.utcnow)
+    tasks = relationship('ASRTask', back_populates='group')
+
 class ASRTask(Base):
     __tablename__ = 'asr_tasks'
     id = Column(Integer, primary_key=True, index=True)
-    audio_file_id = Column(Integer, ForeignKey('audio_files.id'))
+    audio_file_id = Column(Integer, ForeignKey('audio_files.id'), index=True)
+    group_id = Column(Integer, ForeignKey('task_groups.id'), index=True)  # 批量提交的分组
     model_name = Column(String, nullable=False)
     model_params = Column(Text)
-    status = Column(String, default='pending')  # pending, running, finished, failed
+    submitter = Column(String)                  # 提交方，用于公平调度
+    priority = Column(String, default='normal')  # 优先级：high, normal, low
+    status = Column(String, default='pending', index=True)  # pending, running, finished, failed
     progress = Column(Float, default=0.0)
+    segments_done = Column(Integer, default=0)
+    segments_total = Column(Integer)
+    processed_seconds = Column(Float, default=0.0)  # 已处理的音频时长（秒）
+    realtime_factor = Column(Float)                 # 实时率 = 处理耗时 / 音频时长
+    summary_options = Column(JSON)                  # 识别完成后自动生成摘要的参数，为空表示不生成
     submit_time = Column(DateTime, default=datetime.utcnow)
+    start_time = Column(DateTime)
     finish_time = Column(DateTime)
     result = relationship('ASRResult', uselist=False, back_populates='task')
     audio_file = relationship('AudioFile', back_populates='tasks')
+    group = relationship('TaskGroup', back_populates='tasks')
 
 class ASRResult(Base):
     __tablename__ = 'asr_results'
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey('asr_tasks.id'))
+    task_id = Column(Integer, ForeignKey('asr_tasks.id'), index=True)
     recognized_text = Column(Text)
     summary = Column(Text)
     summary_algo = Column(String)
+    segments = Column(JSON)  # 句级时间戳 [{"start", "end", "text", "words"?}]，单位秒
     export_formats = Column(String)  # 逗号分隔的格式
     create_time = Column(DateTime, default=datetime.utcnow)
     task = relationship('ASRTask', back_populates='result')
@@ -49,5 +71,67 @@ class ModelInfo(Base):
     config = Column(JSON)                               # 配置参数
     version = Column(String)
     size = Column(Integer)
+    remote_url = Column(String)                         # 下载地址
+    sha256 = Column(String)                             # 文件校验值，注册时指定则下载后校验
+    progress = Column(Float)                            # 下载进度 0~1
+    downloaded_size = Column(Integer)                   # 已下载字节数
+    error = Column(String)                              # 下载失败原因
+    create_time = Column(DateTime, default=datetime.utcnow)
+    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SummaryTask(Base):
+    __tablename__ = 'summary_tasks'
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey('asr_tasks.id'), index=True)
+    result_id = Column(Integer, ForeignKey('asr_results.id'), index=True)
+    algo = Column(String, nullable=False)
+    length = Column(Integer)
+    detail = Column(Integer)
+    config = Column(JSON)
+    options_key = Column(String)  # 归一化的(算法, 字数, 详细程度, 配置)，用于合并重复提交
+    submitter = Column(String)
+    priority = Column(String, default='normal')
+    status = Column(String, default='pending', index=True)  # pending, running, finished, failed
+    progress = Column(Float, default=0.0)
+    summary = Column(Text)
+    error = Column(Text)
+    submit_time = Column(DateTime, default=datetime.utcnow)
+    start_time = Column(DateTime)
+    finish_time = Column(DateTime)
+
+class TranscriptCache(Base):
+    __tablename__ = 'transcript_cache'
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, nullable=False, unique=True, index=True)  # sha256(音频哈希+模型+参数)
+    audio_hash = Column(String, nullable=False)
+    model_name = Column(String, nullable=False)
+    model_params = Column(Text)
+    recognized_text = Column(Text)
+    segments = Column(JSON)
+    size = Column(Integer, default=0)  # 缓存内容字节数
+    hits = Column(Integer, default=0)
+    create_time = Column(DateTime, default=datetime.utcnow)
+    last_access = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)                # 任务类型，如asr
+    ref_id = Column(Integer, nullable=False)             # 关联的业务记录ID，如asr_tasks.id
+    status = Column(String, nullable=False, default='pending')  # pending, running, finished, failed
+    priority = Column(Integer, nullable=False, default=0)       # 越大越优先
+    concurrency_key = Column(String)                     # 并发限制分组，如模型名
+    submitter = Column(String)                           # 提交方，同优先级内按提交方公平轮转
+    expected_seconds = Column(Float)                     # 预估工作量（音频时长），用于短作业优先
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    next_run_at = Column(DateTime, default=datetime.utcnow)     # 重试退避后的最早执行时间
+    lease_owner = Column(String)                         # 持有租约的worker
+    lease_expires_at = Column(DateTime)                  # 租约过期后任务可被其他worker接管
+    last_error = Column(Text)
     create_time = Column(DateTime, default=datetime.utcnow)
-    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_jobs_status_next_run', 'status', 'next_run_at'),
+        Index('ix_jobs_kind_ref', 'kind', 'ref_id'),
+    )
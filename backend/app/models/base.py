@@ -1,7 +1,32 @@
 from abc import ABC, abstractmethod
+from typing import Any, Dict, List
 
 class BaseASRModel(ABC):
     @abstractmethod
     def transcribe(self, audio_path: str, **kwargs) -> str:
-        """音频转写，返回识别文本"""
-        pass 
\ No newline at end of file
+        """音频转写，audio_path可以是文件路径或16kHz单声道float32数组，返回识别文本"""
+        pass
+
+    def transcribe_batch(self, audio_paths: List[str], **kwargs) -> List[str]:
+        """批量转写，默认逐个调用transcribe，支持批量输入的模型可重写"""
+        return [self.transcribe(path, **kwargs) for path in audio_paths]
+
+    def transcribe_timed(self, audio_path: str, **kwargs) -> Dict[str, Any]:
+        """带时间戳的转写，返回 {"text", "segments": [{"start", "end", "text", "words"?}, ...]}，时间单位为秒
+
+        默认没有时间戳（segments为空），能输出时间戳的模型应重写
+        """
+        return {"text": self.transcribe(audio_path, **kwargs), "segments": []}
+
+    def transcribe_timed_batch(self, audio_paths: List[str], **kwargs) -> List[Dict[str, Any]]:
+        return [self.transcribe_timed(path, **kwargs) for path in audio_paths]
+
+class BasePuncModel(ABC):
+    @abstractmethod
+    def punctuate(self, text: str, **kwargs) -> str:
+        """标点恢复，输入无标点（或标点不全）的识别文本，返回加标点后的文本"""
+        pass
+
+    def punctuate_batch(self, texts: List[str], **kwargs) -> List[str]:
+        """批量标点恢复，默认逐个调用punctuate，支持批量输入的模型可重写"""
+        return [self.punctuate(text, **kwargs) for text in texts]
@@ -1,9 +1,31 @@
 from .base import BaseASRModel
+from typing import Any, Dict, List
 from funasr import AutoModel
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _timed(result: Dict[str, Any]) -> Dict[str, Any]:
+    """FunASR输出转换为带时间戳的结果，FunASR的时间单位为毫秒
+
+    启用标点模型及sentence_timestamp时有句级信息sentence_info，否则只有逐字的timestamp，
+    整段作为一句，字数与时间戳数量一致时保留逐字时间戳。
+    """
+    text = result.get("text", "")
+    segments = []
+    for sentence in result.get("sentence_info") or []:
+        segments.append({"start": sentence["start"] / 1000, "end": sentence["end"] / 1000,
+                         "text": sentence.get("text", "").strip()})
+    timestamps = result.get("timestamp") or []
+    if not segments and timestamps and text:
+        segment = {"start": timestamps[0][0] / 1000, "end": timestamps[-1][1] / 1000, "text": text}
+        tokens = text.split()
+        if len(tokens) == len(timestamps):
+            segment["words"] = [{"start": start / 1000, "end": end / 1000, "word": token}
+                                for token, (start, end) in zip(tokens, timestamps)]
+        segments.append(segment)
+    return {"text": text, "segments": segments}
+
 class FunASRModel(BaseASRModel):
     def __init__(self, model_name="paraformer-zh", **kwargs):
         try:
@@ -16,4 +38,23 @@ class FunASRModel(BaseASRModel):
 
     def transcribe(self, audio_path: str, **kwargs) -> str:
         result = self.model.generate(input=audio_path, **kwargs)
-        return result[0]["text"] if result and "text" in result[0] else "" 
\ No newline at end of file
+        return result[0]["text"] if result and "text" in result[0] else ""
+
+    def transcribe_batch(self, audio_paths: List[str], **kwargs) -> List[str]:
+        # FunASR的generate支持列表输入，一次前向处理多个文件
+        results = self.model.generate(input=list(audio_paths), **kwargs)
+        texts = [r.get("text", "") if isinstance(r, dict) else "" for r in (results or [])]
+        if len(texts) != len(audio_paths):
+            raise RuntimeError(f"FunASR批量识别结果数量不匹配: {len(texts)}/{len(audio_paths)}")
+        return texts
+
+    def transcribe_timed(self, audio_path: str, **kwargs) -> Dict[str, Any]:
+        result = self.model.generate(input=audio_path, **kwargs)
+        return _timed(result[0]) if result and isinstance(result[0], dict) else {"text": "", "segments": []}
+
+    def transcribe_timed_batch(self, audio_paths: List[str], **kwargs) -> List[Dict[str, Any]]:
+        results = self.model.generate(input=list(audio_paths), **kwargs)
+        outputs = [_timed(r) if isinstance(r, dict) else {"text": "", "segments": []} for r in (results or [])]
+        if len(outputs) != len(audio_paths):
+            raise RuntimeError(f"FunASR批量识别结果数量不匹配: {len(outputs)}/{len(audio_paths)}")
+        return outputs
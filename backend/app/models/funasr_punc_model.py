@@ -0,0 +1,36 @@
+from .base import BasePuncModel
+from typing import List
+from funasr import AutoModel
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FunASRPuncModel(BasePuncModel):
+    def __init__(self, model_name="ct-punc", **kwargs):
+        try:
+            logger.info(f"FunASR标点模型加载: {model_name}")
+            self.model = AutoModel(model=model_name, disable_update=True, **kwargs)
+            logger.info(f"FunASR标点模型加载完成: {model_name}")
+        except Exception as e:
+            logger.error(f"FunASR标点模型加载失败: {e}")
+            raise
+
+    def punctuate(self, text: str, **kwargs) -> str:
+        if not text:
+            return text
+        result = self.model.generate(input=text, **kwargs)
+        return result[0]["text"] if result and "text" in result[0] else text
+
+    def punctuate_batch(self, texts: List[str], **kwargs) -> List[str]:
+        # 空文本不送入模型，其余文本一次前向处理
+        indexes = [i for i, text in enumerate(texts) if text]
+        if not indexes:
+            return list(texts)
+        results = self.model.generate(input=[texts[i] for i in indexes], **kwargs)
+        outputs = [r.get("text", "") if isinstance(r, dict) else "" for r in (results or [])]
+        if len(outputs) != len(indexes):
+            raise RuntimeError(f"FunASR批量标点结果数量不匹配: {len(outputs)}/{len(indexes)}")
+        texts = list(texts)
+        for i, text in zip(indexes, outputs):
+            texts[i] = text
+        return texts
@@ -1,11 +1,12 @@
 from .base import BaseASRModel
+from typing import Any, Dict
 import whisper
 import logging
 
 logger = logging.getLogger(__name__)
 
 class WhisperASRModel(BaseASRModel):
-    def __init__(self, model_size="base", language=None):
+    def __init__(self, model_size="base", language=None, word_timestamps=False):
         try:
             logger.info(f"Whisper模型加载: {model_size}")
             self.model = whisper.load_model(model_size)
@@ -14,8 +15,21 @@ class WhisperASRModel(BaseASRModel):
             logger.error(f"Whisper模型加载失败: {e}")
             raise
         self.language = language or 'zh'
+        # 词级时间戳需要额外的对齐计算，默认只输出句级时间戳
+        self.word_timestamps = word_timestamps
 
     def transcribe(self, audio_path: str, **kwargs) -> str:
         # 强制指定中文识别
         result = self.model.transcribe(audio_path, language='zh', **kwargs)
-        return result["text"] 
\ No newline at end of file
+        return result["text"]
+
+    def transcribe_timed(self, audio_path: str, **kwargs) -> Dict[str, Any]:
+        result = self.model.transcribe(audio_path, language='zh', word_timestamps=self.word_timestamps, **kwargs)
+        segments = []
+        for seg in result.get("segments") or []:
+            item = {"start": round(seg["start"], 3), "end": round(seg["end"], 3), "text": seg["text"].strip()}
+            if seg.get("words"):
+                item["words"] = [{"start": round(w["start"], 3), "end": round(w["end"], 3), "word": w["word"].strip()}
+                                 for w in seg["words"]]
+            segments.append(item)
+        return {"text": result["text"], "segments": segments}
@@ -1,20 +1,40 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
+from .summary import SummaryOptions
 
 class ASRTaskCreate(BaseModel):
     audio_file_id: int
     model_name: str
     model_params: Optional[Dict[str, Any]] = None
+    priority: str = "normal"  # high, normal, low
+    submitter: Optional[str] = None
+    auto_summary: Optional[SummaryOptions] = None  # 识别完成后自动生成摘要
+
+class ASRBatchCreate(BaseModel):
+    audio_file_ids: List[int]
+    model_name: str
+    model_params: Optional[Dict[str, Any]] = None
+    priority: str = "normal"
+    submitter: Optional[str] = None
+    auto_summary: Optional[SummaryOptions] = None  # 识别完成后自动生成摘要
 
 class ASRTaskOut(BaseModel):
     id: int
     audio_file_id: int
+    group_id: Optional[int] = None
     model_name: str
     model_params: Optional[str]
+    submitter: Optional[str] = None
+    priority: Optional[str] = None
     status: str
     progress: float
+    segments_done: Optional[int] = None
+    segments_total: Optional[int] = None
+    processed_seconds: Optional[float] = None
+    realtime_factor: Optional[float] = None
     submit_time: datetime
+    start_time: Optional[datetime] = None
     finish_time: Optional[datetime]
 
     class Config:
@@ -26,8 +46,28 @@ class ASRResultOut(BaseModel):
     recognized_text: Optional[str]
     summary: Optional[str]
     summary_algo: Optional[str]
+    segments: Optional[List[Dict[str, Any]]] = None
     export_formats: Optional[str]
     create_time: datetime
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+class TaskGroupOut(BaseModel):
+    id: int
+    submitter: Optional[str]
+    model_name: Optional[str]
+    total: int
+    create_time: datetime
+    status: str                     # pending, running, finished, failed（部分失败）
+    progress: float
+    counts: Dict[str, int]          # 各状态任务数
+    finish_time: Optional[datetime] = None
+    tasks: List[ASRTaskOut] = []
+
+class TaskGroupResultItem(BaseModel):
+    task_id: int
+    audio_file_id: int
+    filename: Optional[str]
+    status: str
+    recognized_text: Optional[str] = None
@@ -13,6 +13,8 @@ class AudioFileCreate(AudioFileBase):
 class AudioFileOut(AudioFileBase):
     id: int
     filepath: str
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
     upload_time: datetime
 
     class Config:
@@ -12,6 +12,11 @@ class ModelInfoSchema(BaseModel):
     config: Optional[Any]
     version: Optional[str]
     size: Optional[int]
+    remote_url: Optional[str] = None
+    sha256: Optional[str] = None
+    progress: Optional[float] = None
+    downloaded_size: Optional[int] = None
+    error: Optional[str] = None
     create_time: Optional[datetime]
     update_time: Optional[datetime]
 
@@ -27,6 +32,7 @@ class ModelRegisterSchema(BaseModel):
     version: str = "1.0.0"
     config: Optional[Any] = None
     size: Optional[int] = None
+    sha256: Optional[str] = None  # 下载完成后校验，不一致时下载失败
 
 class ModelSwitchSchema(BaseModel):
     id: int
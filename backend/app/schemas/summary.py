@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 class SummaryRequest(BaseModel):
     task_id: int
@@ -12,4 +13,36 @@ class SummaryOut(BaseModel):
     summary: str
     algo: str
     length: int
-    detail: int 
\ No newline at end of file
+    detail: int
+
+class SummaryOptions(BaseModel):
+    """识别完成后自动生成摘要的参数"""
+    algo: str = "truncate"
+    length: int = 100
+    detail: int = 1
+    config: Optional[dict] = None  # 其中的api_key不保存，后台任务使用服务端配置的密钥
+
+class SummarySubmit(SummaryRequest):
+    priority: str = "normal"  # high, normal, low
+    run_after: Optional[datetime] = None  # 不早于该时间（UTC）执行，用于错峰批量生成
+    submitter: Optional[str] = None
+
+class SummaryTaskOut(BaseModel):
+    id: int
+    task_id: int
+    result_id: Optional[int] = None
+    algo: str
+    length: Optional[int] = None
+    detail: Optional[int] = None
+    submitter: Optional[str] = None
+    priority: Optional[str] = None
+    status: str
+    progress: float
+    summary: Optional[str] = None
+    error: Optional[str] = None
+    submit_time: datetime
+    start_time: Optional[datetime] = None
+    finish_time: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
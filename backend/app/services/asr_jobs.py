@@ -0,0 +1,132 @@
+import json
+import logging
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db import database, models
+from . import asr_service, result_cache, job_queue, scheduling, summary_jobs
+from .task_events import broker
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "asr"
+
+
+def enqueue_asr_task(db: Session, task: models.ASRTask, delay: float = 0.0) -> models.Job:
+    """为已写入（至少已flush）的ASRTask添加队列任务，由调用方提交事务"""
+    duration = task.audio_file.duration if task.audio_file else None
+    return job_queue.enqueue(db, JOB_KIND, task.id, priority=scheduling.priority_value(task.priority or "normal"),
+                             concurrency_key=task.model_name, submitter=task.submitter,
+                             expected_seconds=scheduling.expected_seconds(duration), delay=delay)
+
+
+def _on_progress(task_id: int):
+    # 运行中的进度只在任务仍为pending/running时写入，避免覆盖已完成的状态
+    def on_progress(event):
+        values = {
+            models.ASRTask.status: "running",
+            models.ASRTask.progress: event["progress"],
+            models.ASRTask.segments_done: event["segments_done"],
+            models.ASRTask.segments_total: event["segments_total"],
+            models.ASRTask.processed_seconds: event["processed_seconds"],
+            models.ASRTask.realtime_factor: event["realtime_factor"],
+            models.ASRTask.start_time: func.coalesce(models.ASRTask.start_time, datetime.utcnow()),
+        }
+        with database.SessionLocal() as db:
+            query = db.query(models.ASRTask).filter(
+                models.ASRTask.id == task_id, models.ASRTask.status.in_(["pending", "running"]))
+            query.update(values, synchronize_session=False)
+            db.commit()
+        broker.publish(task_id, dict(event, type="progress"))
+    return on_progress
+
+
+def start_asr_job(job: Dict[str, Any]) -> Future:
+    task_id = job["ref_id"]
+    with database.SessionLocal() as db:
+        task = db.query(models.ASRTask).filter(models.ASRTask.id == task_id).first()
+        if not task or not task.audio_file:
+            raise job_queue.PermanentError(f"识别任务或音频文件不存在: {task_id}")
+        audio_path = task.audio_file.filepath
+        model_name = task.model_name
+        model_params = json.loads(task.model_params or "{}")
+
+    def on_segment(segment):
+        broker.publish(task_id, dict(segment, type="segment"))
+    return asr_service.submit_asr_task(audio_path, model_name, model_params,
+                                       on_progress=_on_progress(task_id), on_segment=on_segment)
+
+
+def on_asr_success(db: Session, job: Dict[str, Any], output: Dict[str, Any]):
+    task = db.query(models.ASRTask).filter(models.ASRTask.id == job["ref_id"]).first()
+    if not task:
+        return None
+    text = output["text"]
+    segments = output.get("segments") or None
+    task.status = "finished"
+    task.progress = 1.0
+    task.finish_time = datetime.utcnow()
+    # 运行中的进度是节流上报的，完成时补齐最终值
+    if task.segments_total:
+        task.segments_done = task.segments_total
+    if task.audio_file and task.audio_file.duration:
+        task.processed_seconds = task.audio_file.duration
+    if task.processed_seconds and task.start_time:
+        task.realtime_factor = round((task.finish_time - task.start_time).total_seconds() / task.processed_seconds, 4)
+    if task.result:
+        task.result.recognized_text = text
+        task.result.segments = segments
+    else:
+        task.result = models.ASRResult(task_id=task.id, recognized_text=text, segments=segments)
+        db.flush()
+    # 带自动摘要参数的任务在同一事务中创建摘要任务
+    summary_task = summary_jobs.chain_summary(db, task)
+    # 提交后ORM对象会过期，先取出缓存需要的字段
+    audio_hash = task.audio_file.content_hash if task.audio_file else None
+    audio_path = task.audio_file.filepath if task.audio_file else None
+    model_name = task.model_name
+    model_params = json.loads(task.model_params or "{}")
+
+    def after_commit():
+        if result_cache.CACHE_ENABLED and audio_path:
+            try:
+                key_hash = audio_hash or result_cache.hash_file(audio_path)
+                with database.SessionLocal() as db2:
+                    result_cache.store(db2, result_cache.make_key(key_hash, model_name, model_params),
+                                       key_hash, model_name, model_params, text, segments)
+            except Exception as e:
+                logger.warning(f"写入识别缓存失败: {e}")
+        if summary_task is not None:
+            job_queue.notify()
+        broker.publish(job["ref_id"], {"type": "final", "status": "finished", "text": text})
+    return after_commit
+
+
+def on_asr_failure(db: Session, job: Dict[str, Any], error: str, final: bool):
+    task = db.query(models.ASRTask).filter(models.ASRTask.id == job["ref_id"]).first()
+    if not task:
+        return None
+    if not final:
+        # 等待重试
+        task.status = "pending"
+        return None
+    task.status = "failed"
+    task.finish_time = datetime.utcnow()
+    return lambda: broker.publish(job["ref_id"], {"type": "final", "status": "failed", "error": error})
+
+
+def recover_asr_tasks(db: Session) -> int:
+    """为队列上线前提交、仍处于pending/running且没有队列记录的识别任务补建任务"""
+    orphans = db.query(models.ASRTask).outerjoin(
+        models.Job, (models.Job.kind == JOB_KIND) & (models.Job.ref_id == models.ASRTask.id)
+    ).filter(models.ASRTask.status.in_(["pending", "running"]), models.Job.id.is_(None)).all()
+    for task in orphans:
+        task.status = "pending"
+        enqueue_asr_task(db, task)
+    return len(orphans)
+
+
+job_queue.register_handler(JOB_KIND, job_queue.JobHandler(
+    start=start_asr_job, on_success=on_asr_success, on_failure=on_asr_failure, on_recover=recover_asr_tasks))
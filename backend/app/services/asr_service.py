@@ -1,72 +1,271 @@
-from concurrent.futures import ThreadPoolExecutor, Future
-from typing import Dict, Any
-from ..models.whisper_model import WhisperASRModel
-from ..models.funasr_model import FunASRModel
-from ..models.kimi_audio_model import KimiAudioASRModel
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from .model_manager import ModelManager, MODEL_REGISTRY, normalize_params
+from .execution_backend import create_backend
+from .audio_segmenter import AudioSegment, SAMPLE_RATE, iter_pcm, probe_duration, split_on_silence
+from .audio_cache import DECODE_CACHE_ENABLED, iter_blocks, load_pcm
+from .progress import ProgressTracker
+from . import text_postprocess, punctuation
+import json
 import os
 import logging
-import re
+import threading
 
 # 日志配置
 LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'output.log')
 logging.basicConfig(filename=LOG_PATH, level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
-# 简单线程池实现异步识别任务
-executor = ThreadPoolExecutor(max_workers=2)
-
-MODEL_REGISTRY = {
-    "whisper": WhisperASRModel,
-    "funasr": FunASRModel,
-    "kimi-audio": KimiAudioASRModel,
-}
-
-def clean_text(text: str) -> str:
-    # 去除连续重复的“的”、“啊”、“嗯”等口头禅
-    text = re.sub(r'(的|啊|嗯|吧|呢|嘛|哦|呃|这个|那个|就是|然后|所以|就是的|就是说|就是说的|就是说啊|就是说呢|就是说嘛|就是说吧|就是说哦|就是说呃|就是说这个|就是说那个|就是说就是)+', r'\1', text)
-    # 连续相同字去重
-    text = re.sub(r'(.)\1{2,}', r'\1', text)
-    # 多余空格
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-def add_punctuation(text: str) -> str:
-    # 保留已有标点，简单规则自动断句加标点
-    # 以“吗|吧|呢”结尾加问号，以“啊|呀|哇”结尾加感叹号，其余加句号
-    text = re.sub(r'([吗吧呢])', r'\1？', text)
-    text = re.sub(r'([啊呀哇])', r'\1！', text)
-    # 按中文常用句子长度断句加句号（如20字）
-    text = re.sub(r'([^。！？\?！\?]{20,})', lambda m: m.group(0) + '。', text)
-    # 合并多余标点
-    text = re.sub(r'([。！？\?]){2,}', r'\1', text)
-    return text
+# 推理worker数量及微批参数
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "2"))
+BATCH_MAX_SIZE = int(os.getenv("ASR_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = int(os.getenv("ASR_BATCH_MAX_WAIT_MS", "50"))
+# 超过该时长（秒）的音频按静音切分后并行识别，0表示不切分
+CHUNK_MIN_DURATION = float(os.getenv("ASR_CHUNK_MIN_DURATION", "60"))
+# 长音频流水线的驱动线程数（只负责解码切分和收集结果，不做推理）
+PIPELINE_WORKERS = int(os.getenv("ASR_PIPELINE_WORKERS", "4"))
+
+def clean_text(text: str, language: Optional[str] = None) -> str:
+    # 口头禅合并、连续相同字去重、多余空格，规则见 text_postprocess
+    return text_postprocess.process(text, language, clean=True, punctuate=False)
+
+def add_punctuation(text: str, language: Optional[str] = None) -> str:
+    # 语气词后加问号/感叹号，末尾长句补句号，合并多余标点
+    return text_postprocess.process(text, language, clean=False, punctuate=True)
+
+def postprocess(text: str, language: Optional[str] = None) -> str:
+    """clean_text + add_punctuation，单个处理器完成"""
+    return text_postprocess.process(text, language)
 
 def get_asr_model(model_name: str, model_params: Dict[str, Any] = None):
-    model_cls = MODEL_REGISTRY.get(model_name)
-    if not model_cls:
-        logger.error(f"不支持的模型: {model_name}")
-        raise ValueError(f"不支持的模型: {model_name}")
+    # 从模型池获取常驻模型，避免每个任务重复加载
     try:
-        logger.info(f"加载模型: {model_name}, 参数: {model_params}")
-        model = model_cls(**(model_params or {}))
-        logger.info(f"模型加载完成: {model_name}")
-        return model
+        return ModelManager.instance().get_model(model_name, model_params)
     except Exception as e:
         logger.error(f"模型加载失败: {model_name}, 错误: {e}")
         raise
 
-def submit_asr_task(audio_path: str, model_name: str, model_params: Dict[str, Any] = None) -> Future:
-    def task_fn():
+def _describe(item: Union[str, AudioSegment]) -> str:
+    return item.label() if isinstance(item, AudioSegment) else item
+
+def _load_input(item: Union[str, AudioSegment]):
+    """把任务输入转换为模型输入：优先使用解码缓存的内存映射，片段只按偏移切片"""
+    if isinstance(item, AudioSegment):
+        if item.samples is not None:
+            return item.samples
+        return load_pcm(item.source)[int(round(item.start * SAMPLE_RATE)):int(round(item.end * SAMPLE_RATE))]
+    if DECODE_CACHE_ENABLED:
         try:
-            model = get_asr_model(model_name, model_params)
-            logger.info(f"开始识别: {audio_path} 使用模型: {model_name}")
-            text = model.transcribe(audio_path)
-            text = clean_text(text)
-            text = add_punctuation(text)
-            logger.info(f"识别完成: {audio_path} 使用模型: {model_name}")
-            return text
+            return load_pcm(item)
         except Exception as e:
-            logger.error(f"识别任务失败: {audio_path} 使用模型: {model_name}, 错误: {e}")
+            # 解码失败时交给模型自行读取文件
+            logger.warning(f"解码缓存不可用: {item}, 错误: {e}")
+    return item
+
+def _prepare(raw: Dict[str, Any], post: punctuation.PostConfig) -> Dict[str, Any]:
+    """全文和每句分别做规则清洗/标点，处理后为空的句子丢弃"""
+    segments = [dict(seg, text=punctuation.prepare(seg["text"], post)) for seg in raw.get("segments") or []]
+    return {"text": punctuation.prepare(raw["text"], post), "segments": [seg for seg in segments if seg["text"]]}
+
+def _run_asr_batch(key: Tuple[str, str],
+                   items: List[Tuple[Union[str, AudioSegment], punctuation.PostConfig]]) -> List[Any]:
+    """批量识别，items为(文件路径或长音频切出的片段, 后处理配置)，结果为 {"text", "segments"}，时间戳相对输入起点
+
+    规则清洗和标点在这里完成，多进程后端下与推理一起在worker进程内执行。
+    """
+    model_name, params_key = key
+    model = get_asr_model(model_name, json.loads(params_key))
+    posts = [post for _, post in items]
+    items = [item for item, _ in items]
+    inputs = [_load_input(item) for item in items]
+    logger.info(f"开始批量识别: {len(items)}个输入 使用模型: {model_name}")
+    try:
+        texts = model.transcribe_timed_batch(inputs)
+    except Exception as e:
+        if len(items) == 1:
+            logger.error(f"识别任务失败: {_describe(items[0])} 使用模型: {model_name}, 错误: {e}")
             raise
-    future = executor.submit(task_fn)
-    return future 
\ No newline at end of file
+        # 批量失败时逐个重试，避免一个坏文件拖垮整批
+        logger.warning(f"批量识别失败，逐个重试: {model_name}, 错误: {e}")
+        texts = []
+        for item, audio in zip(items, inputs):
+            try:
+                texts.append(model.transcribe_timed(audio))
+            except Exception as e2:
+                logger.error(f"识别任务失败: {_describe(item)} 使用模型: {model_name}, 错误: {e2}")
+                texts.append(e2)
+    results = []
+    for item, post, text in zip(items, posts, texts):
+        if isinstance(text, Exception):
+            results.append(text)
+            continue
+        logger.info(f"识别完成: {_describe(item)} 使用模型: {model_name}")
+        results.append(_prepare(text, post))
+    return results
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """懒加载执行后端，worker进程导入本模块时不会再创建后端"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                # 同一模型+参数的任务合并成批进行推理
+                _backend = create_backend(_run_asr_batch, workers=ASR_WORKERS, max_batch_size=BATCH_MAX_SIZE,
+                                          max_wait=BATCH_MAX_WAIT_MS / 1000)
+    return _backend
+
+# 长音频流水线驱动线程池，与推理worker分开，避免驱动线程占满worker导致死锁
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="asr-pipeline")
+
+def _chain(source: Future, target: Future, wrap):
+    def done(fut: Future):
+        try:
+            target.set_result(wrap(fut.result()))
+        except Exception as e:
+            target.set_exception(e)
+    source.add_done_callback(done)
+
+def _then(source: Future, next_stage: Callable[[Any], Future]) -> Future:
+    """source完成后把结果交给下一阶段，返回下一阶段结果的Future"""
+    target = Future()
+
+    def done(fut: Future):
+        try:
+            _chain(next_stage(fut.result()), target, lambda result: result)
+        except Exception as e:
+            target.set_exception(e)
+    source.add_done_callback(done)
+    return target
+
+def _postprocess(raw: Dict[str, Any], post: punctuation.PostConfig) -> Future:
+    """模型标点阶段：识别worker已完成规则处理，只有model模式需要把全文和每句送入标点模型"""
+    target = Future()
+    if post.mode != "model":
+        target.set_result(raw)
+        return target
+    segments = raw["segments"]
+    _chain(punctuation.submit_many([raw["text"]] + [seg["text"] for seg in segments], post, prepared=True), target,
+           lambda texts: {"text": texts[0],
+                          "segments": [dict(seg, text=text) for seg, text in zip(segments, texts[1:]) if text]})
+    return target
+
+def _recognize(key: Tuple[str, str], post: punctuation.PostConfig, item: Union[str, AudioSegment]) -> Future:
+    """识别（含规则清洗/标点） -> 模型标点，两个阶段各自合批，模型标点不占用识别worker"""
+    return _then(get_backend().submit(key, (item, post)), lambda raw: _postprocess(raw, post))
+
+def _shift(segment: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """片段内的时间戳换算为整段音频的时间"""
+    shifted = dict(segment, start=round(segment["start"] + offset, 3), end=round(segment["end"] + offset, 3))
+    if segment.get("words"):
+        shifted["words"] = [dict(w, start=round(w["start"] + offset, 3), end=round(w["end"] + offset, 3))
+                            for w in segment["words"]]
+    return shifted
+
+def _transcribe_chunked(key: Tuple[str, str], post: punctuation.PostConfig, audio_path: str, tracker: ProgressTracker,
+                        on_segment: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+    """按静音切分长音频，片段并行送入执行后端，按原顺序拼接结果
+
+    模型输出了句级时间戳时结果中的segments为换算到整段音频的句子，否则为静音切分的片段。
+    """
+    # 在途片段数有上限，解码进度不会远超推理进度，峰值内存受控
+    max_inflight = max(2, ASR_WORKERS * BATCH_MAX_SIZE)
+    inflight = deque()
+    chunks, segments = [], []
+
+    def collect(segment: AudioSegment, future: Future):
+        result = future.result()
+        if result["text"]:
+            chunk = {"start": round(segment.start, 3), "end": round(segment.end, 3), "text": result["text"]}
+            chunks.append(chunk)
+            if result["segments"]:
+                segments.extend(_shift(seg, segment.start) for seg in result["segments"])
+            else:
+                segments.append(chunk)
+            if on_segment:
+                # 片段按原顺序收集，解码出一段就推送一段
+                try:
+                    on_segment(dict(chunk, index=len(chunks) - 1))
+                except Exception as e:
+                    logger.warning(f"片段推送失败: {e}")
+
+    def on_segment_done(segment: AudioSegment):
+        def done(fut: Future):
+            if not fut.cancelled() and fut.exception() is None:
+                tracker.segment_done(segment.end - segment.start)
+        return done
+
+    logger.info(f"长音频分段识别: {audio_path} 使用模型: {key[0]}")
+    total = 0
+    if DECODE_CACHE_ENABLED:
+        blocks = iter_blocks(load_pcm(audio_path))
+    else:
+        blocks = iter_pcm(audio_path)
+    for segment in split_on_silence(blocks, source=audio_path):
+        if DECODE_CACHE_ENABLED:
+            # 只传递偏移，worker直接映射解码缓存，多进程下不需要序列化音频数据
+            segment = segment._replace(samples=None)
+        recognized = get_backend().submit(key, (segment, post))
+        recognized.add_done_callback(on_segment_done(segment))
+        # 片段识别完成即送入标点阶段，与其他片段、其他任务的文本合批
+        future = _then(recognized, lambda raw: _postprocess(raw, post))
+        inflight.append((segment, future))
+        total += 1
+        while len(inflight) >= max_inflight:
+            collect(*inflight.popleft())
+    # 解码结束后片段总数才确定
+    tracker.set_total(total)
+    while inflight:
+        collect(*inflight.popleft())
+    logger.info(f"长音频识别完成: {audio_path}, 片段数: {len(chunks)}")
+    return {"text": "".join(chunk["text"] for chunk in chunks), "segments": segments}
+
+def _run_pipeline(key: Tuple[str, str], post: punctuation.PostConfig, audio_path: str, result: Future,
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]],
+                  on_segment: Optional[Callable[[Dict[str, Any]], None]]):
+    try:
+        duration = probe_duration(audio_path)
+        tracker = ProgressTracker(on_progress, duration=duration)
+        tracker.start()
+        if CHUNK_MIN_DURATION > 0 and duration and duration > CHUNK_MIN_DURATION:
+            result.set_result(_transcribe_chunked(key, post, audio_path, tracker, on_segment))
+        else:
+            # 短音频直接交给执行后端，不占用驱动线程，便于与其他任务合批；整段算作一个片段上报进度
+            tracker.set_total(1)
+            recognized = _recognize(key, post, audio_path)
+
+            def on_done(fut: Future):
+                if not fut.cancelled() and fut.exception() is None:
+                    tracker.segment_done(duration or 0.0)
+            recognized.add_done_callback(on_done)
+            _chain(recognized, result, lambda output: output)
+    except Exception as e:
+        logger.error(f"识别任务失败: {audio_path} 使用模型: {key[0]}, 错误: {e}")
+        result.set_exception(e)
+
+def submit_asr_task(audio_path: str, model_name: str, model_params: Dict[str, Any] = None,
+                    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    on_segment: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+    """提交识别任务，Future结果为 {"text": 全文, "segments": [{"start", "end", "text", "words"?}, ...]}
+
+    on_progress 在任务开始运行及处理过程中被节流调用，参数见 ProgressTracker；
+    on_segment 在长音频每个片段按顺序识别完成后调用，参数为 {"index", "start", "end", "text"}。
+    model_params中的"punc"选择标点方式，见 punctuation 模块。
+    """
+    future = Future()
+    if model_name not in MODEL_REGISTRY:
+        logger.error(f"不支持的模型: {model_name}")
+        future.set_exception(ValueError(f"不支持的模型: {model_name}"))
+        return future
+    try:
+        asr_params, post = punctuation.split_params(model_params)
+    except ValueError as e:
+        logger.error(f"后处理配置错误: {model_params}, 错误: {e}")
+        future.set_exception(e)
+        return future
+    key = (model_name, normalize_params(asr_params))
+    pipeline_executor.submit(_run_pipeline, key, post, audio_path, future, on_progress, on_segment)
+    return future
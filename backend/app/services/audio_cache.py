@@ -0,0 +1,68 @@
+import os
+import threading
+import subprocess
+import logging
+import numpy as np
+from .audio_segmenter import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+DECODE_CACHE_ENABLED = os.getenv("ASR_DECODE_CACHE", "1") == "1"
+DECODED_SUFFIX = ".16k.f32"
+
+_locks_guard = threading.Lock()
+_locks = {}
+
+
+def decoded_path(audio_path: str) -> str:
+    return audio_path + DECODED_SUFFIX
+
+
+def _decode_to_file(audio_path: str, target: str):
+    """ffmpeg解码为16kHz单声道float32裸数据，先写临时文件再原子改名，多进程并发解码也安全"""
+    tmp = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-v", "error", "-y", "-i", audio_path,
+           "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE), tmp]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(tmp, target)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"音频解码失败: {audio_path}, {e.stderr.decode(errors='ignore').strip()}") from e
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_pcm(audio_path: str) -> np.ndarray:
+    """返回音频的16kHz单声道float32表示（内存映射）
+
+    首次调用时解码并保存在上传文件旁，之后所有模型、所有worker进程都直接映射同一文件，
+    不再重复调用ffmpeg，也共享同一份页缓存。映射使用写时复制模式，模型可以直接使用。
+    """
+    target = decoded_path(audio_path)
+    if not os.path.exists(target):
+        with _locks_guard:
+            lock = _locks.setdefault(target, threading.Lock())
+        with lock:
+            if not os.path.exists(target):
+                logger.info(f"解码音频: {audio_path}")
+                _decode_to_file(audio_path, target)
+        with _locks_guard:
+            _locks.pop(target, None)
+    if os.path.getsize(target) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(target, dtype=np.float32, mode="c")
+
+
+def iter_blocks(samples: np.ndarray, block_seconds: float = 5.0):
+    """把已解码的数组按块切片（视图，不复制）"""
+    block = int(block_seconds * SAMPLE_RATE)
+    for i in range(0, len(samples), block):
+        yield samples[i:i + block]
+
+
+def remove_decoded(audio_path: str):
+    try:
+        os.remove(decoded_path(audio_path))
+    except FileNotFoundError:
+        pass
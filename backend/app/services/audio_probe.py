@@ -0,0 +1,115 @@
+import os
+import struct
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 只读取文件头部，不解码音频
+HEADER_READ_SIZE = 64 * 1024
+
+_MP3_BITRATES = {
+    # (MPEG1, Layer3) / (MPEG2/2.5, Layer3)，单位kbps
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+_MP3_SAMPLERATES = {
+    3: [44100, 48000, 32000],  # MPEG1
+    2: [22050, 24000, 16000],  # MPEG2
+    0: [11025, 12000, 8000],   # MPEG2.5
+}
+
+
+def _probe_wav(f) -> Tuple[Optional[float], Optional[int]]:
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None, None
+    samplerate = byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None, samplerate
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(size + (size & 1))
+            samplerate, byte_rate = struct.unpack("<II", fmt[4:12])
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None, samplerate
+            # 流式写出的WAV中data大小可能是0xFFFFFFFF，改用文件剩余长度
+            remaining = os.fstat(f.fileno()).st_size - f.tell()
+            return min(size, remaining) / byte_rate, samplerate
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def _probe_flac(f) -> Tuple[Optional[float], Optional[int]]:
+    if f.read(4) != b"fLaC":
+        return None, None
+    block_header = f.read(4)
+    # 第一个元数据块必须是STREAMINFO
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:
+        return None, None
+    info = f.read(34)
+    if len(info) < 34:
+        return None, None
+    packed = int.from_bytes(info[10:18], "big")
+    samplerate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    if not samplerate:
+        return None, None
+    return (total_samples / samplerate if total_samples else None), samplerate
+
+
+def _probe_mp3(f) -> Tuple[Optional[float], Optional[int]]:
+    file_size = os.fstat(f.fileno()).st_size
+    data = f.read(10)
+    offset = 0
+    if data[:3] == b"ID3" and len(data) == 10:
+        # ID3v2标签长度为syncsafe整数
+        tag_size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + tag_size + (10 if data[5] & 0x10 else 0)
+    f.seek(offset)
+    data = f.read(HEADER_READ_SIZE)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+            continue
+        version = (data[i + 1] >> 3) & 0x03
+        layer = (data[i + 1] >> 1) & 0x03
+        bitrate_idx = data[i + 2] >> 4
+        sr_idx = (data[i + 2] >> 2) & 0x03
+        if version == 1 or layer != 1 or sr_idx == 3 or bitrate_idx in (0, 15):
+            continue  # 只处理Layer III，跳过无效/free格式帧头
+        samplerate = _MP3_SAMPLERATES[version][sr_idx]
+        bitrate = _MP3_BITRATES[1 if version == 3 else 2][bitrate_idx] * 1000
+        samples_per_frame = 1152 if version == 3 else 576
+        mono = (data[i + 3] >> 6) == 3
+        # Xing/Info（VBR）头位于side info之后
+        side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info") and data[xing + 7] & 0x01:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+            return frames * samples_per_frame / samplerate, samplerate
+        vbri = i + 4 + 32
+        if data[vbri:vbri + 4] == b"VBRI":
+            frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+            return frames * samples_per_frame / samplerate, samplerate
+        # CBR：按码率估算
+        return (file_size - offset - i) * 8 / bitrate, samplerate
+    return None, None
+
+
+_PROBES = {".wav": _probe_wav, ".flac": _probe_flac, ".mp3": _probe_mp3}
+
+
+def probe_audio(path: str) -> Tuple[Optional[float], Optional[int]]:
+    """从文件头解析(时长秒, 采样率)，无法解析的字段返回None"""
+    probe = _PROBES.get(os.path.splitext(path)[1].lower())
+    if not probe:
+        return None, None
+    try:
+        with open(path, "rb") as f:
+            return probe(f)
+    except Exception as e:
+        logger.warning(f"解析音频头失败: {path}, 错误: {e}")
+        return None, None
@@ -0,0 +1,139 @@
+import os
+import json
+import subprocess
+import logging
+from typing import Iterable, Iterator, NamedTuple, Optional
+import numpy as np
+from .audio_probe import probe_audio
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# 分段参数（秒）：在[MIN, MAX]区间内寻找静音切分点，超过MAX强制在最低能量处切分
+SEGMENT_MIN_SECONDS = float(os.getenv("ASR_SEGMENT_MIN_SECONDS", "10"))
+SEGMENT_MAX_SECONDS = float(os.getenv("ASR_SEGMENT_MAX_SECONDS", "30"))
+# 低于该能量（dBFS）的帧视为静音
+SILENCE_THRESHOLD_DB = float(os.getenv("ASR_SILENCE_THRESHOLD_DB", "-40"))
+FRAME_SECONDS = 0.03
+# 静音至少持续该时长才作为切分点
+MIN_SILENCE_SECONDS = 0.3
+
+
+class AudioSegment(NamedTuple):
+    """长音频切分出的片段，start/end为在原音频中的秒数
+
+    samples为None时表示片段数据需按偏移从source的解码缓存中读取。
+    """
+    source: str
+    start: float
+    end: float
+    samples: Optional[np.ndarray]
+
+    def label(self) -> str:
+        return f"{self.source}@{self.start:.1f}-{self.end:.1f}s"
+
+
+def probe_duration(audio_path: str) -> Optional[float]:
+    """读取音频时长，优先直接解析文件头，无法解析时用ffprobe"""
+    duration, _ = probe_audio(audio_path)
+    if duration:
+        return duration
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", audio_path],
+            capture_output=True, check=True, timeout=30,
+        ).stdout
+        return float(json.loads(out)["format"]["duration"])
+    except Exception as e:
+        logger.warning(f"读取音频时长失败: {audio_path}, 错误: {e}")
+        return None
+
+
+def iter_pcm(audio_path: str, block_seconds: float = 5.0) -> Iterator[np.ndarray]:
+    """通过ffmpeg流式解码为16kHz单声道float32，分块产出，不把整段音频读入内存"""
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", audio_path,
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            if len(data) % 2:
+                data = data[:-1]
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def frame_energy_db(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """逐帧RMS能量（dBFS）"""
+    n = len(samples) // frame_size
+    if n == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n * frame_size].reshape(n, frame_size)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+
+def _find_cut(energy: np.ndarray, lo: int, hi: int, min_silence_frames: int, force: bool) -> Optional[int]:
+    """在[lo, hi)帧范围内找切分帧：优先取最长静音段的中点，强制切分时取能量最低的帧"""
+    window = energy[lo:hi]
+    if len(window) == 0:
+        return None
+    silent = window < SILENCE_THRESHOLD_DB
+    best_len, best_mid, run_start = 0, None, None
+    for i, s in enumerate(np.append(silent, False)):
+        if s and run_start is None:
+            run_start = i
+        elif not s and run_start is not None:
+            if i - run_start > best_len:
+                best_len, best_mid = i - run_start, (run_start + i) // 2
+            run_start = None
+    if best_mid is not None and best_len >= min_silence_frames:
+        return lo + best_mid
+    if force:
+        return lo + int(np.argmin(window))
+    return None
+
+
+def split_on_silence(blocks: Iterable[np.ndarray], source: str = "") -> Iterator[AudioSegment]:
+    """按静音把音频流切成长度受限的片段
+
+    缓冲区只保留未切出的音频，峰值内存约为 SEGMENT_MAX_SECONDS 加一个读取块。
+    整段都是静音的片段直接跳过。
+    """
+    frame_size = int(FRAME_SECONDS * SAMPLE_RATE)
+    min_frames = int(SEGMENT_MIN_SECONDS / FRAME_SECONDS)
+    max_frames = int(SEGMENT_MAX_SECONDS / FRAME_SECONDS)
+    min_silence_frames = max(1, int(MIN_SILENCE_SECONDS / FRAME_SECONDS))
+    buffer = np.empty(0, dtype=np.float32)
+    offset = 0  # 缓冲区起点对应的样本序号
+
+    def emit(samples: np.ndarray, start: int):
+        energy = frame_energy_db(samples, frame_size)
+        if len(energy) and energy.max() < SILENCE_THRESHOLD_DB:
+            return None
+        return AudioSegment(source, start / SAMPLE_RATE, (start + len(samples)) / SAMPLE_RATE, samples)
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= min_frames * frame_size:
+            energy = frame_energy_db(buffer, frame_size)
+            force = len(energy) >= max_frames
+            cut = _find_cut(energy, min_frames, min(len(energy), max_frames), min_silence_frames, force)
+            if cut is None:
+                break
+            cut_sample = cut * frame_size
+            segment = emit(buffer[:cut_sample], offset)
+            if segment:
+                yield segment
+            buffer = buffer[cut_sample:]
+            offset += cut_sample
+    if len(buffer):
+        segment = emit(buffer, offset)
+        if segment:
+            yield segment
@@ -0,0 +1,93 @@
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """动态微批调度器
+
+    相同key（如同一模型+参数）的待处理请求会被合并成一批，批大小不超过
+    max_batch_size，最早的请求最多等待max_wait秒。只有在有空闲worker时才
+    出批，因此worker繁忙时批会自然变大，吞吐随负载提升而内存不随并发线性增长。
+    run_batch(key, items) 需返回与items等长、顺序一致的结果列表。
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait: float = 0.05, max_workers: int = 2,
+                 name: str = "batch"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.Semaphore(max_workers)
+        self._cond = threading.Condition()
+        # {key: [(item, future, enqueue_time), ...]}
+        self._pending: Dict[Hashable, List[Tuple[Any, Future, float]]] = {}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name=f"{name}-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        future = Future()
+        with self._cond:
+            self._pending.setdefault(key, []).append((item, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def _next_ready(self):
+        """返回可出批的key及需继续等待的时间"""
+        now = time.monotonic()
+        oldest_key, oldest_time = None, None
+        for key, queue in self._pending.items():
+            if len(queue) >= self.max_batch_size:
+                return key, 0
+            if oldest_time is None or queue[0][2] < oldest_time:
+                oldest_key, oldest_time = key, queue[0][2]
+        if oldest_key is None:
+            return None, None
+        return oldest_key, max(0.0, oldest_time + self.max_wait - now)
+
+    def _dispatch_loop(self):
+        while True:
+            # 先占用一个worker槽位，worker全忙时请求继续在队列里攒批
+            self._slots.acquire()
+            with self._cond:
+                while True:
+                    key, wait = self._next_ready()
+                    if key is not None and wait <= 0:
+                        break
+                    self._cond.wait(timeout=wait)
+                queue = self._pending[key]
+                batch = queue[:self.max_batch_size]
+                del queue[:self.max_batch_size]
+                if not queue:
+                    del self._pending[key]
+            try:
+                self.executor.submit(self._run, key, batch)
+            except RuntimeError:
+                # 解释器退出时线程池已关闭
+                for _, fut, _ in batch:
+                    fut.cancel()
+                return
+
+    def _run(self, key: Hashable, batch: List[Tuple[Any, Future, float]]):
+        try:
+            items = [item for item, _, _ in batch]
+            futures = [fut for _, fut, _ in batch]
+            try:
+                results = self.run_batch(key, items)
+            except Exception as e:
+                logger.error(f"批处理失败: {key}, 批大小: {len(items)}, 错误: {e}")
+                for fut in futures:
+                    fut.set_exception(e)
+                return
+            for fut, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        finally:
+            self._slots.release()
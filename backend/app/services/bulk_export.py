@@ -0,0 +1,150 @@
+"""批量导出识别结果
+
+按结果ID分批读取（每批独立的异步会话，不长时间占用读事务），边读边生成JSONL或ZIP，内存占用与导出总量无关。
+查询在事件循环中异步执行；字幕生成、JSON序列化和压缩按批放到线程池，不占用事件循环也不为每行切换线程。
+ZIP写入不可seek的输出流，zipfile自动使用数据描述符，每写完一批结果就把已生成的字节交给响应。
+"""
+import os
+import json
+import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from ..db import database, models
+from . import subtitles
+
+# 每批读取的结果数
+EXPORT_BATCH_SIZE = int(os.getenv("ASR_EXPORT_BATCH_SIZE", "500"))
+# ZIP输出缓冲达到该字节数时交给响应
+EXPORT_FLUSH_BYTES = 256 * 1024
+
+FORMATS = ("jsonl", "zip")
+# 可导出的内容：text全文、summary摘要、segments带时间戳的句子、srt/vtt字幕
+CONTENTS = ("text", "summary", "segments", "srt", "vtt")
+DEFAULT_CONTENTS = {"jsonl": "text,summary,segments", "zip": "text,summary,srt"}
+
+
+def parse_contents(value: Optional[str], format: str) -> Set[str]:
+    contents = {v.strip() for v in (value or DEFAULT_CONTENTS[format]).split(",") if v.strip()}
+    unknown = contents - set(CONTENTS)
+    if unknown:
+        raise ValueError(f"不支持的导出内容: {','.join(sorted(unknown))}")
+    return contents
+
+
+async def iter_batches(filters, task_ids: Optional[List[int]], contents: Set[str]) -> AsyncIterator[List[Any]]:
+    """按结果ID顺序分批读取，filters为listing.TaskFilters"""
+    result, task, audio = models.ASRResult, models.ASRTask, models.AudioFile
+    columns = [result.id, result.task_id, result.recognized_text, result.summary, result.summary_algo,
+               result.create_time, task.audio_file_id, task.model_name, audio.filename, audio.duration]
+    if contents & {"segments", "srt", "vtt"}:
+        columns.append(result.segments)
+    last_id = 0
+    while True:
+        query = select(*columns).join(task, task.id == result.task_id) \
+            .outerjoin(audio, audio.id == task.audio_file_id)
+        query = filters.apply(query)
+        if task_ids:
+            query = query.where(result.task_id.in_(task_ids))
+        query = query.where(result.id > last_id).order_by(result.id).limit(EXPORT_BATCH_SIZE)
+        async with database.AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _segments(row) -> List[Dict[str, Any]]:
+    return getattr(row, "segments", None) or subtitles.fallback_segments(row.recognized_text, row.duration)
+
+
+def _record(row, contents: Set[str]) -> Dict[str, Any]:
+    record = {
+        "task_id": row.task_id,
+        "result_id": row.id,
+        "audio_file_id": row.audio_file_id,
+        "filename": row.filename,
+        "model_name": row.model_name,
+        "create_time": row.create_time.isoformat() if row.create_time else None,
+    }
+    if "text" in contents:
+        record["recognized_text"] = row.recognized_text
+    if "summary" in contents:
+        record["summary"] = row.summary
+        record["summary_algo"] = row.summary_algo
+    if "segments" in contents:
+        record["segments"] = getattr(row, "segments", None) or []
+    if "srt" in contents:
+        record["srt"] = "".join(subtitles.iter_srt(_segments(row)))
+    if "vtt" in contents:
+        record["vtt"] = "".join(subtitles.iter_vtt(_segments(row)))
+    return record
+
+
+def _jsonl_batch(rows: List[Any], contents: Set[str]) -> str:
+    return "".join(json.dumps(_record(row, contents), ensure_ascii=False) + "\n" for row in rows)
+
+
+async def iter_jsonl(batches: AsyncIterator[List[Any]], contents: Set[str]) -> AsyncIterator[str]:
+    """每个结果一行JSON，每批结果输出一次"""
+    async for rows in batches:
+        yield await run_in_threadpool(_jsonl_batch, rows, contents)
+
+
+def _entries(row, contents: Set[str]) -> Iterator[tuple]:
+    name = f"asr_{row.task_id}"
+    if "text" in contents:
+        yield f"{name}.txt", row.recognized_text or ""
+    if "summary" in contents and row.summary:
+        yield f"{name}.summary.txt", row.summary
+    if "segments" in contents:
+        record = _record(row, {"text", "segments"})
+        yield f"{name}.json", json.dumps(record, ensure_ascii=False)
+    if "srt" in contents:
+        yield f"{name}.srt", "".join(subtitles.iter_srt(_segments(row)))
+    if "vtt" in contents:
+        yield f"{name}.vtt", "".join(subtitles.iter_vtt(_segments(row)))
+
+
+class _Sink:
+    """只追加的输出缓冲，供zipfile写入"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def _zip_batch(archive: zipfile.ZipFile, rows: List[Any], contents: Set[str]):
+    for row in rows:
+        date_time = (row.create_time or datetime.utcnow()).timetuple()[:6]
+        for name, content in _entries(row, contents):
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, content)
+
+
+async def iter_zip(batches: AsyncIterator[List[Any]], contents: Set[str]) -> AsyncIterator[bytes]:
+    """每个结果按导出内容生成若干文件，如 asr_12.txt、asr_12.srt"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for rows in batches:
+            await run_in_threadpool(_zip_batch, archive, rows, contents)
+            if sink.size >= EXPORT_FLUSH_BYTES:
+                yield sink.take()
+    # 关闭时写出中央目录
+    yield sink.take()
@@ -0,0 +1,116 @@
+import os
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Hashable, List, Optional
+from .batch_scheduler import BatchScheduler
+
+logger = logging.getLogger(__name__)
+
+# 执行后端：thread（进程内线程池）或 process（常驻worker进程池）
+EXECUTION_BACKEND = os.getenv("ASR_EXECUTION_BACKEND", "thread")
+# 每个worker进程绑定的CPU核数，0表示按worker数量平均分配全部可用核
+WORKER_CPUS = int(os.getenv("ASR_WORKER_CPUS", "0"))
+# 每个worker进程的torch线程数，0表示与绑定的核数一致
+WORKER_TORCH_THREADS = int(os.getenv("ASR_WORKER_TORCH_THREADS", "0"))
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _init_worker(counter, workers: int, cpus_per_worker: int, torch_threads: int):
+    """worker进程初始化：分配CPU亲和性并限制torch线程数"""
+    with counter.get_lock():
+        worker_id = counter.value
+        counter.value += 1
+    cpus = _available_cpus()
+    per_worker = cpus_per_worker or max(1, len(cpus) // max(1, workers))
+    start = (worker_id * per_worker) % len(cpus)
+    assigned = cpus[start:start + per_worker] or cpus
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, assigned)
+        except OSError as e:
+            logger.warning(f"worker {worker_id} 设置CPU亲和性失败: {e}")
+    threads = torch_threads or len(assigned)
+    # 同时限制OpenMP/MKL线程，避免各worker互相抢核
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    logger.info(f"ASR worker进程 {worker_id} 启动, pid={os.getpid()}, CPU={assigned}, 线程数={threads}")
+
+
+class ThreadBackend:
+    """进程内执行：微批调度后直接在线程池中推理"""
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]], workers: int,
+                 max_batch_size: int, max_wait: float):
+        self.scheduler = BatchScheduler(run_batch, max_batch_size=max_batch_size, max_wait=max_wait,
+                                        max_workers=workers, name="asr")
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        return self.scheduler.submit(key, item)
+
+
+class ProcessBackend:
+    """多进程执行：每个worker进程常驻自己的模型池，按文件路径接收任务
+
+    微批调度仍在主进程完成，调度线程只负责把整批路径转发给worker进程并等待结果，
+    推理和规则后处理（清洗、规则标点）都在worker进程内执行，不占用Web进程的GIL；
+    选择了标点模型的任务，模型标点仍由主进程的标点批处理阶段完成。
+    run_batch 必须是可被pickle的模块级函数。
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]], workers: int,
+                 max_batch_size: int, max_wait: float,
+                 cpus_per_worker: int = WORKER_CPUS, torch_threads: int = WORKER_TORCH_THREADS):
+        self.run_batch = run_batch
+        self.workers = workers
+        self.cpus_per_worker = cpus_per_worker
+        self.torch_threads = torch_threads
+        self._pool_lock = threading.Lock()
+        self.pool = self._create_pool()
+        self.scheduler = BatchScheduler(self._forward, max_batch_size=max_batch_size, max_wait=max_wait,
+                                        max_workers=workers, name="asr-dispatch")
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # torch与fork不兼容，统一使用spawn
+        ctx = multiprocessing.get_context("spawn")
+        counter = ctx.Value("i", 0)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(counter, self.workers, self.cpus_per_worker, self.torch_threads))
+
+    def _forward(self, key: Hashable, items: List[Any]) -> List[Any]:
+        pool = self.pool
+        try:
+            return pool.submit(self.run_batch, key, items).result()
+        except BrokenProcessPool:
+            # worker进程异常退出（如OOM），重建进程池，本批任务按失败处理
+            logger.error("ASR worker进程池异常，正在重建")
+            with self._pool_lock:
+                if self.pool is pool:
+                    self.pool = self._create_pool()
+            raise
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        return self.scheduler.submit(key, item)
+
+
+def create_backend(run_batch: Callable[[Hashable, List[Any]], List[Any]], workers: int,
+                   max_batch_size: int, max_wait: float, kind: Optional[str] = None):
+    kind = kind or EXECUTION_BACKEND
+    if kind == "process":
+        logger.info(f"使用多进程执行后端, worker数: {workers}")
+        return ProcessBackend(run_batch, workers, max_batch_size, max_wait)
+    if kind != "thread":
+        raise ValueError(f"不支持的执行后端: {kind}")
+    return ThreadBackend(run_batch, workers, max_batch_size, max_wait)
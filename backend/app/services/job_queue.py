@@ -0,0 +1,317 @@
+import os
+import uuid
+import socket
+import threading
+import logging
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from ..db import database
+from ..db.models import Job
+from .scheduling import order_candidates, DEFAULT_EXPECTED_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 本进程是否运行队列worker，只提供API的进程可以关闭
+QUEUE_WORKER_ENABLED = os.getenv("ASR_QUEUE_WORKER", "1") == "1"
+# 本worker同时持有的任务数上限（任务在执行后端中还会被合批）
+QUEUE_MAX_CONCURRENCY = int(os.getenv("ASR_QUEUE_MAX_CONCURRENCY", "16"))
+# 单个并发分组（模型）在所有worker上同时运行的任务数上限，0表示不限制
+QUEUE_MAX_PER_KEY = int(os.getenv("ASR_QUEUE_MAX_PER_MODEL", "8"))
+# 形如 "whisper=2,funasr=8"，覆盖单个模型的并发上限
+QUEUE_KEY_LIMITS = {
+    k.strip(): int(v) for k, v in
+    (item.split("=", 1) for item in os.getenv("ASR_QUEUE_MODEL_LIMITS", "").split(",") if "=" in item)
+}
+LEASE_SECONDS = int(os.getenv("ASR_QUEUE_LEASE_SECONDS", "60"))
+POLL_INTERVAL = float(os.getenv("ASR_QUEUE_POLL_INTERVAL", "1.0"))
+MAX_ATTEMPTS = int(os.getenv("ASR_QUEUE_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("ASR_QUEUE_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("ASR_QUEUE_RETRY_MAX_SECONDS", "600"))
+# 每次调度时参与排序的待领取任务数
+CANDIDATE_LIMIT = int(os.getenv("ASR_QUEUE_CANDIDATE_LIMIT", "1000"))
+# 每个(提交方, 并发分组)最多取出的候选任务数（最短和最早各取这么多），任一提交方积压再多也不会挤占其他提交方
+CANDIDATE_PER_GROUP = int(os.getenv("ASR_QUEUE_CANDIDATE_PER_GROUP", "50"))
+
+class PermanentError(Exception):
+    """不可重试的失败（如业务记录已删除），任务直接标记为失败"""
+
+
+# {kind: JobHandler}
+HANDLERS: Dict[str, "JobHandler"] = {}
+
+
+class JobHandler:
+    """任务类型的处理器
+
+    start(job) 启动任务并返回Future，不应阻塞；
+    on_success(db, job, output) 与任务完成状态在同一事务中写入结果，可返回提交后执行的回调；
+    on_failure(db, job, error, final) 在失败（final=True）或即将重试时更新业务记录；
+    on_recover(db) 在启动时为没有队列记录的遗留业务记录补建任务。
+    """
+
+    def __init__(self, start: Callable[[Dict[str, Any]], Future],
+                 on_success: Callable[[Session, Dict[str, Any], Any], Optional[Callable[[], None]]],
+                 on_failure: Optional[Callable[[Session, Dict[str, Any], str, bool], Optional[Callable[[], None]]]] = None,
+                 on_recover: Optional[Callable[[Session], int]] = None):
+        self.start = start
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.on_recover = on_recover
+
+
+def register_handler(kind: str, handler: JobHandler):
+    HANDLERS[kind] = handler
+
+
+def enqueue(db: Session, kind: str, ref_id: int, priority: int = 0, concurrency_key: Optional[str] = None,
+            submitter: Optional[str] = None, expected_seconds: Optional[float] = None, delay: float = 0.0,
+            max_attempts: int = MAX_ATTEMPTS) -> Job:
+    """添加任务，由调用方提交事务，提交后调用 notify() 唤醒本进程worker"""
+    job = Job(kind=kind, ref_id=ref_id, priority=priority, concurrency_key=concurrency_key,
+              submitter=submitter, expected_seconds=expected_seconds, max_attempts=max_attempts,
+              status="pending", next_run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.add(job)
+    return job
+
+
+def cancel(db: Session, kind: str, ref_ids: List[int]) -> int:
+    """删除业务记录时一并删除其未完成的队列任务，由调用方提交事务
+
+    运行中的任务被删除后，worker完成时找不到自己的租约，结果直接丢弃。
+    """
+    return db.query(Job).filter(Job.kind == kind, Job.ref_id.in_(ref_ids), Job.status.in_(["pending", "running"])) \
+        .delete(synchronize_session=False)
+
+
+def _snapshot(job: Job) -> Dict[str, Any]:
+    return {"id": job.id, "kind": job.kind, "ref_id": job.ref_id, "priority": job.priority,
+            "concurrency_key": job.concurrency_key, "attempts": job.attempts, "max_attempts": job.max_attempts}
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+
+
+class JobWorker:
+    """基于数据库的任务队列worker
+
+    多个后端进程可同时从同一张jobs表拉取任务：领取任务用带条件的UPDATE保证只被一个worker
+    拿到，并写入租约；运行期间定时心跳续约。进程崩溃或重启后租约过期，任务会被重新放回队列。
+    失败的任务按指数退避重试，超过最大次数后标记为失败。
+    """
+
+    def __init__(self, max_concurrency: int = QUEUE_MAX_CONCURRENCY):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_concurrency = max_concurrency
+        self._inflight: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---- 生命周期 ----
+    def start(self):
+        self.recover(startup=True)
+        for target, name in ((self._poll_loop, "job-poller"), (self._heartbeat_loop, "job-heartbeat")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"任务队列worker启动: {self.worker_id}")
+
+    def stop(self):
+        # 不再领取新任务，未完成任务的租约到期后由其他worker接管
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        self._wake.set()
+
+    # ---- 恢复 ----
+    def recover(self, startup: bool = False):
+        now = datetime.utcnow()
+        with database.SessionLocal() as db:
+            expired = db.query(Job).filter(Job.status == "running", Job.lease_expires_at < now) \
+                .update({Job.status: "pending", Job.lease_owner: None, Job.lease_expires_at: None,
+                         Job.next_run_at: now}, synchronize_session=False)
+            db.commit()
+            if expired:
+                logger.warning(f"回收租约过期的任务: {expired}个")
+            if startup:
+                for kind, handler in HANDLERS.items():
+                    if handler.on_recover:
+                        created = handler.on_recover(db)
+                        if created:
+                            logger.warning(f"为遗留的{kind}记录补建队列任务: {created}个")
+                db.commit()
+
+    # ---- 领取 ----
+    def _key_limit(self, key: Optional[str]) -> int:
+        if key is None:
+            return 0
+        return QUEUE_KEY_LIMITS.get(key, QUEUE_MAX_PER_KEY)
+
+    def select_candidates(self, db: Session, now: datetime, limit: int):
+        """待领取的候选任务，按优先级类别、提交方公平份额和短作业优先排序
+
+        候选按(提交方, 并发分组)分别选取：每组取预估最短和最早提交的各CANDIDATE_PER_GROUP个，
+        所有有待领取任务的提交方都会出现在候选中，再由order_candidates轮转排序。
+        """
+        group = (Job.submitter, Job.concurrency_key)
+        cost_rank = func.row_number().over(partition_by=group, order_by=(
+            Job.priority.desc(), func.coalesce(Job.expected_seconds, DEFAULT_EXPECTED_SECONDS), Job.id))
+        age_rank = func.row_number().over(partition_by=group, order_by=(Job.priority.desc(), Job.id))
+        ranked = db.query(Job.id.label("id"), cost_rank.label("cost_rank"), age_rank.label("age_rank")) \
+            .filter(Job.status == "pending", Job.next_run_at <= now, Job.kind.in_(list(HANDLERS.keys()))) \
+            .subquery()
+        candidates = db.query(Job).join(ranked, ranked.c.id == Job.id) \
+            .filter(or_(ranked.c.cost_rank <= CANDIDATE_PER_GROUP, ranked.c.age_rank <= CANDIDATE_PER_GROUP)) \
+            .order_by(Job.priority.desc(), ranked.c.age_rank, Job.id).limit(limit).all()
+        if not candidates:
+            return candidates
+        running = dict(db.query(Job.submitter, func.count(Job.id))
+                       .filter(Job.status == "running").group_by(Job.submitter).all())
+        return order_candidates(candidates, running, now)
+
+    def _claim(self, slots: int):
+        now = datetime.utcnow()
+        claimed = []
+        with database.SessionLocal() as db:
+            # 提交后ORM对象会过期，先转成快照避免逐条重新查询
+            candidates = [_snapshot(job) for job in self.select_candidates(db, now, CANDIDATE_LIMIT)]
+            if not candidates:
+                return claimed
+            running = dict(db.query(Job.concurrency_key, func.count(Job.id))
+                           .filter(Job.status == "running").group_by(Job.concurrency_key).all())
+            for job in candidates:
+                if len(claimed) >= slots:
+                    break
+                limit = self._key_limit(job["concurrency_key"])
+                if limit and running.get(job["concurrency_key"], 0) >= limit:
+                    continue
+                updated = db.query(Job).filter(Job.id == job["id"], Job.status == "pending").update({
+                    Job.status: "running",
+                    Job.lease_owner: self.worker_id,
+                    Job.lease_expires_at: now + timedelta(seconds=LEASE_SECONDS),
+                    Job.attempts: Job.attempts + 1,
+                }, synchronize_session=False)
+                db.commit()
+                if updated:
+                    job["attempts"] += 1
+                    running[job["concurrency_key"]] = running.get(job["concurrency_key"], 0) + 1
+                    claimed.append(job)
+        return claimed
+
+    def _poll_loop(self):
+        last_recover = datetime.utcnow()
+        while not self._stop.is_set():
+            try:
+                if datetime.utcnow() - last_recover > timedelta(seconds=LEASE_SECONDS):
+                    self.recover()
+                    last_recover = datetime.utcnow()
+                with self._lock:
+                    slots = self.max_concurrency - len(self._inflight)
+                if slots > 0:
+                    for job in self._claim(slots):
+                        self._run(job)
+            except Exception as e:
+                logger.error(f"任务队列轮询失败: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(LEASE_SECONDS / 3):
+            with self._lock:
+                job_ids = list(self._inflight.keys())
+            if not job_ids:
+                continue
+            try:
+                with database.SessionLocal() as db:
+                    db.query(Job).filter(Job.id.in_(job_ids), Job.lease_owner == self.worker_id) \
+                        .update({Job.lease_expires_at: datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)},
+                                synchronize_session=False)
+                    db.commit()
+            except Exception as e:
+                logger.error(f"任务心跳失败: {e}")
+
+    # ---- 执行 ----
+    def _run(self, job: Dict[str, Any]):
+        handler = HANDLERS[job["kind"]]
+        with self._lock:
+            self._inflight[job["id"]] = job
+        try:
+            future = handler.start(job)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda fut: self._complete(job, fut))
+
+    def _complete(self, job: Dict[str, Any], future: Future):
+        handler = HANDLERS[job["kind"]]
+        after_commit = None
+        try:
+            with database.SessionLocal() as db:
+                owned = db.query(Job).filter(Job.id == job["id"], Job.lease_owner == self.worker_id,
+                                             Job.status == "running")
+                permanent = False
+                try:
+                    output = future.result()
+                    error = None
+                except Exception as e:
+                    output, error = None, str(e) or e.__class__.__name__
+                    permanent = isinstance(e, PermanentError)
+                if error is None:
+                    # 租约已被回收说明任务已交给其他worker，本次结果丢弃
+                    if not owned.update({Job.status: "finished", Job.lease_owner: None, Job.lease_expires_at: None},
+                                        synchronize_session=False):
+                        logger.warning(f"任务租约已失效，丢弃结果: {job['kind']}#{job['ref_id']}")
+                        db.rollback()
+                        return
+                    after_commit = handler.on_success(db, job, output)
+                else:
+                    final = permanent or job["attempts"] >= job["max_attempts"]
+                    values = {Job.lease_owner: None, Job.lease_expires_at: None, Job.last_error: error[:2000]}
+                    if final:
+                        values[Job.status] = "failed"
+                    else:
+                        values[Job.status] = "pending"
+                        values[Job.next_run_at] = datetime.utcnow() + timedelta(seconds=retry_delay(job["attempts"]))
+                    if not owned.update(values, synchronize_session=False):
+                        db.rollback()
+                        return
+                    logger.error(f"任务失败: {job['kind']}#{job['ref_id']}, 第{job['attempts']}次, "
+                                 f"{'不再重试' if final else '稍后重试'}, 错误: {error}")
+                    if handler.on_failure:
+                        after_commit = handler.on_failure(db, job, error, final)
+                db.commit()
+            if after_commit:
+                after_commit()
+        except Exception as e:
+            logger.error(f"任务完成处理失败: {job['kind']}#{job['ref_id']}, 错误: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(job["id"], None)
+            self._wake.set()
+
+
+_worker: Optional[JobWorker] = None
+
+
+def start_worker() -> Optional[JobWorker]:
+    global _worker
+    if QUEUE_WORKER_ENABLED and _worker is None:
+        _worker = JobWorker()
+        _worker.start()
+    return _worker
+
+
+def stop_worker():
+    if _worker:
+        _worker.stop()
+
+
+def notify():
+    if _worker:
+        _worker.notify()
@@ -0,0 +1,114 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+from .asr_service import get_backend
+from .model_manager import MODEL_REGISTRY, normalize_params
+from . import punctuation
+from .audio_segmenter import AudioSegment, SAMPLE_RATE, FRAME_SECONDS, SILENCE_THRESHOLD_DB, frame_energy_db
+
+logger = logging.getLogger(__name__)
+
+# 新增音频达到该时长（秒）才重新解码一次中间结果
+PARTIAL_INTERVAL = float(os.getenv("ASR_LIVE_PARTIAL_INTERVAL", "0.5"))
+# 尾部静音达到该时长（秒）视为一句话结束
+ENDPOINT_SILENCE = float(os.getenv("ASR_LIVE_ENDPOINT_SILENCE", "0.6"))
+# 单句最长时长（秒），超过后强制断句，保证每次解码的成本有上限
+MAX_UTTERANCE = float(os.getenv("ASR_LIVE_MAX_UTTERANCE", "15"))
+
+
+class LiveSession:
+    """实时识别会话
+
+    客户端持续送入16kHz单声道s16le PCM，会话只保留尚未定稿的音频作为滚动缓冲区。
+    新增音频足够时对缓冲区解码得到中间结果(partial)；检测到句尾静音或缓冲区过长时
+    定稿(final)，只对定稿片段做文本清洗和标点，然后丢弃该段音频。
+    缓冲区长度不超过MAX_UTTERANCE，单次处理成本不随会话时长增长。
+    解码和离线任务一样提交到执行后端，由微批调度器控制同一模型的并发，不在WebSocket线程中直接调用模型。
+    """
+
+    def __init__(self, model_name: str, model_params: Optional[Dict[str, Any]] = None):
+        if model_name not in MODEL_REGISTRY:
+            raise ValueError(f"不支持的模型: {model_name}")
+        asr_params, self.post = punctuation.split_params(model_params)
+        self.key = (model_name, normalize_params(asr_params))
+        # 中间结果只做规则清洗，不加标点
+        self.partial_post = self.post._replace(mode="none", model_key=None)
+        self.frame_size = int(FRAME_SECONDS * SAMPLE_RATE)
+        self.buffer = np.empty(0, dtype=np.float32)
+        self.buffer_start = 0  # 缓冲区起点在会话中的样本序号
+        self.decoded_until = 0  # 上次解码时缓冲区的长度
+        self._pending_byte = b""
+        # 建立会话时先在执行后端加载模型，模型不可用时立即报错
+        self._decode(np.zeros(self.frame_size, dtype=np.float32), 0.0, self.partial_post)
+
+    def _decode(self, samples: np.ndarray, start: float, post: punctuation.PostConfig) -> str:
+        """识别一段音频（start为其在会话中的秒数，用于日志），返回经过规则处理的文本"""
+        if len(samples) < self.frame_size:
+            return ""
+        segment = AudioSegment("live", start, start + len(samples) / SAMPLE_RATE, samples)
+        return get_backend().submit(self.key, (segment, post)).result()["text"]
+
+    def _finalize(self, cut: int) -> Optional[Dict[str, Any]]:
+        samples = self.buffer[:cut]
+        start = self.buffer_start / SAMPLE_RATE
+        end = (self.buffer_start + cut) / SAMPLE_RATE
+        self.buffer = self.buffer[cut:]
+        self.buffer_start += cut
+        self.decoded_until = 0
+        energy = frame_energy_db(samples, self.frame_size)
+        if not len(energy) or energy.max() < SILENCE_THRESHOLD_DB:
+            return None
+        # 规则处理在识别worker内完成，模型标点与离线任务共用批处理队列
+        text = punctuation.punctuate(self._decode(samples, start, self.post), self.post).result()
+        if not text:
+            return None
+        return {"type": "final", "start": round(start, 3), "end": round(end, 3), "text": text}
+
+    def _endpoint(self) -> Optional[int]:
+        """返回句尾切分位置（样本序号），没有句尾时返回None"""
+        energy = frame_energy_db(self.buffer, self.frame_size)
+        if not len(energy):
+            return None
+        silence_frames = int(ENDPOINT_SILENCE / FRAME_SECONDS)
+        voiced = np.nonzero(energy >= SILENCE_THRESHOLD_DB)[0]
+        if len(voiced) and len(energy) - 1 - voiced[-1] >= silence_frames:
+            return (voiced[-1] + 1 + silence_frames // 2) * self.frame_size
+        if len(self.buffer) >= MAX_UTTERANCE * SAMPLE_RATE:
+            # 没有句尾静音时在后半段能量最低处强制断句
+            half = len(energy) // 2
+            return (half + int(np.argmin(energy[half:]))) * self.frame_size or len(self.buffer)
+        return None
+
+    def feed(self, pcm: bytes) -> List[Dict[str, Any]]:
+        """送入一块PCM数据，返回本次产生的事件"""
+        data = self._pending_byte + pcm
+        if len(data) % 2:
+            data, self._pending_byte = data[:-1], data[-1:]
+        else:
+            self._pending_byte = b""
+        samples = np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+        self.buffer = np.concatenate([self.buffer, samples])
+        events = []
+        cut = self._endpoint()
+        if cut:
+            event = self._finalize(cut)
+            if event:
+                events.append(event)
+        if len(self.buffer) - self.decoded_until >= PARTIAL_INTERVAL * SAMPLE_RATE:
+            self.decoded_until = len(self.buffer)
+            energy = frame_energy_db(self.buffer, self.frame_size)
+            start = self.buffer_start / SAMPLE_RATE
+            # 缓冲区全是静音时不解码
+            voiced = len(energy) and energy.max() >= SILENCE_THRESHOLD_DB
+            text = self._decode(self.buffer, start, self.partial_post) if voiced else ""
+            if text:
+                events.append({"type": "partial", "start": round(start, 3), "text": text})
+        return events
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """会话结束，定稿剩余音频"""
+        if not len(self.buffer):
+            return []
+        event = self._finalize(len(self.buffer))
+        return [event] if event else []
@@ -0,0 +1,243 @@
+"""OpenAI兼容接口的异步摘要客户端
+
+所有请求在一个专用的事件循环线程中执行，共用一个httpx.AsyncClient连接池：同步调用方（任务队列线程）
+和异步调用方（FastAPI接口）都经由该循环，连接复用、并发上限对全部调用生效。
+- 并发：信号量限制同时进行的请求数
+- 重试：超时、连接错误、429和5xx按指数退避重试，优先使用Retry-After
+- 缓存：按(文本哈希, 接口, 模型, 字数, 提示词)缓存结果，相同的请求在途时共用一次调用
+- 长文本：超过LLM_CHUNK_CHARS时按句切块并发摘要（map），再合并各块摘要（reduce）
+"""
+import os
+import json
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import httpx
+from .textrank import split_sentences
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT = float(os.getenv("ASR_LLM_TIMEOUT", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("ASR_LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("ASR_LLM_MAX_CONNECTIONS", "16"))
+LLM_MAX_RETRIES = int(os.getenv("ASR_LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.getenv("ASR_LLM_RETRY_BASE", "1.0"))
+LLM_RETRY_MAX = 30.0
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("ASR_LLM_CACHE_MAX_ENTRIES", "1024"))
+# 超过该字数的文本分块摘要后再合并
+LLM_CHUNK_CHARS = int(os.getenv("ASR_LLM_CHUNK_CHARS", "6000"))
+# 分块摘要每块的字数上限
+LLM_MAP_SUMMARY_CHARS = int(os.getenv("ASR_LLM_MAP_SUMMARY_CHARS", "300"))
+# 合并后仍过长时继续合并的最大层数
+LLM_MAX_REDUCE_DEPTH = 3
+
+SUMMARY_PROMPT = "请对以下内容进行专业、简明的中文摘要，字数不超过{length}字：\n{text}"
+MAP_PROMPT = "以下是一段长录音转写文本的第{index}/{total}部分，请概括这一部分的要点，字数不超过{length}字：\n{text}"
+REDUCE_PROMPT = "以下是一段长录音各部分的要点摘要，请合并为一篇连贯、专业、简明的中文摘要，字数不超过{length}字：\n{text}"
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMConfig(NamedTuple):
+    api_base: str
+    api_key: str
+    model: str
+
+
+# 摘要算法 -> 环境变量前缀及默认值
+PROVIDERS = {
+    "doubao": ("DOUBAO", "https://ark.cn-beijing.volces.com/api/v3", "doubao-1.6-chat"),
+    "llm": ("LLM", "http://127.0.0.1:8001/v1", "default"),
+}
+
+
+def resolve_config(algo: str, config: Optional[Dict[str, Any]] = None) -> LLMConfig:
+    """接口地址、密钥、模型：请求中的config优先，其次环境变量"""
+    prefix, api_base, model = PROVIDERS[algo]
+    config = config or {}
+    return LLMConfig(
+        api_base=config.get("api_base") or os.getenv(f"{prefix}_API_BASE", api_base),
+        api_key=config.get("api_key") or os.getenv(f"{prefix}_API_KEY", ""),
+        model=config.get("model") or os.getenv(f"{prefix}_MODEL", model),
+    )
+
+
+# 后台任务保存到数据库的配置中去掉的字段，运行时由resolve_config从环境变量取得
+SECRET_CONFIG_KEYS = ("api_key",)
+
+
+def strip_secrets(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not config:
+        return config
+    return {key: value for key, value in config.items() if key not in SECRET_CONFIG_KEYS}
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """按句把文本装入不超过max_chars字的块"""
+    chunks, current, size = [], [], 0
+    for sentence in split_sentences(text):
+        if current and size + len(sentence) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(sentence)
+        size += len(sentence)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_RETRY_MAX)
+            except ValueError:
+                pass
+    return min(LLM_RETRY_BASE * 2 ** attempt, LLM_RETRY_MAX) * (0.5 + random.random() / 2)
+
+
+class LLMClient:
+    """在专用事件循环线程中运行的客户端，方法需在该循环内调用，外部使用submit()"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        self._thread.start()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"requests": 0, "retries": 0, "cache_hits": 0}
+
+    def submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=LLM_TIMEOUT,
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_MAX_CONNECTIONS))
+            self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        return self._http
+
+    async def chat(self, config: LLMConfig, prompt: str, max_tokens: int, temperature: float = 0.2) -> str:
+        client = self._client()
+        url = config.api_base.rstrip("/") + "/chat/completions"
+        # 本地部署的接口可以不需要密钥
+        headers = {"Authorization": f"Bearer {config.api_key}"} if config.api_key else {}
+        payload = {"model": config.model, "messages": [{"role": "user", "content": prompt}],
+                   "temperature": temperature, "max_tokens": max_tokens}
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            response, error = None, None
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                try:
+                    response = await client.post(url, json=payload, headers=headers)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error = e
+            if response is not None and response.status_code < 400:
+                try:
+                    return response.json()["choices"][0]["message"]["content"].strip()
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    raise LLMError(f"响应格式错误: {e}")
+            if response is not None:
+                error = LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                if response.status_code not in _RETRY_STATUS:
+                    raise error
+            if attempt == LLM_MAX_RETRIES:
+                break
+            delay = _retry_delay(attempt, response)
+            self.stats["retries"] += 1
+            logger.warning(f"LLM请求失败，{delay:.1f}秒后重试({attempt + 1}/{LLM_MAX_RETRIES}): {error}")
+            await asyncio.sleep(delay)
+        raise LLMError(f"LLM请求失败: {error}")
+
+    async def _cached(self, key: str, make):
+        """结果缓存，相同key的并发请求只调用一次"""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self._cache[key]
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self.loop.create_future()
+        self._inflight[key] = pending
+        try:
+            result = await make()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                pending.set_exception(e)
+                # 没有并发等待者时避免"exception never retrieved"警告
+                pending.exception()
+            else:
+                pending.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        pending.set_result(result)
+        self._cache[key] = result
+        while len(self._cache) > LLM_CACHE_MAX_ENTRIES > 0:
+            self._cache.popitem(last=False)
+        return result
+
+    async def complete(self, config: LLMConfig, prompt: str, length: int) -> str:
+        key = hashlib.sha256(json.dumps([config.api_base, config.model, length, prompt],
+                                        ensure_ascii=False).encode("utf-8")).hexdigest()
+        return await self._cached(key, lambda: self.chat(config, prompt, max_tokens=length * 2))
+
+    async def summarize(self, text: str, config: LLMConfig, length: int = 100, depth: int = 0,
+                        on_progress: Optional[Callable[[float], None]] = None) -> str:
+        """摘要，长文本分块并发摘要后合并；on_progress(0~1)在每块完成后于线程池中调用，不阻塞事件循环"""
+        if len(text) <= LLM_CHUNK_CHARS or depth >= LLM_MAX_REDUCE_DEPTH:
+            return await self.complete(config, SUMMARY_PROMPT.format(length=length, text=text), length)
+        chunks = chunk_text(text, LLM_CHUNK_CHARS)
+        map_length = max(length, LLM_MAP_SUMMARY_CHARS)
+        logger.info(f"长文本分块摘要: {len(text)}字, {len(chunks)}块, 模型: {config.model}")
+        done = [0]
+
+        async def map_chunk(index: int, chunk: str) -> str:
+            prompt = MAP_PROMPT.format(index=index + 1, total=len(chunks), length=map_length, text=chunk)
+            partial = await self.complete(config, prompt, map_length)
+            done[0] += 1
+            if on_progress and depth == 0:
+                # 合并一步也计入进度，分块全部完成时为 n/(n+1)
+                self.loop.run_in_executor(None, on_progress, done[0] / (len(chunks) + 1))
+            return partial
+        partials = await asyncio.gather(*[map_chunk(i, chunk) for i, chunk in enumerate(chunks)])
+        merged = "\n".join(f"{i + 1}. {p}" for i, p in enumerate(partials))
+        if len(merged) > LLM_CHUNK_CHARS:
+            # 各块摘要合起来仍然过长，再做一层
+            return await self.summarize(merged, config, length, depth + 1)
+        return await self.complete(config, REDUCE_PROMPT.format(length=length, text=merged), length)
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def submit_summary(text: str, config: LLMConfig, length: int = 100,
+                   on_progress: Optional[Callable[[float], None]] = None) -> Future:
+    """提交摘要请求，返回concurrent.futures.Future；同步调用方.result()，异步调用方asyncio.wrap_future"""
+    client = get_client()
+    return client.submit(client.summarize(text, config, length, on_progress=on_progress))
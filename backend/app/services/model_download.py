@@ -0,0 +1,379 @@
+"""模型文件后台下载
+
+注册带remote_url的模型时先写入"下载中"的记录并立即返回，下载在事件循环中异步进行，不占用请求和线程池：
+- 并行分段：服务器支持Range时按DOWNLOAD_CHUNK_SIZE分段，DOWNLOAD_CONNECTIONS个连接同时下载，
+  每个连接按缓冲写入文件的对应位置；不支持Range时单连接顺序下载
+- 断点续传：数据写入 <文件>.part，已完成的分段记录在 <文件>.part.json；分段失败时从已写入处重试，
+  进程重启或重新下载时跳过已完成的分段
+- 校验与落盘：下载完成后计算SHA256，注册时指定了sha256则必须一致，校验通过后原子重命名为目标文件，
+  目标路径上不会出现不完整的文件
+- 进度：每DOWNLOAD_PROGRESS_INTERVAL秒写入ModelInfo的progress、downloaded_size
+- 多进程：下载期间持有 <文件>.part.lock 的排他文件锁，多个进程同时恢复下载时只有一个进程写入.part，
+  其他进程跳过；持有锁的进程退出后由操作系统释放
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，不做进程间互斥
+    fcntl = None
+import aiofiles
+import aiofiles.os
+import httpx
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from ..db import database
+from ..db.models import ModelInfo
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "asr-models")
+DOWNLOAD_TIMEOUT = float(os.getenv("ASR_MODEL_DOWNLOAD_TIMEOUT", "60"))
+# 并行连接数，1为单连接
+DOWNLOAD_CONNECTIONS = int(os.getenv("ASR_MODEL_DOWNLOAD_CONNECTIONS", "4"))
+# 分段大小，也是断点续传的粒度
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("ASR_MODEL_DOWNLOAD_CHUNK_MB", "16")) * 1024 * 1024
+# 每个连接累积到该字节数再写入文件
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# 每个分段（或单连接下载）失败后的重试次数，按指数退避
+DOWNLOAD_RETRIES = int(os.getenv("ASR_MODEL_DOWNLOAD_RETRIES", "5"))
+DOWNLOAD_RETRY_BASE = 1.0
+DOWNLOAD_RETRY_MAX = 30.0
+DOWNLOAD_PROGRESS_INTERVAL = 1.0
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+STATUS_DOWNLOADING = "下载中"
+STATUS_FAILED = "下载失败"
+STATUS_READY = "已加载"  # 与直接注册本地模型一致，下载完成即视为可用
+
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# 模型ID -> 下载任务，保留引用防止任务被回收
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+class DownloadError(Exception):
+    pass
+
+
+def local_path_for(name: str, remote_url: str) -> str:
+    return os.path.join(MODEL_DIR, name, remote_url.split("/")[-1])
+
+
+def partial_paths(local_path: str) -> Tuple[str, str]:
+    """下载中的数据文件和分段记录文件"""
+    return local_path + ".part", local_path + ".part.json"
+
+
+def lock_path_for(local_path: str) -> str:
+    return local_path + ".part.lock"
+
+
+def _try_lock(local_path: str) -> Optional[int]:
+    """获取下载的排他锁，返回锁文件描述符，已被其他进程持有时返回None
+
+    持有锁的进程结束下载时会删除锁文件，加锁后确认锁住的仍是路径上的文件，避免锁在已删除的文件上。
+    """
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    lock_path = lock_path_for(local_path)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_ino != os.stat(lock_path).st_ino:
+                raise BlockingIOError
+        except OSError:
+            os.close(fd)
+            return None
+    return fd
+
+
+class _Progress:
+    def __init__(self, total: Optional[int], done: int = 0):
+        self.total = total
+        self.done = done
+
+
+def _retry_delay(attempt: int) -> float:
+    return min(DOWNLOAD_RETRY_BASE * 2 ** attempt, DOWNLOAD_RETRY_MAX)
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in _RETRY_STATUS
+    return isinstance(error, (httpx.TransportError, DownloadError))
+
+
+async def _probe(client: httpx.AsyncClient, url: str) -> Tuple[Optional[int], bool]:
+    """返回(文件大小, 是否支持Range)，只读取响应头"""
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            try:
+                return int(response.headers["Content-Range"].rsplit("/", 1)[1]), True
+            except (KeyError, ValueError):
+                pass
+        length = response.headers.get("Content-Length")
+        return (int(length) if length and response.status_code == 200 else None), False
+
+
+def _load_state(state_path: str, url: str, total: int) -> Set[int]:
+    """已完成的分段序号，下载地址或文件大小变化时重新下载"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get("url") == url and state.get("size") == total:
+            return set(state.get("done", []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+
+async def _save_state(state_path: str, url: str, total: int, done: Set[int]):
+    tmp_path = state_path + ".tmp"
+    async with aiofiles.open(tmp_path, "w") as f:
+        await f.write(json.dumps({"url": url, "size": total, "done": sorted(done)}))
+    await aiofiles.os.replace(tmp_path, state_path)
+
+
+async def _fetch_range(client: httpx.AsyncClient, url: str, part_path: str, start: int, end: int,
+                       progress: _Progress):
+    """下载[start, end]写入文件对应位置，失败时从已写入处续传"""
+    position = start
+    async with aiofiles.open(part_path, "r+b") as f:
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                async with client.stream("GET", url, headers={"Range": f"bytes={position}-{end}"}) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise DownloadError(f"服务器未按Range返回: HTTP {response.status_code}")
+                    buffer = bytearray()
+                    async for data in response.aiter_bytes():
+                        buffer += data
+                        if len(buffer) >= DOWNLOAD_BUFFER_SIZE:
+                            await f.seek(position)
+                            await f.write(bytes(buffer))
+                            position += len(buffer)
+                            progress.done += len(buffer)
+                            buffer.clear()
+                    if buffer:
+                        await f.seek(position)
+                        await f.write(bytes(buffer))
+                        position += len(buffer)
+                        progress.done += len(buffer)
+                if position > end:
+                    return
+                raise DownloadError(f"连接提前结束: {position - start}/{end - start + 1}字节")
+            except Exception as e:
+                if attempt == DOWNLOAD_RETRIES or not _retryable(e):
+                    raise
+                delay = _retry_delay(attempt)
+                logger.warning(f"分段下载失败，{delay:.0f}秒后从{position}字节处重试({attempt + 1}/{DOWNLOAD_RETRIES}): {e}")
+                await asyncio.sleep(delay)
+
+
+async def _download_ranges(client: httpx.AsyncClient, url: str, part_path: str, state_path: str, total: int,
+                           progress: _Progress):
+    count = max(-(-total // DOWNLOAD_CHUNK_SIZE), 1)
+    done = set()
+    if os.path.exists(part_path) and os.path.getsize(part_path) == total:
+        done = _load_state(state_path, url, total)
+    if not done:
+        # 预分配文件，各分段直接写入自己的位置
+        async with aiofiles.open(part_path, "wb") as f:
+            await f.truncate(total)
+    pending: List[int] = [i for i in range(count) if i not in done]
+    progress.done = sum(min(DOWNLOAD_CHUNK_SIZE, total - i * DOWNLOAD_CHUNK_SIZE) for i in done)
+    if done:
+        logger.info(f"断点续传: {url} 已完成{len(done)}/{count}段")
+
+    state_lock = asyncio.Lock()
+
+    async def worker():
+        while pending:
+            index = pending.pop(0)
+            start = index * DOWNLOAD_CHUNK_SIZE
+            await _fetch_range(client, url, part_path, start, min(start + DOWNLOAD_CHUNK_SIZE, total) - 1, progress)
+            done.add(index)
+            async with state_lock:
+                await _save_state(state_path, url, total, done)
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(DOWNLOAD_CONNECTIONS, len(pending)))]
+    if not workers:
+        return
+    # 任一连接最终失败（或下载被取消）时取消其他连接，已完成的分段保留用于续传
+    try:
+        finished, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    for task in finished:
+        task.result()
+
+
+async def _download_stream(client: httpx.AsyncClient, url: str, part_path: str, progress: _Progress):
+    """服务器不支持Range时单连接顺序下载，失败后从头重试"""
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        progress.done = 0
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(part_path, "wb") as f:
+                    async for data in response.aiter_bytes(DOWNLOAD_BUFFER_SIZE):
+                        await f.write(data)
+                        progress.done += len(data)
+            if progress.total is not None and progress.done != progress.total:
+                raise DownloadError(f"连接提前结束: {progress.done}/{progress.total}字节")
+            return
+        except Exception as e:
+            if attempt == DOWNLOAD_RETRIES or not _retryable(e):
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"下载失败，{delay:.0f}秒后重试({attempt + 1}/{DOWNLOAD_RETRIES}): {e}")
+            await asyncio.sleep(delay)
+
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+async def download(remote_url: str, local_path: str, sha256: Optional[str] = None,
+                   progress: Optional[_Progress] = None) -> Tuple[int, str]:
+    """下载、校验并原子重命名为local_path，返回(文件大小, sha256)"""
+    progress = progress or _Progress(None)
+    part_path, state_path = partial_paths(local_path)
+    await aiofiles.os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT, follow_redirects=True,
+                                 limits=httpx.Limits(max_connections=DOWNLOAD_CONNECTIONS + 1)) as client:
+        total, ranged = await _probe(client, remote_url)
+        progress.total = total
+        if ranged and total:
+            await _download_ranges(client, remote_url, part_path, state_path, total, progress)
+        else:
+            await _download_stream(client, remote_url, part_path, progress)
+    digest = await run_in_threadpool(file_sha256, part_path)
+    if sha256 and digest != sha256.lower():
+        # 数据损坏，不保留用于续传
+        for path in (part_path, state_path):
+            if await aiofiles.os.path.exists(path):
+                await aiofiles.os.remove(path)
+        raise DownloadError(f"SHA256校验失败: 期望{sha256}, 实际{digest}")
+    await aiofiles.os.replace(part_path, local_path)
+    if await aiofiles.os.path.exists(state_path):
+        await aiofiles.os.remove(state_path)
+    return os.path.getsize(local_path), digest
+
+
+async def _update(model_id: int, **values):
+    async with database.AsyncSessionLocal() as db:
+        model = await db.get(ModelInfo, model_id)
+        if not model:
+            return
+        for key, value in values.items():
+            setattr(model, key, value)
+        await db.commit()
+
+
+async def _report(model_id: int, progress: _Progress):
+    while True:
+        await asyncio.sleep(DOWNLOAD_PROGRESS_INTERVAL)
+        await _update(model_id, downloaded_size=progress.done, size=progress.total,
+                      progress=round(progress.done / progress.total, 4) if progress.total else None)
+
+
+async def _run(model_id: int, remote_url: str, local_path: str, sha256: Optional[str]):
+    try:
+        lock = await run_in_threadpool(_try_lock, local_path)
+    except OSError as e:
+        _tasks.pop(model_id, None)
+        logger.error(f"模型下载失败: #{model_id} {remote_url}, 错误: {e}")
+        await _update(model_id, status=STATUS_FAILED, error=str(e))
+        return
+    if lock is None:
+        _tasks.pop(model_id, None)
+        logger.info(f"模型正由其他进程下载: #{model_id} {remote_url}")
+        return
+    try:
+        # 拿到锁之前其他进程可能已下载完成
+        async with database.AsyncSessionLocal() as db:
+            model = await db.get(ModelInfo, model_id)
+            if not model or model.status != STATUS_DOWNLOADING:
+                _tasks.pop(model_id, None)
+                return
+        await _download_locked(model_id, remote_url, local_path, sha256)
+    finally:
+        # 无论成功、失败还是取消都删除锁文件，删除后再释放锁；成功时状态已先更新，之后拿到新锁的进程会看到下载已完成
+        try:
+            os.remove(lock_path_for(local_path))
+        except OSError:
+            pass
+        os.close(lock)
+
+
+async def _download_locked(model_id: int, remote_url: str, local_path: str, sha256: Optional[str]):
+    progress = _Progress(None)
+    reporter = asyncio.ensure_future(_report(model_id, progress))
+    try:
+        size, digest = await download(remote_url, local_path, sha256, progress)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"模型下载失败: #{model_id} {remote_url}, 错误: {e}")
+        await _update(model_id, status=STATUS_FAILED, error=str(e) or type(e).__name__,
+                      downloaded_size=progress.done)
+        return
+    finally:
+        reporter.cancel()
+        _tasks.pop(model_id, None)
+    logger.info(f"模型下载完成: #{model_id} {local_path} ({size}字节)")
+    await _update(model_id, status=STATUS_READY, size=size, sha256=digest, progress=1.0, downloaded_size=size,
+                  error=None)
+
+
+def start(model_id: int, remote_url: str, local_path: str, sha256: Optional[str] = None) -> asyncio.Task:
+    """在当前事件循环中启动下载，需在异步接口中调用"""
+    task = asyncio.get_running_loop().create_task(_run(model_id, remote_url, local_path, sha256))
+    _tasks[model_id] = task
+    return task
+
+
+def is_downloading(model_id: int) -> bool:
+    return model_id in _tasks
+
+
+async def cancel(model_id: int):
+    task = _tasks.pop(model_id, None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def remove_partial(local_path: str):
+    for path in partial_paths(local_path) + (lock_path_for(local_path),):
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(path)
+
+
+async def resume_downloads() -> int:
+    """继续上次进程退出时仍在下载的模型，已完成的分段不会重新下载"""
+    async with database.AsyncSessionLocal() as db:
+        models = (await db.scalars(select(ModelInfo).where(ModelInfo.status == STATUS_DOWNLOADING))).all()
+        for model in models:
+            if model.remote_url and model.local_path:
+                start(model.id, model.remote_url, model.local_path, model.sha256)
+            else:
+                model.status = STATUS_FAILED
+                model.error = "缺少下载地址，需重新注册"
+        await db.commit()
+    return len(models)
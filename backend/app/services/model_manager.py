@@ -1,13 +1,65 @@
 import threading
+import json
+import os
+import logging
+from collections import OrderedDict
 from app.db.models import ModelInfo
-from typing import Dict
+from app.models.base import BaseASRModel
+from app.models.whisper_model import WhisperASRModel
+from app.models.funasr_model import FunASRModel
+from app.models.kimi_audio_model import KimiAudioASRModel
+from app.models.funasr_punc_model import FunASRPuncModel
+from typing import Dict, Any, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY = {
+    "whisper": WhisperASRModel,
+    "funasr": FunASRModel,
+    "kimi-audio": KimiAudioASRModel,
+}
+
+# 标点恢复等后处理模型，与识别模型共用模型池
+PUNC_MODEL_REGISTRY = {
+    "funasr-punc": FunASRPuncModel,
+}
+
+# 模型池内存预算（MB），超出后按LRU淘汰最久未使用的模型，0表示不限制
+MODEL_POOL_MAX_MB = int(os.getenv("ASR_MODEL_POOL_MAX_MB", "8192"))
+# 无法估算模型占用时使用的默认值（MB）
+DEFAULT_MODEL_SIZE_MB = int(os.getenv("ASR_MODEL_DEFAULT_SIZE_MB", "1024"))
+
+
+def normalize_params(model_params: Optional[Dict[str, Any]]) -> str:
+    """模型参数归一化为稳定的字符串，用作模型池的key"""
+    return json.dumps(model_params or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def estimate_model_size(model: BaseASRModel) -> int:
+    """估算模型占用的内存（字节），优先统计torch参数大小"""
+    inner = getattr(model, "model", None)
+    # FunASR的AutoModel把torch模块放在.model属性里
+    inner = getattr(inner, "model", inner)
+    parameters = getattr(inner, "parameters", None)
+    if callable(parameters):
+        try:
+            return sum(p.numel() * p.element_size() for p in parameters())
+        except Exception:
+            pass
+    return DEFAULT_MODEL_SIZE_MB * 1024 * 1024
+
 
 class ModelManager:
     _instance = None
     _lock = threading.Lock()
 
-    def __init__(self):
-        self.loaded_models: Dict[str, object] = {}  # {model_name: model_obj}
+    def __init__(self, max_bytes: int = MODEL_POOL_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # {(model_name, params_key): (model_obj, size_bytes)}，按最近使用排序
+        self.loaded_models: "OrderedDict[Tuple[str, str], Tuple[BaseASRModel, int]]" = OrderedDict()
+        self._pool_lock = threading.RLock()
+        # 每个key一把加载锁，避免并发任务重复加载同一个模型
+        self._loading_locks: Dict[Tuple[str, str], threading.Lock] = {}
 
     @classmethod
     def instance(cls):
@@ -17,19 +69,100 @@ class ModelManager:
                     cls._instance = cls()
         return cls._instance
 
+    def get_model(self, model_name: str, model_params: Dict[str, Any] = None) -> BaseASRModel:
+        """从模型池获取已加载的模型，未命中时加载并放入池中"""
+        key = (model_name, normalize_params(model_params))
+        with self._pool_lock:
+            entry = self.loaded_models.get(key)
+            if entry:
+                self.loaded_models.move_to_end(key)
+                return entry[0]
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+        with loading_lock:
+            with self._pool_lock:
+                entry = self.loaded_models.get(key)
+                if entry:
+                    self.loaded_models.move_to_end(key)
+                    return entry[0]
+            model_cls = MODEL_REGISTRY.get(model_name) or PUNC_MODEL_REGISTRY.get(model_name)
+            if not model_cls:
+                logger.error(f"不支持的模型: {model_name}")
+                raise ValueError(f"不支持的模型: {model_name}")
+            logger.info(f"加载模型: {model_name}, 参数: {model_params}")
+            model = model_cls(**(model_params or {}))
+            size = estimate_model_size(model)
+            logger.info(f"模型加载完成: {model_name}, 估算占用: {size / 1024 / 1024:.0f}MB")
+            with self._pool_lock:
+                self.loaded_models[key] = (model, size)
+                self._evict(keep=key)
+                self._loading_locks.pop(key, None)
+            return model
+
+    def _evict(self, keep: Tuple[str, str]):
+        if self.max_bytes <= 0:
+            return
+        total = sum(size for _, size in self.loaded_models.values())
+        for key in list(self.loaded_models.keys()):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            _, size = self.loaded_models.pop(key)
+            total -= size
+            logger.info(f"模型池超出内存预算，卸载模型: {key[0]} {key[1]}")
+
+    def release(self, model_name: str, model_params: Dict[str, Any] = None) -> bool:
+        key = (model_name, normalize_params(model_params))
+        with self._pool_lock:
+            return self.loaded_models.pop(key, None) is not None
+
+    def stats(self):
+        with self._pool_lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "used_bytes": sum(size for _, size in self.loaded_models.values()),
+                "models": [{"model_name": name, "params": params, "size": size}
+                           for (name, params), (_, size) in self.loaded_models.items()],
+            }
+
+    @staticmethod
+    def resolve(model_info: ModelInfo) -> Tuple[str, Dict[str, Any]]:
+        """把模型管理中的ModelInfo映射为(注册表模型名, 构造参数)
+
+        config中可用"engine"指定模型实现（whisper/funasr/kimi-audio/funasr-punc），
+        "params"指定构造参数；未指定时按名称前缀推断，如"whisper-base"。
+        """
+        config = model_info.config if isinstance(model_info.config, dict) else {}
+        engine = config.get("engine")
+        if not engine:
+            if model_info.name in MODEL_REGISTRY or model_info.name in PUNC_MODEL_REGISTRY:
+                engine = model_info.name
+            else:
+                engine = model_info.name.split("-")[0]
+        params = dict(config.get("params") or {})
+        return engine, params
+
     def load_model(self, model_info: ModelInfo):
-        # TODO: 按类型加载模型（如whisper、funasr等），这里只做占位
-        if model_info.name in self.loaded_models:
+        engine, params = self.resolve(model_info)
+        if engine not in MODEL_REGISTRY and engine not in PUNC_MODEL_REGISTRY:
+            return False, f"不支持的模型: {engine}"
+        if self.is_loaded(model_info):
             return False, "模型已加载"
-        # 这里应根据model_info.type和local_path实际加载模型
-        self.loaded_models[model_info.name] = f"Loaded({model_info.name})"
+        try:
+            self.get_model(engine, params)
+        except Exception as e:
+            logger.error(f"模型加载失败: {model_info.name}, 错误: {e}")
+            return False, f"模型加载失败: {e}"
         return True, "加载成功"
 
     def unload_model(self, model_info: ModelInfo):
-        if model_info.name not in self.loaded_models:
+        engine, params = self.resolve(model_info)
+        if not self.release(engine, params):
             return False, "模型未加载"
-        del self.loaded_models[model_info.name]
         return True, "已卸载"
 
     def is_loaded(self, model_info: ModelInfo):
-        return model_info.name in self.loaded_models 
\ No newline at end of file
+        engine, params = self.resolve(model_info)
+        key = (engine, normalize_params(params))
+        with self._pool_lock:
+            return key in self.loaded_models
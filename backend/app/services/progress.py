@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 进度回调的最小间隔（秒），避免每个片段都写一次数据库
+PROGRESS_INTERVAL = float(os.getenv("ASR_PROGRESS_INTERVAL", "1.0"))
+
+
+class ProgressTracker:
+    """识别进度跟踪，节流后通过回调上报
+
+    上报事件字段：status, progress, segments_done, segments_total,
+    processed_seconds, duration, realtime_factor（墙钟耗时/已处理音频时长）。
+    片段完成回调可能来自多个worker线程，内部加锁。
+    """
+
+    def __init__(self, callback: Optional[Callable[[Dict[str, Any]], None]],
+                 duration: Optional[float] = None, interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.duration = duration
+        self.interval = interval
+        self.segments_done = 0
+        self.segments_total: Optional[int] = None
+        self.processed_seconds = 0.0
+        self.start_time = time.monotonic()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.start_time
+        if self.segments_total:
+            progress = self.segments_done / self.segments_total
+        elif self.duration:
+            progress = self.processed_seconds / self.duration
+        else:
+            progress = 0.0
+        return {
+            "status": "running",
+            # 最终的1.0由任务完成时写入
+            "progress": round(min(progress, 0.99), 4),
+            "segments_done": self.segments_done,
+            "segments_total": self.segments_total,
+            "processed_seconds": round(self.processed_seconds, 3),
+            "duration": self.duration,
+            "realtime_factor": round(elapsed / self.processed_seconds, 4) if self.processed_seconds else None,
+        }
+
+    def _emit(self, force: bool = False):
+        if not self.callback:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            event = self.snapshot()
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.warning(f"进度上报失败: {e}")
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._emit(force=True)
+
+    def segment_done(self, seconds: float):
+        with self._lock:
+            self.segments_done += 1
+            self.processed_seconds += seconds
+            # 最后一个片段完成时不节流，保证最终进度一定上报
+            last = self.segments_total is not None and self.segments_done >= self.segments_total
+        self._emit(force=last)
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.segments_total = total
+        self._emit(force=True)
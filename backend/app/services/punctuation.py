@@ -0,0 +1,143 @@
+"""识别文本的标点恢复阶段
+
+规则清洗（口头禅、重复字、空白）和规则标点由 prepare 完成，识别服务在识别worker内调用（多进程后端下即worker进程）；
+标点也可以用模型恢复。
+模型标点是独立的批处理阶段：不同任务、不同片段的文本按标点模型合并成批，模型常驻在ModelManager的模型池中。
+任务通过model_params中的"punc"选择，该键不参与识别模型的构造和合批：
+
+    缺省 / "rule"            规则标点（语气词、长句补句号），缺省值可由ASR_PUNC_DEFAULT修改
+    "none" / false           只清洗，不加标点
+    "ct-punc"                FunASR标点模型名
+    {"model": "ct-punc", ...} 模型名及其他构造参数，可用"engine"指定其他标点模型实现
+"""
+import os
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .batch_scheduler import BatchScheduler
+from .model_manager import ModelManager, PUNC_MODEL_REGISTRY, normalize_params
+from . import text_postprocess
+
+logger = logging.getLogger(__name__)
+
+PUNC_PARAM = "punc"
+DEFAULT_PUNC = os.getenv("ASR_PUNC_DEFAULT", "rule")
+DEFAULT_PUNC_ENGINE = "funasr-punc"
+# 标点模型的worker数量及微批参数，标点模型比识别模型小得多，批可以更大
+PUNC_WORKERS = int(os.getenv("ASR_PUNC_WORKERS", "1"))
+PUNC_BATCH_MAX_SIZE = int(os.getenv("ASR_PUNC_BATCH_MAX_SIZE", "32"))
+PUNC_BATCH_MAX_WAIT_MS = int(os.getenv("ASR_PUNC_BATCH_MAX_WAIT_MS", "20"))
+
+
+class PostConfig(NamedTuple):
+    language: Optional[str] = None
+    mode: str = "rule"  # rule/none/model
+    model_key: Optional[Tuple[str, str]] = None  # 标点模型在模型池中的(模型名, 参数)
+
+
+def parse_punc(value: Any) -> Tuple[str, Optional[Tuple[str, str]]]:
+    """解析"punc"配置，返回(模式, 标点模型key)"""
+    if value is None:
+        value = DEFAULT_PUNC
+    if value is False or (isinstance(value, str) and value.lower() in ("", "none", "off")):
+        return "none", None
+    if value is True or value == "rule":
+        return "rule", None
+    if isinstance(value, str):
+        engine, params = DEFAULT_PUNC_ENGINE, {"model_name": value}
+    elif isinstance(value, dict):
+        params = dict(value)
+        engine = params.pop("engine", DEFAULT_PUNC_ENGINE)
+        model = params.pop("model", None)
+        if model:
+            params["model_name"] = model
+    else:
+        raise ValueError(f"不支持的标点配置: {value}")
+    if engine not in PUNC_MODEL_REGISTRY:
+        raise ValueError(f"不支持的标点模型: {engine}")
+    return "model", (engine, normalize_params(params))
+
+
+def split_params(model_params: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], PostConfig]:
+    """拆分任务参数：返回识别模型参数和后处理配置，配置不合法时抛出ValueError"""
+    params = dict(model_params or {})
+    mode, model_key = parse_punc(params.pop(PUNC_PARAM, None))
+    return params, PostConfig(params.get("language"), mode, model_key)
+
+
+def _run_punc_batch(key: Tuple[str, str], items: List[Tuple[str, Optional[str]]]) -> List[str]:
+    """批量标点恢复，items为(清洗后的文本, 语言)；模型不可用时退回规则标点，不让任务失败"""
+    engine, params_key = key
+    texts = [text for text, _ in items]
+    try:
+        model = ModelManager.instance().get_model(engine, json.loads(params_key))
+        logger.info(f"开始批量标点: {len(items)}段文本 使用模型: {engine} {params_key}")
+        return model.punctuate_batch(texts)
+    except Exception as e:
+        logger.warning(f"批量标点失败，改用规则标点: {engine} {params_key}, 错误: {e}")
+        return [text_postprocess.process(text, language, clean=False) for text, language in items]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> BatchScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BatchScheduler(_run_punc_batch, max_batch_size=PUNC_BATCH_MAX_SIZE,
+                                            max_wait=PUNC_BATCH_MAX_WAIT_MS / 1000, max_workers=PUNC_WORKERS,
+                                            name="punc")
+    return _scheduler
+
+
+def prepare(text: str, config: PostConfig) -> str:
+    """规则阶段：清洗，rule模式同时加规则标点；model模式只清洗，标点留给 punctuate"""
+    return text_postprocess.process(text, config.language, punctuate=config.mode == "rule")
+
+
+def punctuate(text: str, config: PostConfig) -> Future:
+    """对 prepare 后的文本做模型标点，进入批处理队列；非model模式直接返回原文本"""
+    if config.mode != "model" or not text:
+        future = Future()
+        future.set_result(text)
+        return future
+    return get_scheduler().submit(config.model_key, (text, config.language))
+
+
+def submit(text: str, config: PostConfig) -> Future:
+    """对识别文本做后处理，规则处理直接完成，模型标点进入批处理队列"""
+    return punctuate(prepare(text, config), config)
+
+
+def submit_many(texts: List[str], config: PostConfig, prepared: bool = False) -> Future:
+    """提交多段文本（如全文和各句），全部完成后Future结果为等长的列表；prepared表示已经过 prepare"""
+    stage = punctuate if prepared else submit
+    futures = [stage(text, config) for text in texts]
+    target = Future()
+    if not futures:
+        target.set_result([])
+        return target
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            target.set_result([fut.result() for fut in futures])
+        except Exception as e:
+            target.set_exception(e)
+    for fut in futures:
+        fut.add_done_callback(done)
+    return target
+
+
+def apply(text: str, config: PostConfig) -> str:
+    return submit(text, config).result()
@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db.models import TranscriptCache
+from .model_manager import normalize_params
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("ASR_CACHE_ENABLED", "1") == "1"
+# 缓存上限：条目数、内容总大小（MB）、存活时间（小时），0表示不限制
+CACHE_MAX_ENTRIES = int(os.getenv("ASR_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_MB = int(os.getenv("ASR_CACHE_MAX_MB", "512"))
+CACHE_TTL_HOURS = float(os.getenv("ASR_CACHE_TTL_HOURS", "168"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_metrics_lock = threading.Lock()
+_metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _count(name: str, n: int = 1):
+    with _metrics_lock:
+        _metrics[name] += n
+
+
+def hash_file(path: str) -> str:
+    """分块计算文件sha256，不把整个文件读入内存"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def make_key(audio_hash: str, model_name: str, model_params: Optional[Dict[str, Any]]) -> str:
+    raw = f"{audio_hash}|{model_name}|{normalize_params(model_params)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(db: Session, key: str) -> Optional[TranscriptCache]:
+    entry = db.query(TranscriptCache).filter(TranscriptCache.cache_key == key).first()
+    if entry and CACHE_TTL_HOURS > 0 and entry.create_time < datetime.utcnow() - timedelta(hours=CACHE_TTL_HOURS):
+        db.delete(entry)
+        db.commit()
+        _count("evictions")
+        entry = None
+    if not entry:
+        _count("misses")
+        return None
+    entry.hits = (entry.hits or 0) + 1
+    entry.last_access = datetime.utcnow()
+    db.commit()
+    _count("hits")
+    return entry
+
+
+def lookup_many(db: Session, keys: Iterable[str]) -> Dict[str, TranscriptCache]:
+    """批量查询缓存，一次查询返回 {cache_key: 缓存条目}"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    entries = db.query(TranscriptCache).filter(TranscriptCache.cache_key.in_(keys)).all()
+    now = datetime.utcnow()
+    expired = [e for e in entries
+               if CACHE_TTL_HOURS > 0 and e.create_time < now - timedelta(hours=CACHE_TTL_HOURS)]
+    for entry in expired:
+        db.delete(entry)
+    found = {e.cache_key: e for e in entries if e not in expired}
+    for entry in found.values():
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_access = now
+    db.flush()
+    _count("hits", len(found))
+    _count("misses", len(keys) - len(found))
+    if expired:
+        _count("evictions", len(expired))
+    return found
+
+
+def store(db: Session, key: str, audio_hash: str, model_name: str, model_params: Optional[Dict[str, Any]],
+          text: str, segments: Optional[List[Dict[str, Any]]] = None):
+    size = len((text or "").encode("utf-8")) + len(json.dumps(segments or [], ensure_ascii=False).encode("utf-8"))
+    entry = db.query(TranscriptCache).filter(TranscriptCache.cache_key == key).first()
+    if not entry:
+        entry = TranscriptCache(cache_key=key, audio_hash=audio_hash, model_name=model_name,
+                                model_params=normalize_params(model_params))
+        db.add(entry)
+    entry.recognized_text = text
+    entry.segments = segments or []
+    entry.size = size
+    entry.create_time = entry.last_access = datetime.utcnow()
+    db.commit()
+    _count("stores")
+    _enforce_limits(db)
+
+
+def _enforce_limits(db: Session):
+    """按最近访问时间淘汰，直到条目数和总大小都在上限内"""
+    evicted = 0
+    if CACHE_TTL_HOURS > 0:
+        expire_before = datetime.utcnow() - timedelta(hours=CACHE_TTL_HOURS)
+        evicted += db.query(TranscriptCache).filter(TranscriptCache.create_time < expire_before) \
+            .delete(synchronize_session=False)
+    count, total = db.query(func.count(TranscriptCache.id), func.coalesce(func.sum(TranscriptCache.size), 0)).one()
+    max_bytes = CACHE_MAX_MB * 1024 * 1024
+    over_count = CACHE_MAX_ENTRIES > 0 and count > CACHE_MAX_ENTRIES
+    over_size = CACHE_MAX_MB > 0 and total > max_bytes
+    if over_count or over_size:
+        rows = db.query(TranscriptCache.id, TranscriptCache.size).order_by(TranscriptCache.last_access).yield_per(500)
+        victims = []
+        for row_id, size in rows:
+            if (CACHE_MAX_ENTRIES <= 0 or count <= CACHE_MAX_ENTRIES) and (CACHE_MAX_MB <= 0 or total <= max_bytes):
+                break
+            victims.append(row_id)
+            count -= 1
+            total -= size or 0
+        if victims:
+            evicted += db.query(TranscriptCache).filter(TranscriptCache.id.in_(victims)) \
+                .delete(synchronize_session=False)
+    if evicted:
+        db.commit()
+        _count("evictions", evicted)
+
+
+def stats(db: Session) -> Dict[str, Any]:
+    count, total = db.query(func.count(TranscriptCache.id), func.coalesce(func.sum(TranscriptCache.size), 0)).one()
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics["hits"] + metrics["misses"]
+    metrics.update({
+        "enabled": CACHE_ENABLED,
+        "entries": count,
+        "bytes": total,
+        "hit_rate": round(metrics["hits"] / lookups, 4) if lookups else None,
+    })
+    return metrics
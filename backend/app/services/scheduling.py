@@ -0,0 +1,94 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db.models import ASRTask, Job
+
+logger = logging.getLogger(__name__)
+
+# 优先级类别，数值越大越优先
+PRIORITY_CLASSES = {"high": 2, "normal": 1, "low": 0}
+# 无法得知音频时长时的预估工作量（秒）
+DEFAULT_EXPECTED_SECONDS = float(os.getenv("ASR_DEFAULT_EXPECTED_SECONDS", "60"))
+# 老化系数：每等待1秒，预估工作量按该值折减，避免长任务在短任务持续涌入时饿死
+AGING_FACTOR = float(os.getenv("ASR_SCHED_AGING_FACTOR", "1.0"))
+# 准入控制：预估积压（秒）超过阈值时拒绝或延后，0表示不限制
+ADMISSION_MAX_BACKLOG = float(os.getenv("ASR_ADMISSION_MAX_BACKLOG_SECONDS", "0"))
+ADMISSION_MODE = os.getenv("ASR_ADMISSION_MODE", "defer")  # reject 或 defer
+# 全部worker的并行处理能力（同时处理的音频路数）及默认实时率
+ADMISSION_CAPACITY = float(os.getenv("ASR_ADMISSION_CAPACITY", os.getenv("ASR_WORKERS", "2")))
+DEFAULT_REALTIME_FACTOR = float(os.getenv("ASR_DEFAULT_REALTIME_FACTOR", "0.3"))
+
+
+def priority_value(priority_class: Optional[str]) -> int:
+    if priority_class not in PRIORITY_CLASSES:
+        raise ValueError(f"不支持的优先级: {priority_class}")
+    return PRIORITY_CLASSES[priority_class]
+
+
+def expected_seconds(duration: Optional[float]) -> float:
+    return duration if duration and duration > 0 else DEFAULT_EXPECTED_SECONDS
+
+
+def order_candidates(candidates: List[Job], running_by_submitter: Dict[Optional[str], int],
+                     now: datetime) -> List[Job]:
+    """对待领取任务排序：优先级类别 > 提交方公平份额 > 预估最短作业优先
+
+    同一优先级内每次挑选当前运行任务最少的提交方（已挑出的任务也计入），
+    再从该提交方的任务里取老化折减后预估工作量最小的，实现按提交方轮转的短作业优先。
+    """
+    running = defaultdict(int, running_by_submitter)
+    by_priority: Dict[int, Dict[Optional[str], List[Job]]] = defaultdict(lambda: defaultdict(list))
+    for job in candidates:
+        by_priority[job.priority][job.submitter].append(job)
+    ordered = []
+    for priority in sorted(by_priority.keys(), reverse=True):
+        queues = by_priority[priority]
+        for jobs in queues.values():
+            jobs.sort(key=lambda j: (_effective_cost(j, now), j.id), reverse=True)
+        while queues:
+            submitter = min(queues.keys(), key=lambda s: (running[s], _effective_cost(queues[s][-1], now)))
+            ordered.append(queues[submitter].pop())
+            running[submitter] += 1
+            if not queues[submitter]:
+                del queues[submitter]
+    return ordered
+
+
+def _effective_cost(job: Job, now: datetime) -> float:
+    waited = (now - job.create_time).total_seconds() if job.create_time else 0.0
+    return expected_seconds(job.expected_seconds) - AGING_FACTOR * waited
+
+
+def estimate_realtime_factor(db: Session) -> float:
+    """最近完成任务的平均实时率"""
+    recent = db.query(ASRTask.realtime_factor).filter(ASRTask.realtime_factor.isnot(None)) \
+        .order_by(ASRTask.id.desc()).limit(50).all()
+    values = [r for (r,) in recent if r and r > 0]
+    return sum(values) / len(values) if values else DEFAULT_REALTIME_FACTOR
+
+
+def estimate_backlog(db: Session) -> float:
+    """预估清空当前队列所需的墙钟时间（秒）"""
+    pending_seconds = db.query(func.coalesce(func.sum(Job.expected_seconds), 0.0)) \
+        .filter(Job.status.in_(["pending", "running"])).scalar() or 0.0
+    return pending_seconds * estimate_realtime_factor(db) / max(ADMISSION_CAPACITY, 1.0)
+
+
+def admit(db: Session, priority_class: str) -> Tuple[bool, float, float]:
+    """准入控制，返回(是否接收, 延后秒数, 当前预估积压秒数)
+
+    积压超过阈值时：reject模式拒绝非high任务；defer模式接收但延后到积压回落后再调度。
+    high优先级任务始终接收。
+    """
+    if ADMISSION_MAX_BACKLOG <= 0:
+        return True, 0.0, 0.0
+    backlog = estimate_backlog(db)
+    if backlog <= ADMISSION_MAX_BACKLOG or priority_class == "high":
+        return True, 0.0, backlog
+    if ADMISSION_MODE == "reject":
+        return False, 0.0, backlog
+    return True, backlog - ADMISSION_MAX_BACKLOG, backlog
@@ -0,0 +1,211 @@
+"""识别文本和摘要的全文检索
+
+SQLite上使用FTS5虚拟表 result_fts，rowid 对应 asr_results.id。索引由 ASRResult 的ORM事件
+（after_insert/after_update/after_delete）在同一事务中维护，因此 asr_results 的写入必须通过ORM对象完成：
+db.query(ASRResult).update()/delete() 之类的批量语句和原生SQL不会触发这些事件，索引会与表内容不一致。
+确需批量修改时，改完后调用 rebuild_index 重建索引。
+"""
+import os
+import re
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event, inspect, or_, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from ..db.models import ASRResult, ASRTask, AudioFile
+from . import tokenizer
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "result_fts"
+# 摘要片段的前后字符数
+SNIPPET_CHARS = int(os.getenv("ASR_SEARCH_SNIPPET_CHARS", "40"))
+BACKFILL_BATCH = 500
+
+# 分词见 tokenizer 模块，切分在Python中完成，FTS5只按空格分词，不依赖ICU等扩展分词器
+# 查询语法：双引号内为短语，其余按空白分隔的词，全部词需同时匹配
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(content: Optional[str]) -> str:
+    """索引用分词，每段中日韩文字额外保留末字，使单字查询能用前缀匹配到所有位置"""
+    return " ".join(tokenizer.tokenize(content, keep_last_char=True))
+
+
+def _query_tokens(term: str) -> Tuple[List[str], bool]:
+    """查询词的分词结果及是否为前缀查询（单个中日韩字符）"""
+    tokens = tokenizer.tokenize(term)
+    prefix = len(tokens) == 1 and tokenizer.is_cjk_char(tokens[0])
+    return tokens, prefix
+
+
+def parse_query(query: str) -> Tuple[str, List[str]]:
+    """把用户查询转换为FTS5表达式，同时返回用于高亮的原始词"""
+    clauses, terms = [], []
+    for match in _QUERY_RE.finditer(query or ""):
+        term = (match.group(1) if match.group(1) is not None else match.group(2)).strip()
+        tokens, prefix = _query_tokens(term)
+        if not tokens:
+            continue
+        # 相邻二元组作为短语匹配，等价于原文中连续出现
+        phrase = '"' + " ".join(t.replace('"', '""') for t in tokens) + '"'
+        clauses.append(phrase + "*" if prefix else phrase)
+        terms.append(term)
+    return " AND ".join(clauses), terms
+
+
+def is_supported(bind) -> bool:
+    # FTS5只在SQLite上可用
+    return bind.dialect.name == "sqlite"
+
+
+# ---- 索引维护 ----
+def create_index(conn: Connection):
+    conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                      f"USING fts5(recognized_text, summary, tokenize='unicode61')"))
+
+
+def rebuild_index(conn: Connection) -> int:
+    """按批重建全部索引"""
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    last_id, total = 0, 0
+    while True:
+        rows = conn.execute(text("SELECT id, recognized_text, summary FROM asr_results WHERE id > :last "
+                                 "ORDER BY id LIMIT :n"), {"last": last_id, "n": BACKFILL_BATCH}).fetchall()
+        if not rows:
+            return total
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, recognized_text, summary) VALUES (:id, :t, :s)"),
+                     [{"id": r[0], "t": tokenize(r[1]), "s": tokenize(r[2])} for r in rows])
+        last_id = rows[-1][0]
+        total += len(rows)
+
+
+def _index_result(connection: Connection, target: ASRResult):
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, recognized_text, summary) VALUES (:id, :t, :s)"),
+                       {"id": target.id, "t": tokenize(target.recognized_text), "s": tokenize(target.summary)})
+
+
+def _unindex_result(connection: Connection, result_id: int):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": result_id})
+
+
+# 识别结果写入、修改、删除时在同一事务中更新索引；批量update/delete不会触发，见模块说明
+@event.listens_for(ASRResult, "after_insert")
+def _after_insert(mapper, connection, target):
+    if is_supported(connection):
+        _index_result(connection, target)
+
+
+@event.listens_for(ASRResult, "after_update")
+def _after_update(mapper, connection, target):
+    if not is_supported(connection):
+        return
+    attrs = inspect(target).attrs
+    if attrs.recognized_text.history.has_changes() or attrs.summary.history.has_changes():
+        _unindex_result(connection, target.id)
+        _index_result(connection, target)
+
+
+@event.listens_for(ASRResult, "after_delete")
+def _after_delete(mapper, connection, target):
+    if is_supported(connection):
+        _unindex_result(connection, target.id)
+
+
+# ---- 查询 ----
+def _highlight_pattern(terms: List[str]) -> Optional[re.Pattern]:
+    parts = [r"\s*".join(re.escape(ch) for ch in term if not ch.isspace()) for term in terms]
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+    # 长词优先，避免短词截断长词的高亮
+    return re.compile("|".join(sorted(parts, key=len, reverse=True)), re.IGNORECASE)
+
+
+def make_snippet(content: Optional[str], pattern: Optional[re.Pattern], mark: Tuple[str, str] = ("<mark>", "</mark>"),
+                 width: int = SNIPPET_CHARS) -> Optional[str]:
+    """截取第一个命中位置前后的文字并高亮其中所有命中"""
+    if not content or not pattern:
+        return None
+    first = pattern.search(content)
+    if not first:
+        return None
+    start = max(0, first.start() - width)
+    end = min(len(content), first.end() + width)
+    window = pattern.sub(lambda m: f"{mark[0]}{m.group(0)}{mark[1]}", content[start:end])
+    return ("…" if start > 0 else "") + window + ("…" if end < len(content) else "")
+
+
+def _fts_column(field: str) -> str:
+    return {"text": "recognized_text", "summary": "summary"}.get(field, "")
+
+
+def search(db: Session, query: str, field: str = "all", model_name: Optional[str] = None,
+           since: Optional[datetime] = None, until: Optional[datetime] = None,
+           limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """全文检索识别文本和摘要，按相关度排序，返回 {"total", "items"}"""
+    expression, terms = parse_query(query)
+    if not expression:
+        raise ValueError("查询内容为空")
+    filters, params = [], {"limit": limit, "offset": offset}
+    if model_name:
+        filters.append("t.model_name = :model_name")
+        params["model_name"] = model_name
+    if since:
+        filters.append("r.create_time >= :since")
+        params["since"] = since
+    if until:
+        filters.append("r.create_time < :until")
+        params["until"] = until
+    if is_supported(db.get_bind()):
+        column = _fts_column(field)
+        params["q"] = f"{column} : ({expression})" if column else expression
+        where = " AND ".join([f"{FTS_TABLE} MATCH :q"] + filters)
+        base = (f"FROM {FTS_TABLE} JOIN asr_results r ON r.id = {FTS_TABLE}.rowid "
+                f"LEFT JOIN asr_tasks t ON t.id = r.task_id WHERE {where}")
+        total = db.execute(text(f"SELECT count(*) {base}"), params).scalar()
+        ids = [row[0] for row in db.execute(text(f"SELECT r.id {base} ORDER BY bm25({FTS_TABLE}) "
+                                                 f"LIMIT :limit OFFSET :offset"), params)]
+    else:
+        # 非SQLite数据库退化为LIKE匹配，按时间倒序
+        columns = [ASRResult.recognized_text, ASRResult.summary]
+        if field in ("text", "summary"):
+            columns = [getattr(ASRResult, _fts_column(field))]
+        q = db.query(ASRResult.id).outerjoin(ASRTask, ASRTask.id == ASRResult.task_id)
+        for term in terms:
+            q = q.filter(or_(*[col.ilike(f"%{term}%") for col in columns]))
+        if model_name:
+            q = q.filter(ASRTask.model_name == model_name)
+        if since:
+            q = q.filter(ASRResult.create_time >= since)
+        if until:
+            q = q.filter(ASRResult.create_time < until)
+        total = q.count()
+        ids = [row[0] for row in q.order_by(ASRResult.id.desc()).limit(limit).offset(offset)]
+    rows = {}
+    if ids:
+        rows = {row.id: row for row in db.query(
+            ASRResult.id, ASRResult.task_id, ASRResult.recognized_text, ASRResult.summary, ASRResult.create_time,
+            ASRTask.audio_file_id, ASRTask.model_name, AudioFile.filename
+        ).outerjoin(ASRTask, ASRTask.id == ASRResult.task_id)
+            .outerjoin(AudioFile, AudioFile.id == ASRTask.audio_file_id)
+            .filter(ASRResult.id.in_(ids))}
+    pattern = _highlight_pattern(terms)
+    items = []
+    for result_id in ids:
+        row = rows.get(result_id)
+        if not row:
+            continue
+        items.append({
+            "result_id": row.id,
+            "task_id": row.task_id,
+            "audio_file_id": row.audio_file_id,
+            "filename": row.filename,
+            "model_name": row.model_name,
+            "create_time": row.create_time,
+            "snippet": make_snippet(row.recognized_text, pattern),
+            "summary_snippet": make_snippet(row.summary, pattern),
+        })
+    return {"total": total, "items": items}
+
@@ -0,0 +1,72 @@
+"""识别结果的字幕/带时间戳导出
+
+按句生成SRT、WebVTT和带时间戳的JSON，全部为生成器，导出接口边生成边输出，不拼接整份文件。
+"""
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# 写出缓冲：攒够该字节数再输出一次，避免每条字幕一次写出
+FLUSH_CHARS = 64 * 1024
+# 没有时间戳也不知道音频时长时，按该语速估算整段的结束时间（字/秒）
+FALLBACK_CHARS_PER_SECOND = 5
+
+
+def format_timestamp(seconds: float, decimal: str = ",") -> str:
+    """秒 -> HH:MM:SS,mmm（SRT）或 HH:MM:SS.mmm（WebVTT）"""
+    ms = int(round(max(seconds or 0.0, 0.0) * 1000))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal}{ms:03d}"
+
+
+def fallback_segments(text: Optional[str], duration: Optional[float]) -> List[Dict[str, Any]]:
+    """没有时间戳的旧结果整段作为一句，结束时间取音频时长"""
+    if not text:
+        return []
+    end = duration or max(1.0, len(text) / FALLBACK_CHARS_PER_SECOND)
+    return [{"start": 0.0, "end": round(end, 3), "text": text}]
+
+
+def _cue_text(text: str) -> str:
+    # 字幕以空行分隔，文本内不能有空行
+    return " ".join(line.strip() for line in (text or "").splitlines() if line.strip())
+
+
+def iter_srt(segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    index = 0
+    for seg in segments:
+        text = _cue_text(seg.get("text"))
+        if not text:
+            continue
+        index += 1
+        yield f"{index}\n{format_timestamp(seg['start'])} --> {format_timestamp(seg['end'])}\n{text}\n\n"
+
+
+def iter_vtt(segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield "WEBVTT\n\n"
+    for seg in segments:
+        text = _cue_text(seg.get("text"))
+        if text:
+            yield f"{format_timestamp(seg['start'], '.')} --> {format_timestamp(seg['end'], '.')}\n{text}\n\n"
+
+
+def iter_json(header: Dict[str, Any], segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """输出 {**header, "segments": [...]}，句子逐条序列化"""
+    head = json.dumps(header, ensure_ascii=False)[:-1]
+    yield head + (", " if header else "") + '"segments": ['
+    for i, seg in enumerate(segments):
+        yield ("," if i else "") + json.dumps(seg, ensure_ascii=False)
+    yield "]}"
+
+
+def buffered(parts: Iterable[str], size: int = FLUSH_CHARS) -> Iterator[str]:
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,124 @@
+import json
+import logging
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy.orm import Session
+from ..db import database, models
+from . import job_queue, llm_client, scheduling, summary_service
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "summary"
+
+
+def options_key(algo: str, length: int, detail: int, config: Optional[dict]) -> str:
+    return json.dumps([algo, length, detail, config or {}], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def create_summary_task(db: Session, task: models.ASRTask, algo: str, length: int = 100, detail: int = 1,
+                        config: Optional[dict] = None, submitter: Optional[str] = None, priority: str = "normal",
+                        delay: float = 0.0) -> models.SummaryTask:
+    """创建摘要任务并写入队列，由调用方提交事务
+
+    同一识别结果、相同参数的摘要任务仍在排队或运行时直接返回已有任务。task需已有识别结果（至少已flush）。
+    config中的密钥不保存，任务运行时使用服务端配置的密钥。
+    """
+    if algo not in summary_service.SUMMARY_ALGOS:
+        raise ValueError(f"不支持的摘要算法: {algo}")
+    if priority not in scheduling.PRIORITY_CLASSES:
+        raise ValueError(f"不支持的优先级: {priority}")
+    config = llm_client.strip_secrets(config)
+    key = options_key(algo, length, detail, config)
+    existing = db.query(models.SummaryTask).filter(
+        models.SummaryTask.result_id == task.result.id, models.SummaryTask.options_key == key,
+        models.SummaryTask.status.in_(["pending", "running"])).first()
+    if existing:
+        return existing
+    summary_task = models.SummaryTask(task_id=task.id, result_id=task.result.id, algo=algo, length=length,
+                                      detail=detail, config=config, options_key=key,
+                                      submitter=submitter or task.submitter, priority=priority, status="pending",
+                                      progress=0.0)
+    db.add(summary_task)
+    db.flush()
+    # 同一算法共用一个并发分组，大模型接口的并发不会挤占识别模型的分组
+    job_queue.enqueue(db, JOB_KIND, summary_task.id, priority=scheduling.priority_value(priority),
+                      concurrency_key=f"{JOB_KIND}:{algo}", submitter=summary_task.submitter, delay=delay)
+    return summary_task
+
+
+def chain_summary(db: Session, task: models.ASRTask) -> Optional[models.SummaryTask]:
+    """识别任务带自动摘要参数时创建摘要任务"""
+    options = task.summary_options
+    if not options or not task.result:
+        return None
+    try:
+        return create_summary_task(db, task, options.get("algo", "truncate"), options.get("length", 100),
+                                   options.get("detail", 1), options.get("config"), priority=task.priority or "normal")
+    except ValueError as e:
+        logger.warning(f"自动摘要参数错误: 识别任务#{task.id}, 错误: {e}")
+        return None
+
+
+def _on_progress(summary_task_id: int):
+    def on_progress(progress: float):
+        with database.SessionLocal() as db:
+            db.query(models.SummaryTask).filter(
+                models.SummaryTask.id == summary_task_id, models.SummaryTask.status == "running"
+            ).update({models.SummaryTask.progress: progress}, synchronize_session=False)
+            db.commit()
+    return on_progress
+
+
+def start_summary_job(job: Dict[str, Any]) -> Future:
+    with database.SessionLocal() as db:
+        summary_task = db.query(models.SummaryTask).filter(models.SummaryTask.id == job["ref_id"]).first()
+        result = db.query(models.ASRResult).filter(models.ASRResult.id == summary_task.result_id).first() \
+            if summary_task else None
+        if not result:
+            raise job_queue.PermanentError(f"摘要任务或识别结果不存在: {job['ref_id']}")
+        summary_task.status = "running"
+        summary_task.start_time = summary_task.start_time or datetime.utcnow()
+        text = result.recognized_text or ""
+        algo, length, detail, config = summary_task.algo, summary_task.length, summary_task.detail, summary_task.config
+        db.commit()
+    future = summary_service.submit_summary(text, algo, length, detail, config, on_progress=_on_progress(job["ref_id"]))
+    # 配置错误（如未配置密钥）重试也不会成功，直接标记失败
+    if future.done() and isinstance(future.exception(), ValueError):
+        raise job_queue.PermanentError(str(future.exception()))
+    return future
+
+
+def on_summary_success(db: Session, job: Dict[str, Any], summary: str):
+    summary_task = db.query(models.SummaryTask).filter(models.SummaryTask.id == job["ref_id"]).first()
+    if not summary_task:
+        return None
+    summary_task.status = "finished"
+    summary_task.progress = 1.0
+    summary_task.summary = summary
+    summary_task.error = None
+    summary_task.finish_time = datetime.utcnow()
+    # 与同步接口一致，最新的摘要写入识别结果
+    result = db.query(models.ASRResult).filter(models.ASRResult.id == summary_task.result_id).first()
+    if result:
+        result.summary = summary
+        result.summary_algo = summary_task.algo
+    return None
+
+
+def on_summary_failure(db: Session, job: Dict[str, Any], error: str, final: bool):
+    summary_task = db.query(models.SummaryTask).filter(models.SummaryTask.id == job["ref_id"]).first()
+    if not summary_task:
+        return None
+    summary_task.error = error
+    if not final:
+        # 等待重试
+        summary_task.status = "pending"
+        return None
+    summary_task.status = "failed"
+    summary_task.finish_time = datetime.utcnow()
+    return None
+
+
+job_queue.register_handler(JOB_KIND, job_queue.JobHandler(
+    start=start_summary_job, on_success=on_summary_success, on_failure=on_summary_failure))
@@ -1,43 +1,60 @@
-from typing import List
 import os
-import openai
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from .textrank import textrank_summary
+from . import llm_client
+
+# 本地摘要算法（textrank等）在后台任务中使用的线程数
+SUMMARY_WORKERS = int(os.getenv("ASR_SUMMARY_WORKERS", "2"))
 
 def simple_truncate_summary(text: str, max_length: int = 100) -> str:
     return text[:max_length] + ("..." if len(text) > max_length else "")
 
-# TODO: 可扩展TextRank、LLM等算法
+# 大模型摘要失败时写入摘要的提示前缀
+LLM_ERROR_PREFIX = {"doubao": "豆包", "llm": "LLM"}
 
-def generate_summary(text: str, algo: str = "truncate", length: int = 100, detail: int = 1, config: dict = None) -> str:
+# 后台摘要任务支持的算法
+SUMMARY_ALGOS = ("truncate", "textrank") + tuple(llm_client.PROVIDERS)
+
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+
+def _local_summary(text: str, algo: str, length: int, config: dict = None) -> str:
     if algo == "truncate":
         return simple_truncate_summary(text, max_length=length)
     elif algo == "textrank":
-        # 占位实现
-        return "TextRank摘要算法占位"
-    elif algo == "llm":
-        return "LLM摘要算法占位"
-    elif algo == "doubao":
-        # 通过 OpenAI 兼容 API 调用火山引擎豆包大模型
-        api_base = os.getenv("DOUBAO_API_BASE", "https://ark.cn-beijing.volces.com/api/v3")
-        api_key = os.getenv("DOUBAO_API_KEY", "")
-        model = os.getenv("DOUBAO_MODEL", "doubao-1.6-chat")
-        if config:
-            api_base = config.get("api_base", api_base)
-            api_key = config.get("api_key", api_key)
-            model = config.get("model", model)
-        if not api_key:
-            return "[豆包API密钥未配置]"
-        openai.api_base = api_base
-        openai.api_key = api_key
-        prompt = f"请对以下内容进行专业、简明的中文摘要，字数不超过{length}字：\n{text}"
+        # 本地抽取式摘要，config可指定chunk_sentences
+        return textrank_summary(text, max_length=length, chunk_sentences=(config or {}).get("chunk_sentences"))
+    return text
+
+def submit_summary(text: str, algo: str = "truncate", length: int = 100, detail: int = 1, config: dict = None,
+                   on_progress: Optional[Callable[[float], None]] = None) -> Future:
+    """提交摘要，返回Future；失败时Future抛出异常（供后台任务重试），配置错误时为ValueError且Future已完成"""
+    if algo in llm_client.PROVIDERS:
+        # OpenAI兼容接口：doubao为火山引擎豆包，llm为自定义接口（如本地部署的模型）
+        llm_config = llm_client.resolve_config(algo, config)
+        if algo == "doubao" and not llm_config.api_key:
+            future = Future()
+            future.set_exception(ValueError("豆包API密钥未配置"))
+            return future
+        return llm_client.submit_summary(text, llm_config, length, on_progress=on_progress)
+    return summary_executor.submit(_local_summary, text, algo, length, config)
+
+def generate_summary(text: str, algo: str = "truncate", length: int = 100, detail: int = 1, config: dict = None) -> str:
+    if algo not in llm_client.PROVIDERS:
+        return _local_summary(text, algo, length, config)
+    try:
+        return submit_summary(text, algo, length, detail, config).result()
+    except Exception as e:
+        return f"[{LLM_ERROR_PREFIX[algo]}摘要失败]{e}"
+
+async def generate_summary_async(text: str, algo: str = "truncate", length: int = 100, detail: int = 1,
+                                 config: dict = None) -> str:
+    """异步版本：大模型请求不占用线程，本地算法在线程池中执行"""
+    if algo in llm_client.PROVIDERS:
         try:
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=length*2
-            )
-            return response.choices[0].message.content.strip()
+            return await asyncio.wrap_future(submit_summary(text, algo, length, detail, config))
         except Exception as e:
-            return f"[豆包摘要失败]{e}"
-    else:
-        return text 
\ No newline at end of file
+            return f"[{LLM_ERROR_PREFIX[algo]}摘要失败]{e}"
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, generate_summary, text, algo, length, detail, config)
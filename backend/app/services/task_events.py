@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import logging
+from typing import Any, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+# 每个任务最多缓存的事件数，供晚到的订阅者回放
+MAX_HISTORY = 10000
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, event: Dict[str, Any]):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # 订阅方的事件循环已关闭
+            pass
+
+
+class TaskEventBroker:
+    """进程内的任务事件发布/订阅
+
+    识别流水线在worker线程中发布事件（segment/progress/final），
+    流式接口在事件循环中订阅。运行中任务的事件会缓存，新订阅者先回放已产生的片段，
+    任务结束后清除缓存，之后的订阅者直接从数据库读取最终结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[_Subscriber]] = {}
+        self._history: Dict[int, List[Dict[str, Any]]] = {}
+
+    def publish(self, task_id: int, event: Dict[str, Any]):
+        with self._lock:
+            history = self._history.setdefault(task_id, [])
+            # progress事件只需保留最新一条
+            if event.get("type") == "progress" and history and history[-1].get("type") == "progress":
+                history[-1] = event
+            elif len(history) < MAX_HISTORY:
+                history.append(event)
+            subscribers = list(self._subscribers.get(task_id, ()))
+            if event.get("type") == "final":
+                self._history.pop(task_id, None)
+        for sub in subscribers:
+            sub.put(event)
+
+    def subscribe(self, task_id: int) -> _Subscriber:
+        """必须在事件循环中调用，返回的订阅者队列会先收到已缓存的事件"""
+        sub = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            for event in self._history.get(task_id, []):
+                sub.queue.put_nowait(event)
+            self._subscribers.setdefault(task_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, task_id: int, sub: _Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(task_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[task_id]
+
+
+broker = TaskEventBroker()
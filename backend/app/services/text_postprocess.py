@@ -0,0 +1,274 @@
+"""识别文本后处理引擎
+
+规则集只编译一次：口头禅短语编译为字典树，其余规则编译为正则。StreamProcessor支持分块输入，
+长音频按片段或流式输出时可以增量处理，分块处理的结果与一次性处理整段文本相同。
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+_NO_PRIORITY = float("inf")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _char_class(chars: Iterable[str]) -> str:
+    return "[" + "".join(re.escape(c) for c in sorted(chars)) + "]"
+
+
+class RuleSet:
+    """一种语言的后处理规则
+
+    fillers: 口头禅短语，按优先级排列；同一位置有多个短语可匹配时取靠前的一个（与正则分支的选择顺序一致）
+    filler_mode: collapse 把连续的口头禅合并为最后一个；remove 直接删除
+    word_boundary: 口头禅前后必须是非字母数字字符（用于英文等按空格分词的语言）
+    repeat_min: 同一字符连续出现不少于该次数时合并为一个，0表示不处理
+    marks: 语气词 -> 追加的标点
+    sentence_max: 文本末尾不含句末标点的连续字符数不少于该值时补句号，0表示不处理
+    terminators: 句末标点，连续多个时只保留最后一个
+    """
+
+    def __init__(self, name: str, fillers: Iterable[str] = (), filler_mode: str = "collapse",
+                 word_boundary: bool = False, ignore_case: bool = False, repeat_min: int = 3,
+                 marks: Optional[Dict[str, str]] = None, sentence_max: int = 0, sentence_end: str = "。",
+                 terminators: str = ""):
+        if filler_mode not in ("collapse", "remove"):
+            raise ValueError(f"不支持的口头禅处理方式: {filler_mode}")
+        self.name = name
+        self.fillers = list(fillers)
+        self.filler_mode = filler_mode
+        self.word_boundary = word_boundary
+        self.ignore_case = ignore_case
+        self.repeat_min = repeat_min
+        self.marks = dict(marks or {})
+        self.sentence_max = sentence_max
+        self.sentence_end = sentence_end
+        self.terminators = frozenset(terminators)
+        self.trie = self._compile(self.fillers)
+        self.repeat_re = re.compile(r"(.)\1{%d,}" % (repeat_min - 1), re.S) if repeat_min > 1 else None
+        flags = re.IGNORECASE if ignore_case else 0
+        self.root_re = re.compile(_char_class(self.trie.keys()), flags) if self.trie else None
+        self.marks_re = re.compile(_char_class(self.marks.keys())) if self.marks else None
+        # 连续句末标点只保留最后一个：删除后面紧跟句末标点的句末标点
+        self.terminator_re = re.compile(f"{_char_class(self.terminators)}+(?={_char_class(self.terminators)})") \
+            if self.terminators else None
+
+    def mark_for(self, match) -> str:
+        ch = match.group(0)
+        return ch + self.marks[ch]
+
+    def _compile(self, fillers: List[str]):
+        # 节点: [子节点字典, 以该节点结尾的短语优先级, 子树中（不含自身）的最小优先级]
+        root = [{}, _NO_PRIORITY, _NO_PRIORITY]
+        for priority, phrase in enumerate(fillers):
+            if self.ignore_case:
+                phrase = phrase.lower()
+            node = root
+            for ch in phrase:
+                node[2] = min(node[2], priority)
+                node = node[0].setdefault(ch, [{}, _NO_PRIORITY, _NO_PRIORITY])
+            node[1] = min(node[1], priority)
+        return root[0]
+
+
+# 中文规则与原先的正则规则等价：
+# 口头禅分支中"就是"排在"就是说"等之前，正则总是先匹配"就是"，后面的长短语实际不会生效，这里保持相同的顺序
+ZH_RULES = RuleSet(
+    "zh",
+    fillers=["的", "啊", "嗯", "吧", "呢", "嘛", "哦", "呃", "这个", "那个", "就是", "然后", "所以",
+             "就是的", "就是说", "就是说的", "就是说啊", "就是说呢", "就是说嘛", "就是说吧", "就是说哦",
+             "就是说呃", "就是说这个", "就是说那个", "就是说就是"],
+    marks={"吗": "？", "吧": "？", "呢": "？", "啊": "！", "呀": "！", "哇": "！"},
+    sentence_max=20, sentence_end="。", terminators="。！？?",
+)
+
+EN_RULES = RuleSet(
+    "en",
+    fillers=["um", "uh", "erm", "er", "hmm", "mm"],
+    filler_mode="remove", word_boundary=True, ignore_case=True, repeat_min=0,
+    terminators=".!?",
+)
+
+RULE_SETS: Dict[str, RuleSet] = {"zh": ZH_RULES, "en": EN_RULES}
+DEFAULT_LANGUAGE = os.getenv("ASR_POSTPROCESS_LANG", "zh")
+
+
+def get_rules(language: Optional[str] = None) -> RuleSet:
+    """按语言取规则集，未知语言使用默认规则"""
+    if language:
+        rules = RULE_SETS.get(language.lower().split("-")[0])
+        if rules:
+            return rules
+    return RULE_SETS.get(DEFAULT_LANGUAGE, ZH_RULES)
+
+
+class StreamProcessor:
+    """流式后处理
+
+    口头禅阶段用字典树扫描：用预编译的首字字符集跳到下一个可能的口头禅位置，中间的普通文本整段切片复制；
+    其余规则（重复字、空白、语气词标点、断句、标点合并）各自是预编译的线性替换，逐块衔接。
+    feed() 返回已经可以确定的输出，末尾可能受后续输入影响的部分（未完成的口头禅、重复字、空白、句末标点）
+    暂存到下一次feed或finish()。clean/punctuate可分别关闭，对应原先的clean_text和add_punctuation。
+    """
+
+    def __init__(self, rules: RuleSet = ZH_RULES, clean: bool = True, punctuate: bool = True):
+        self.rules = rules
+        self.clean = clean
+        self.punctuate = punctuate
+        self._pending = ""          # 尚未确定能否匹配口头禅的输入
+        self._prev_alnum = False    # 上一个输入字符是否为字母数字（词边界判断）
+        self._last_filler = None    # collapse模式下当前连续口头禅的最后一个
+        self._repeat_tail = ""      # 末尾尚未结束的连续相同字符
+        self._space = False         # 末尾有待输出的空白
+        self._started = False       # 已输出非空白字符（去除开头空白）
+        self._sentence_len = 0      # 自最后一个句末标点起的字符数
+        self._terminator_tail = ""  # 末尾尚未结束的连续句末标点
+
+    # ---- 口头禅 ----
+    def _match(self, s: str, i: int, final: bool) -> Optional[int]:
+        """返回口头禅的结束位置；未匹配返回None；需要更多输入才能确定时返回-1"""
+        rules = self.rules
+        boundary = rules.word_boundary
+        if boundary and self._prev_alnum:
+            return None
+        lower = rules.ignore_case
+        n = len(s)
+        node = rules.trie.get(s[i].lower() if lower else s[i])
+        best_end, best_priority = None, _NO_PRIORITY
+        j = i
+        while node is not None:
+            j += 1
+            if node[1] < best_priority:
+                if boundary and j == n and not final:
+                    return -1
+                if not boundary or j == n or not s[j].isalnum():
+                    best_end, best_priority = j, node[1]
+            if j == n:
+                if not final and node[2] < best_priority:
+                    return -1
+                break
+            node = node[0].get(s[j].lower() if lower else s[j])
+        return best_end
+
+    def _fillers(self, chunk: str, final: bool) -> str:
+        rules = self.rules
+        root_re = rules.root_re
+        s = self._pending + chunk
+        self._pending = ""
+        if root_re is None:
+            return s
+        trie = rules.trie
+        lower = rules.ignore_case
+        collapse = rules.filler_mode == "collapse"
+        boundary = rules.word_boundary
+        out = []
+        i, n = 0, len(s)
+        while i < n:
+            found = root_re.search(s, i)
+            k = found.start() if found else n
+            if k > i:
+                if self._last_filler is not None:
+                    out.append(self._last_filler)
+                    self._last_filler = None
+                out.append(s[i:k])
+                if boundary:
+                    self._prev_alnum = s[k - 1].isalnum()
+                i = k
+                if i == n:
+                    break
+            node = trie[s[i].lower() if lower else s[i]]
+            # 没有更长短语的单字口头禅直接确定，不必逐字匹配
+            end = i + 1 if not node[0] and not boundary else self._match(s, i, final)
+            if end == -1:
+                self._pending = s[i:]
+                break
+            if end is None:
+                if self._last_filler is not None:
+                    out.append(self._last_filler)
+                    self._last_filler = None
+                out.append(s[i])
+                end = i + 1
+            elif collapse:
+                # 连续的口头禅只保留最后一个
+                self._last_filler = s[i:end]
+            if boundary:
+                self._prev_alnum = s[end - 1].isalnum()
+            i = end
+        if final and self._last_filler is not None:
+            out.append(self._last_filler)
+            self._last_filler = None
+        return "".join(out)
+
+    # ---- 重复字、空白 ----
+    def _repeats(self, s: str, final: bool) -> str:
+        repeat_re = self.rules.repeat_re
+        if repeat_re is None:
+            return s
+        s = self._repeat_tail + s
+        self._repeat_tail = ""
+        if not s:
+            return s
+        if not final:
+            # 末尾的连续相同字符可能和下一块连成更长的重复
+            t = len(s) - 1
+            while t > 0 and s[t - 1] == s[-1]:
+                t -= 1
+            s, self._repeat_tail = s[:t], s[t:]
+        return repeat_re.sub(r"\1", s)
+
+    def _spaces(self, s: str, final: bool) -> str:
+        if not s:
+            return s
+        if not self._started or self._space:
+            stripped = s.lstrip()
+            if not stripped:
+                self._space = self._space or self._started
+                return ""
+            s = (" " if self._space and self._started else "") + stripped
+            self._space = False
+            self._started = True
+        body = s.rstrip()
+        if len(body) < len(s):
+            self._space = True
+        return _SPACE_RE.sub(" ", body)
+
+    # ---- 标点 ----
+    def _punctuate(self, s: str, final: bool) -> str:
+        rules = self.rules
+        if rules.marks_re is not None:
+            s = rules.marks_re.sub(rules.mark_for, s)
+        if rules.sentence_max:
+            # 原规则对不少于sentence_max字的无标点片段补句号，片段后已有句末标点时句号会被合并掉，
+            # 因此只有文本末尾的片段需要补，这里只统计末尾片段的长度
+            last = max((s.rfind(t) for t in rules.terminators), default=-1)
+            self._sentence_len = len(s) - last - 1 if last >= 0 else self._sentence_len + len(s)
+            if final and self._sentence_len >= rules.sentence_max:
+                s += rules.sentence_end
+                self._sentence_len = 0
+        if rules.terminator_re is None:
+            return s
+        s = self._terminator_tail + s
+        self._terminator_tail = ""
+        if not final:
+            t = len(s)
+            while t > 0 and s[t - 1] in rules.terminators:
+                t -= 1
+            s, self._terminator_tail = s[:t], s[t:]
+        return rules.terminator_re.sub("", s)
+
+    def _process(self, chunk: str, final: bool) -> str:
+        if self.clean:
+            chunk = self._spaces(self._repeats(self._fillers(chunk, final), final), final)
+        if self.punctuate:
+            chunk = self._punctuate(chunk, final)
+        return chunk
+
+    def feed(self, chunk: str) -> str:
+        return self._process(chunk, final=False)
+
+    def finish(self) -> str:
+        return self._process("", final=True)
+
+
+def process(text: str, language: Optional[str] = None, clean: bool = True, punctuate: bool = True) -> str:
+    processor = StreamProcessor(get_rules(language), clean=clean, punctuate=punctuate)
+    return processor.feed(text or "") + processor.finish()
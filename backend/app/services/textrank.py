@@ -0,0 +1,155 @@
+"""TextRank抽取式摘要
+
+分句 -> 中日韩文字按二元组、其余按单词切分 -> 稀疏TF-IDF（scipy CSR）-> 余弦相似度矩阵 -> 幂迭代求句子得分，
+按得分选句直到达到字数上限，再按原文顺序输出。全部在本地完成，不依赖网络。
+句子数超过TEXTRANK_CHUNK_SENTENCES时分块排序：每块单独构建相似度矩阵并排序，得分按块大小缩放后统一选句，
+相似度矩阵的规模只和块大小有关，与录音时长无关。
+"""
+import os
+import re
+from typing import List, Optional
+import numpy as np
+from scipy import sparse
+from .tokenizer import tokenize
+
+# 分块排序的块大小（句），单块相似度矩阵最多 块大小^2 个元素
+TEXTRANK_CHUNK_SENTENCES = int(os.getenv("ASR_TEXTRANK_CHUNK_SENTENCES", "800"))
+# 没有标点的识别文本按该字数切成"句子"
+SENTENCE_MAX_CHARS = int(os.getenv("ASR_TEXTRANK_SENTENCE_MAX_CHARS", "60"))
+# 少于该字数的句子（如"嗯。""好的。"）不作为摘要候选
+SENTENCE_MIN_CHARS = 4
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+_SENTENCE_RE = re.compile(r"[^。！？!?；;…\n]*[。！？!?；;…\n]+|[^。！？!?；;…\n]+")
+_CLAUSE_RE = re.compile(r"[^，,、\s]*[，,、\s]+|[^，,、\s]+")
+_TERMINATORS = "。！？!?；;…"
+
+
+def _split_long(sentence: str) -> List[str]:
+    """超长句先按逗号、空白切分，仍然过长的部分按字数硬切"""
+    pieces, current = [], ""
+    for clause in _CLAUSE_RE.findall(sentence):
+        while len(clause) > SENTENCE_MAX_CHARS:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(clause[:SENTENCE_MAX_CHARS])
+            clause = clause[SENTENCE_MAX_CHARS:]
+        if current and len(current) + len(clause) > SENTENCE_MAX_CHARS:
+            pieces.append(current)
+            current = ""
+        current += clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in _SENTENCE_RE.findall(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > SENTENCE_MAX_CHARS:
+            sentences.extend(s.strip() for s in _split_long(sentence) if s.strip())
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def tfidf_matrix(sentences: List[str]) -> sparse.csr_matrix:
+    """句子 x 词 的TF-IDF矩阵，行已做L2归一化，行向量点积即余弦相似度"""
+    vocab = {}
+    cols, lengths = [], []
+    for sentence in sentences:
+        ids = [vocab.setdefault(token, len(vocab)) for token in tokenize(sentence)]
+        cols.extend(ids)
+        lengths.append(len(ids))
+    n = len(sentences)
+    rows = np.repeat(np.arange(n), lengths)
+    # 重复的(行, 列)在转换为CSR时累加，得到词频
+    matrix = sparse.coo_matrix((np.ones(len(cols), dtype=np.float64), (rows, np.asarray(cols, dtype=np.int64))),
+                               shape=(n, max(len(vocab), 1))).tocsr()
+    matrix.sum_duplicates()
+    matrix.data = 1.0 + np.log(matrix.data)
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    matrix = matrix.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+def rank(matrix: sparse.csr_matrix) -> np.ndarray:
+    """相似度图上的PageRank幂迭代，返回每个句子的得分"""
+    n = matrix.shape[0]
+    if n <= 2:
+        return np.ones(n) / max(n, 1)
+    similarity = (matrix @ matrix.T).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    degree = np.asarray(similarity.sum(axis=1)).ravel()
+    dangling = degree == 0
+    degree[dangling] = 1.0
+    # 按行归一化得到转移矩阵，迭代时用其转置
+    transition = (sparse.diags(1.0 / degree) @ similarity).T.tocsr()
+    scores = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        # 没有相似句的孤立句把得分均匀分给所有句子
+        updated = (1 - DAMPING) / n + DAMPING * (transition @ scores + scores[dangling].sum() / n)
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+
+def _finish(sentence: str) -> str:
+    # 没有句末标点的片段（无标点识别文本切出的）输出时补句号
+    return sentence if sentence[-1] in _TERMINATORS else sentence + "。"
+
+
+def _select(sentences: List[str], scores: np.ndarray, budget: int) -> List[int]:
+    """按得分从高到低选句，总字数不超过budget，重复的句子只选一次"""
+    chosen, used, seen = [], 0, set()
+    for index in np.argsort(-scores, kind="stable"):
+        sentence = sentences[index]
+        if len(sentence) < SENTENCE_MIN_CHARS or sentence in seen:
+            continue
+        length = len(_finish(sentence))
+        if used + length > budget:
+            continue
+        chosen.append(int(index))
+        seen.add(sentence)
+        used += length
+    return chosen
+
+
+def score_sentences(sentences: List[str], chunk_sentences: Optional[int] = None) -> np.ndarray:
+    """句子得分；句子数超过chunk_sentences时分块排序，块内得分按块大小缩放后全局可比"""
+    chunk_sentences = chunk_sentences or TEXTRANK_CHUNK_SENTENCES
+    n = len(sentences)
+    if n <= chunk_sentences:
+        return rank(tfidf_matrix(sentences))
+    scores = np.empty(n)
+    count = -(-n // chunk_sentences)
+    bounds = np.linspace(0, n, count + 1).astype(int)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        # 每块得分之和为1，乘以块占比后平均每句仍为1/n
+        scores[start:end] = rank(tfidf_matrix(sentences[start:end])) * (end - start) / n
+    return scores
+
+
+def textrank_summary(text: str, max_length: int = 100, chunk_sentences: Optional[int] = None) -> str:
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    if sum(len(_finish(s)) for s in sentences) <= max_length:
+        return "".join(_finish(s) for s in sentences)
+    scores = score_sentences(sentences, chunk_sentences)
+    chosen = _select(sentences, scores, max_length)
+    if not chosen:
+        # 字数上限小于任何一句时截取得分最高的句子
+        return sentences[int(np.argmax(scores))][:max_length]
+    return "".join(_finish(sentences[i]) for i in sorted(chosen))
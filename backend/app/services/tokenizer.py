@@ -0,0 +1,31 @@
+"""文本分词，全文检索和TextRank摘要共用
+
+中日韩字符按重叠二元组切分（"项目进度" -> 项目 目进 进度），单个字保留原字；其余按单词切分并转小写。
+不依赖jieba等分词库，也不需要词典。
+"""
+import re
+from typing import List, Optional
+
+CJK_CHARS = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_RE = re.compile(f"([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)")
+_CJK_RE = re.compile(f"[{CJK_CHARS}]")
+
+
+def tokenize(text: Optional[str], keep_last_char: bool = False) -> List[str]:
+    """keep_last_char 为True时每段中日韩文字额外保留末字"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text or ""):
+        run, word = match.groups()
+        if word:
+            tokens.append(word.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if keep_last_char:
+                tokens.append(run[-1])
+    return tokens
+
+
+def is_cjk_char(token: str) -> bool:
+    return bool(_CJK_RE.fullmatch(token))
@@ -0,0 +1,82 @@
+"""大模型摘要客户端基准
+
+启动一个本地的OpenAI兼容替身服务（固定延迟，按比例返回503），测量并发摘要、分块摘要（map-reduce）
+和缓存命中的耗时，并统计请求数、重试数。不访问外部网络。
+
+    cd backend
+    python benchmarks/bench_llm_summary.py --tasks 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.services import llm_client  # noqa: E402
+
+
+def make_stand_in(latency: float, failure_rate: float) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(0)
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        if rng.random() < failure_rate:
+            return JSONResponse({"error": "overloaded"}, status_code=503, headers={"Retry-After": "0"})
+        prompt = body["messages"][0]["content"]
+        return {"choices": [{"message": {"role": "assistant", "content": f"摘要({len(prompt)}字)"}}]}
+    return app
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=32, help="并发摘要的文本数")
+    parser.add_argument("--latency", type=float, default=0.2, help="替身服务每次响应的延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="替身服务返回503的比例")
+    parser.add_argument("--long-chars", type=int, default=60000, help="分块摘要的文本字数")
+    parser.add_argument("--port", type=int, default=18431)
+    args = parser.parse_args()
+
+    server = serve(make_stand_in(args.latency, args.failure_rate), args.port)
+    config = llm_client.LLMConfig(f"http://127.0.0.1:{args.port}/v1", "test", "stand-in")
+    client = llm_client.get_client()
+
+    def run(texts):
+        start = time.perf_counter()
+        futures = [llm_client.submit_summary(text, config, 100) for text in texts]
+        results = [f.result() for f in futures]
+        return time.perf_counter() - start, results
+
+    short = [f"第{i}段会议记录。" * 50 for i in range(args.tasks)]
+    seconds, _ = run(short)
+    print(f"并发摘要 {args.tasks}段: {seconds:.2f}s（串行约 {args.tasks * args.latency:.2f}s）")
+    long_text = "".join(f"第{i}句讨论项目进度和预算安排。" for i in range(args.long_chars // 15))
+    seconds, _ = run([long_text])
+    print(f"分块摘要 {len(long_text)}字 -> {len(llm_client.chunk_text(long_text, llm_client.LLM_CHUNK_CHARS))}块: "
+          f"{seconds:.2f}s")
+    seconds, _ = run(short + [long_text])
+    print(f"重复请求（缓存）: {seconds * 1000:.1f}ms")
+    print(f"统计: {client.stats}")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
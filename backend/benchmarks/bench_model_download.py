@@ -0,0 +1,158 @@
+"""模型下载基准
+
+启动一个本地的替身文件服务（支持Range，按连接限速，按比例在传输中途断开连接），比较单连接和多连接并行
+分段下载的耗时，并验证SHA256校验、中途取消后的断点续传。不访问外部网络。
+
+    cd backend
+    python benchmarks/bench_model_download.py --size-mb 64 --rate-mb 8 --connections 8
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import model_download  # noqa: E402
+
+BLOCK_SIZE = 64 * 1024
+
+
+def make_stand_in(data: bytes, rate: float, failure_rate: float, ranges: bool = True):
+    """返回(服务类, 统计)，统计记录请求数、断开次数和发送的字节数"""
+    stats = {"requests": 0, "drops": 0, "bytes": 0}
+    lock = threading.Lock()
+    rng = random.Random(0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(data) - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")) if ranges else None
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else end, len(data) - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            with lock:
+                stats["requests"] += 1
+                # 较大的响应按比例在中途断开
+                drop_at = start + rng.randrange(end - start + 1) \
+                    if end - start > BLOCK_SIZE and rng.random() < failure_rate else None
+            position = start
+            while position <= end:
+                block = data[position:min(position + BLOCK_SIZE, end + 1)]
+                if drop_at is not None and position + len(block) > drop_at:
+                    with lock:
+                        stats["drops"] += 1
+                    self.close_connection = True
+                    return
+                try:
+                    self.wfile.write(block)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                with lock:
+                    stats["bytes"] += len(block)
+                position += len(block)
+                if rate:
+                    time.sleep(len(block) / rate)
+    return Handler, stats
+
+
+def serve(handler, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(url: str, path: str, connections: int, sha256: str):
+    model_download.DOWNLOAD_CONNECTIONS = connections
+    start = time.perf_counter()
+    size, digest = asyncio.run(model_download.download(url, path, sha256))
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return size, digest, elapsed
+
+
+async def cancel_then_resume(url: str, path: str, sha256: str, after: float):
+    task = asyncio.ensure_future(model_download.download(url, path, sha256))
+    await asyncio.sleep(after)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return await model_download.download(url, path, sha256)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64, help="替身文件大小（MB）")
+    parser.add_argument("--rate-mb", type=float, default=8, help="每个连接的限速（MB/s），0为不限速")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="响应中途断开的比例")
+    parser.add_argument("--connections", type=int, default=8, help="并行下载的连接数")
+    parser.add_argument("--chunk-mb", type=int, default=4, help="分段大小（MB）")
+    parser.add_argument("--port", type=int, default=18433)
+    args = parser.parse_args()
+
+    data = random.Random(1).randbytes(args.size_mb * 1024 * 1024)
+    sha256 = hashlib.sha256(data).hexdigest()
+    model_download.DOWNLOAD_CHUNK_SIZE = args.chunk_mb * 1024 * 1024
+    model_download.DOWNLOAD_RETRY_BASE = 0.05
+    workdir = tempfile.mkdtemp(prefix="bench-download-")
+    path = os.path.join(workdir, "model.bin")
+    try:
+        handler, stats = make_stand_in(data, args.rate_mb * 1024 * 1024, args.failure_rate)
+        server = serve(handler, args.port)
+        url = f"http://127.0.0.1:{args.port}/model.bin"
+        print(f"文件 {args.size_mb}MB, 每连接限速 {args.rate_mb}MB/s, 中途断开比例 {args.failure_rate}")
+        for connections in (1, args.connections):
+            stats.update(requests=0, drops=0, bytes=0)
+            size, digest, elapsed = run(url, path, connections, sha256)
+            print(f"{connections}个连接: {elapsed:.2f}s, {size / elapsed / 1024 / 1024:.1f}MB/s, "
+                  f"请求{stats['requests']}次, 断开{stats['drops']}次, 校验{'通过' if digest == sha256 else '失败'}")
+        server.shutdown()
+
+        # 断点续传：下载一段时间后取消，再次下载只取剩余的分段
+        handler, stats = make_stand_in(data, args.rate_mb * 1024 * 1024, 0)
+        server = serve(handler, args.port + 1)
+        url = f"http://127.0.0.1:{args.port + 1}/model.bin"
+        model_download.DOWNLOAD_CONNECTIONS = args.connections
+        full = args.size_mb * 1024 * 1024 / (args.rate_mb * 1024 * 1024 * args.connections) if args.rate_mb else 0.5
+        size, digest = asyncio.run(cancel_then_resume(url, path, sha256, full / 2))
+        print(f"取消后续传: 共传输{stats['bytes'] / size:.2f}倍文件大小, 校验{'通过' if digest == sha256 else '失败'}")
+        os.remove(path)
+        server.shutdown()
+
+        # 校验值不一致时下载失败，不留下目标文件和未完成的文件
+        handler, _ = make_stand_in(data, 0, 0)
+        server = serve(handler, args.port + 2)
+        try:
+            asyncio.run(model_download.download(f"http://127.0.0.1:{args.port + 2}/model.bin", path, "0" * 64))
+            print("错误的校验值: 未报错")
+        except model_download.DownloadError as e:
+            print(f"错误的校验值: {e}; 残留文件 {os.listdir(workdir)}")
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
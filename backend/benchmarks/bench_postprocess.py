@@ -0,0 +1,94 @@
+"""识别文本后处理的微基准
+
+对比原先的多遍正则实现与 text_postprocess 引擎（整段处理和按片段流式处理）的耗时，
+输出一致性由 tests/test_text_postprocess.py 校验。
+
+    cd backend
+    python benchmarks/bench_postprocess.py --chars 2000000 --repeat 5
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import text_postprocess  # noqa: E402
+
+
+def legacy_clean_text(text: str) -> str:
+    text = re.sub(r'(的|啊|嗯|吧|呢|嘛|哦|呃|这个|那个|就是|然后|所以|就是的|就是说|就是说的|就是说啊|就是说呢|就是说嘛|就是说吧|就是说哦|就是说呃|就是说这个|就是说那个|就是说就是)+', r'\1', text)
+    text = re.sub(r'(.)\1{2,}', r'\1', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_add_punctuation(text: str) -> str:
+    text = re.sub(r'([吗吧呢])', r'\1？', text)
+    text = re.sub(r'([啊呀哇])', r'\1！', text)
+    text = re.sub(r'([^。！？\?！\?]{20,})', lambda m: m.group(0) + '。', text)
+    text = re.sub(r'([。！？\?]){2,}', r'\1', text)
+    return text
+
+
+WORDS = ["我们", "今天", "主要", "讨论", "一下", "项目", "进度", "预算", "客户", "反馈", "产品", "质量", "时间",
+         "安排", "会议", "总结", "下周", "计划", "需要", "完成", "测试", "上线", "团队", "成员", "负责", "问题"]
+FILLERS = ["的", "啊", "嗯", "吧", "呢", "这个", "那个", "就是", "然后", "所以", "嗯嗯嗯", "就是说"]
+
+
+def make_transcript(chars: int, filler_ratio: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < chars:
+        r = rng.random()
+        if r < filler_ratio:
+            word = rng.choice(FILLERS)
+        elif r < filler_ratio + 0.05:
+            word = rng.choice(["，", "。", "？", " "])
+        else:
+            word = rng.choice(WORDS)
+        parts.append(word)
+        size += len(word)
+    return "".join(parts)
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def streamed(text: str, chunk: int) -> str:
+    processor = text_postprocess.StreamProcessor()
+    out = [processor.feed(text[i:i + chunk]) for i in range(0, len(text), chunk)]
+    out.append(processor.finish())
+    return "".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chars", type=int, default=1_000_000, help="转写文本字数")
+    parser.add_argument("--filler-ratio", type=float, default=0.08, help="口头禅所占词比例")
+    parser.add_argument("--chunk", type=int, default=400, help="流式处理的片段字数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_transcript(args.chars, args.filler_ratio)
+    legacy_time, _ = timed(lambda: legacy_add_punctuation(legacy_clean_text(text)), args.repeat)
+    engine_time, _ = timed(lambda: text_postprocess.process(text), args.repeat)
+    stream_time, _ = timed(lambda: streamed(text, args.chunk), args.repeat)
+
+    print(f"文本: {len(text)}字, 口头禅比例: {args.filler_ratio}")
+    for name, seconds in (("原正则实现", legacy_time), ("引擎整段处理", engine_time),
+                          (f"引擎流式处理({args.chunk}字/块)", stream_time)):
+        print(f"{name:<24}{seconds * 1000:9.1f} ms  {len(text) / seconds / 1e6:6.2f} M字/秒"
+              f"  x{legacy_time / seconds:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""TextRank摘要的耗时基准
+
+按语速生成指定时长的转写文本，分别测量整体排序和分块排序的耗时。
+
+    cd backend
+    python benchmarks/bench_textrank.py --minutes 180 --repeat 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import textrank  # noqa: E402
+
+WORDS = ["我们", "今天", "主要", "讨论", "一下", "项目", "进度", "预算", "客户", "反馈", "产品", "质量", "时间",
+         "安排", "会议", "总结", "下周", "计划", "需要", "完成", "测试", "上线", "团队", "成员", "负责", "问题",
+         "数据", "分析", "方案", "风险", "资源", "目标", "用户", "体验", "功能", "版本", "发布", "合同", "采购"]
+
+
+def make_transcript(minutes: float, chars_per_minute: int, punctuated: bool, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size, total = [], 0, int(minutes * chars_per_minute)
+    while size < total:
+        sentence = "".join(rng.choice(WORDS) for _ in range(rng.randint(4, 15)))
+        parts.append(sentence + (rng.choice("。。。？！") if punctuated else ""))
+        size += len(parts[-1])
+    return "".join(parts)
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=180, help="录音时长（分钟）")
+    parser.add_argument("--chars-per-minute", type=int, default=250, help="语速（字/分钟）")
+    parser.add_argument("--length", type=int, default=300, help="摘要字数")
+    parser.add_argument("--no-punctuation", action="store_true", help="生成无标点的识别文本")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_transcript(args.minutes, args.chars_per_minute, not args.no_punctuation)
+    sentences = textrank.split_sentences(text)
+    print(f"文本: {len(text)}字, {len(sentences)}句")
+    for name, chunk in (("分块排序", textrank.TEXTRANK_CHUNK_SENTENCES), ("整体排序", len(sentences))):
+        seconds, summary = timed(lambda: textrank.textrank_summary(text, args.length, chunk_sentences=chunk),
+                                 args.repeat)
+        assert 0 < len(summary) <= args.length, "摘要字数超出上限"
+        print(f"{name}(每块{chunk}句){'':<4}{seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import audio, asr, summary, export, history
 from app.api.models import router as models_router
 from app.api.exception_handlers import register_exception_handlers
-from app.db.database import init_db
+from app.db.database import init_db, async_engine
+from app.services import job_queue, asr_jobs, summary_jobs, model_download  # noqa: F401  注册识别、摘要任务处理器
 
 app = FastAPI(title="本地大模型语音识别系统")
 
@@ -17,6 +18,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 初始化数据库
@@ -33,6 +35,23 @@ app.include_router(models_router)
 # 注册全局异常处理
 register_exception_handlers(app)
 
+# 启动任务队列worker，恢复上次未完成的任务
+@app.on_event("startup")
+def start_job_worker():
+    job_queue.start_worker()
+
+@app.on_event("startup")
+async def resume_model_downloads():
+    await model_download.resume_downloads()
+
+@app.on_event("shutdown")
+def stop_job_worker():
+    job_queue.stop_worker()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
+
 @app.get("/")
 def read_root():
     return {"message": "本地大模型语音识别系统后端已启动"}
@@ -0,0 +1,43 @@
+"""测试公共配置
+
+测试使用临时SQLite数据库，不读写仓库中的 app/asr_data.db。在 backend 目录下运行：
+
+    python -m pytest -q
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# 数据库连接串在导入时读取，必须先于 app 模块设置
+os.environ.setdefault("ASR_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='asr-test-'), 'asr.db')}")
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """每个测试独立的数据库，已执行全部迁移，SessionLocal和AsyncSessionLocal都绑定到该库"""
+    from app.db import database
+    path = tmp_path / "test.db"
+    engine = database.create_db_engine(f"sqlite:///{path}")
+    async_engine = database.create_async_db_engine(f"sqlite+aiosqlite:///{path}")
+    database.upgrade(engine)
+    saved = database.engine, database.SessionLocal.kw["bind"], database.AsyncSessionLocal.kw["bind"]
+    database.engine = engine
+    database.SessionLocal.configure(bind=engine)
+    database.AsyncSessionLocal.configure(bind=async_engine)
+    yield engine
+    database.engine = saved[0]
+    database.SessionLocal.configure(bind=saved[1])
+    database.AsyncSessionLocal.configure(bind=saved[2])
+    engine.dispose()
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def db(db_engine):
+    from app.db import database
+    with database.SessionLocal() as session:
+        yield session
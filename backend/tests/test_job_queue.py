@@ -0,0 +1,258 @@
+"""任务队列：抢占领取、租约过期接管、重试上限、单模型并发上限、启动恢复"""
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+import pytest
+from app.db import models
+from app.db.models import Job
+from app.services import job_queue
+
+KIND = "test"
+
+
+class Recorder:
+    """测试用处理器：start返回可由测试完成的Future，记录成功和失败回调"""
+
+    def __init__(self):
+        self.futures = {}
+        self.succeeded = []
+        self.failures = []
+        self.start_error = None
+
+    def start(self, job):
+        if self.start_error:
+            raise self.start_error
+        future = Future()
+        self.futures[job["id"]] = future
+        return future
+
+    def on_success(self, db, job, output):
+        self.succeeded.append((job["id"], output))
+
+    def on_failure(self, db, job, error, final):
+        self.failures.append((job["id"], error, final))
+
+
+@pytest.fixture
+def recorder():
+    recorder = Recorder()
+    job_queue.register_handler(KIND, job_queue.JobHandler(
+        start=recorder.start, on_success=recorder.on_success, on_failure=recorder.on_failure))
+    yield recorder
+    job_queue.HANDLERS.pop(KIND, None)
+
+
+def _enqueue(db, count=1, key=None, **kwargs):
+    jobs = [job_queue.enqueue(db, KIND, i, concurrency_key=key, **kwargs) for i in range(count)]
+    db.commit()
+    return [job.id for job in jobs]
+
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.get(Job, job_id)
+
+
+def test_conditional_update_claims_job_once(db, recorder, monkeypatch):
+    job_id, = _enqueue(db)
+    first, second = job_queue.JobWorker(), job_queue.JobWorker()
+    # 两个worker看到同一个候选任务，只有先执行UPDATE的一个能领取
+    stale = first.select_candidates(db, datetime.utcnow(), 10)
+    monkeypatch.setattr(second, "select_candidates", lambda *args: stale)
+    assert [job["id"] for job in first._claim(1)] == [job_id]
+    assert second._claim(1) == []
+    job = _job(db, job_id)
+    assert job.status == "running" and job.lease_owner == first.worker_id and job.attempts == 1
+
+
+def test_concurrent_workers_never_share_a_job(db, recorder):
+    job_ids = _enqueue(db, 30)
+    workers = [job_queue.JobWorker() for _ in range(6)]
+    claimed = {worker.worker_id: [] for worker in workers}
+    barrier = threading.Barrier(len(workers))
+
+    def claim(worker):
+        barrier.wait()
+        while True:
+            jobs = worker._claim(3)
+            if not jobs:
+                return
+            claimed[worker.worker_id].extend(job["id"] for job in jobs)
+    threads = [threading.Thread(target=claim, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    all_claimed = [job_id for ids in claimed.values() for job_id in ids]
+    assert sorted(all_claimed) == sorted(job_ids)
+    db.expire_all()
+    for owner, ids in claimed.items():
+        assert all(db.get(Job, job_id).lease_owner == owner for job_id in ids)
+
+
+def test_expired_lease_is_taken_over(db, recorder):
+    job_id, = _enqueue(db)
+    first, second = job_queue.JobWorker(), job_queue.JobWorker()
+    job, = first._claim(1)
+    first._run(job)
+    # 第一个worker停止心跳，租约过期后由第二个worker接管
+    db.query(Job).filter(Job.id == job_id).update(
+        {Job.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+    db.commit()
+    second.recover()
+    assert _job(db, job_id).status == "pending"
+    taken, = second._claim(1)
+    assert taken["attempts"] == 2
+    assert _job(db, job_id).lease_owner == second.worker_id
+    # 原worker迟到的结果被丢弃，不覆盖新租约
+    recorder.futures[job_id].set_result("stale")
+    assert recorder.succeeded == []
+    job = _job(db, job_id)
+    assert job.status == "running" and job.lease_owner == second.worker_id
+
+
+def test_heartbeat_keeps_lease(db, recorder, monkeypatch):
+    monkeypatch.setattr(job_queue, "LEASE_SECONDS", 0.3)
+    job_id, = _enqueue(db)
+    worker = job_queue.JobWorker()
+    job, = worker._claim(1)
+    worker._run(job)
+    heartbeat = threading.Thread(target=worker._heartbeat_loop, daemon=True)
+    heartbeat.start()
+    try:
+        threading.Event().wait(0.8)
+        job_queue.JobWorker().recover()
+        assert _job(db, job_id).status == "running"
+    finally:
+        worker.stop()
+        heartbeat.join(2)
+
+
+def test_failure_retries_with_backoff_until_max_attempts(db, recorder):
+    job_id, = _enqueue(db, max_attempts=2)
+    worker = job_queue.JobWorker()
+    recorder.start_error = RuntimeError("boom")
+    worker._run(worker._claim(1)[0])
+    job = _job(db, job_id)
+    assert job.status == "pending" and job.attempts == 1 and job.last_error == "boom"
+    assert job.next_run_at > datetime.utcnow() + timedelta(seconds=job_queue.retry_delay(1) - 1)
+    # 退避期间不会被领取
+    assert worker._claim(1) == []
+    job.next_run_at = datetime.utcnow()
+    db.commit()
+    worker._run(worker._claim(1)[0])
+    job = _job(db, job_id)
+    assert job.status == "failed" and job.attempts == 2
+    assert [final for _, _, final in recorder.failures] == [False, True]
+    assert worker._claim(1) == []
+
+
+def test_concurrency_limit_per_model(db, recorder, monkeypatch):
+    monkeypatch.setattr(job_queue, "QUEUE_MAX_PER_KEY", 2)
+    monkeypatch.setattr(job_queue, "QUEUE_KEY_LIMITS", {"funasr": 1})
+    _enqueue(db, 5, key="whisper")
+    _enqueue(db, 3, key="funasr")
+    first, second = job_queue.JobWorker(), job_queue.JobWorker()
+    claimed = first._claim(10) + second._claim(10)
+    keys = [job["concurrency_key"] for job in claimed]
+    assert keys.count("whisper") == 2 and keys.count("funasr") == 1
+    # 上限是所有worker合计的，一个任务完成后才能再领取同一模型的任务
+    first._run(claimed[0])
+    recorder.futures[claimed[0]["id"]].set_result("ok")
+    again = second._claim(10)
+    assert [job["concurrency_key"] for job in again] == [claimed[0]["concurrency_key"]]
+
+
+def _asr_jobs():
+    # asr_jobs依赖识别模型实现，未安装whisper/funasr时跳过
+    pytest.importorskip("whisper")
+    pytest.importorskip("funasr")
+    from app.services import asr_jobs, asr_service
+    return asr_jobs, asr_service
+
+
+def _add_task(db, status="pending"):
+    audio = models.AudioFile(filename="a.wav", filepath="/nonexistent/a.wav")
+    task = models.ASRTask(audio_file=audio, model_name="whisper", model_params="{}", status=status, progress=0.0)
+    db.add(task)
+    db.commit()
+    return task
+
+
+def test_asr_task_fails_after_max_attempts(db, monkeypatch):
+    asr_jobs, asr_service = _asr_jobs()
+
+    def failing(*args, **kwargs):
+        future = Future()
+        future.set_exception(RuntimeError("decode failed"))
+        return future
+    monkeypatch.setattr(asr_service, "submit_asr_task", failing)
+    task = _add_task(db)
+    job = asr_jobs.enqueue_asr_task(db, task)
+    job.max_attempts = 2
+    db.commit()
+    worker = job_queue.JobWorker()
+    worker._run(worker._claim(1)[0])
+    db.expire_all()
+    assert task.status == "pending" and job.status == "pending"
+    job.next_run_at = datetime.utcnow()
+    db.commit()
+    worker._run(worker._claim(1)[0])
+    db.expire_all()
+    assert job.status == "failed" and job.attempts == 2
+    assert task.status == "failed" and task.finish_time is not None
+
+
+def test_startup_recovers_tasks_stuck_running(db):
+    asr_jobs, _ = _asr_jobs()
+    orphan = _add_task(db, status="running")
+    queued = _add_task(db)
+    asr_jobs.enqueue_asr_task(db, queued)
+    stuck = _add_task(db, status="running")
+    stuck_job = asr_jobs.enqueue_asr_task(db, stuck)
+    stuck_job.status, stuck_job.lease_owner = "running", "dead-worker"
+    stuck_job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    job_queue.JobWorker().recover(startup=True)
+    db.expire_all()
+    jobs = db.query(Job).filter(Job.kind == asr_jobs.JOB_KIND).all()
+    # 没有队列记录的任务补建一条，已有记录的不重复创建
+    assert sorted(job.ref_id for job in jobs) == sorted([orphan.id, queued.id, stuck.id])
+    assert orphan.status == "pending"
+    assert all(job.status == "pending" and job.lease_owner is None for job in jobs)
+
+
+def test_permanent_error_is_not_retried(db, recorder):
+    job_id, = _enqueue(db, max_attempts=3)
+    worker = job_queue.JobWorker()
+    recorder.start_error = job_queue.PermanentError("gone")
+    worker._run(worker._claim(1)[0])
+    job = _job(db, job_id)
+    assert job.status == "failed" and job.attempts == 1
+    assert recorder.failures == [(job_id, "gone", True)]
+
+
+def test_cancel_drops_unfinished_jobs(db, recorder):
+    job_ids = _enqueue(db, 3)
+    worker = job_queue.JobWorker()
+    running = worker._claim(1)[0]
+    worker._run(running)
+    assert job_queue.cancel(db, KIND, [0, 1]) == 2
+    db.commit()
+    assert [job.id for job in db.query(Job).all()] == [job_ids[2]]
+    # 已删除任务的迟到结果直接丢弃
+    recorder.futures[running["id"]].set_result("late")
+    assert recorder.succeeded == []
+
+
+def test_deleted_asr_task_fails_without_retry(db):
+    asr_jobs, _ = _asr_jobs()
+    task = _add_task(db)
+    job = asr_jobs.enqueue_asr_task(db, task)
+    db.commit()
+    db.delete(task)
+    db.commit()
+    worker = job_queue.JobWorker()
+    worker._run(worker._claim(1)[0])
+    db.expire_all()
+    assert job.status == "failed" and job.attempts == 1
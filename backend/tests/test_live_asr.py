@@ -0,0 +1,53 @@
+"""实时识别：解码经执行后端提交，不在WebSocket线程中直接调用共享模型"""
+from concurrent.futures import Future
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def live(monkeypatch):
+    # live_asr依赖识别模型实现，未安装whisper/funasr时跳过
+    pytest.importorskip("whisper")
+    pytest.importorskip("funasr")
+    from app.services import live_asr
+    submitted = []
+
+    class Backend:
+        def submit(self, key, item):
+            segment, post = item
+            submitted.append((key, segment, post))
+            future = Future()
+            future.set_result({"text": "" if not segment.samples.any() else "你好吗", "segments": []})
+            return future
+    monkeypatch.setattr(live_asr, "get_backend", lambda: Backend())
+    return live_asr, submitted
+
+
+def _speech(seconds: float) -> bytes:
+    t = np.arange(int(seconds * 16000)) / 16000
+    return (np.sin(2 * np.pi * 440 * t) * 12000).astype(np.int16).tobytes()
+
+
+def _silence(seconds: float) -> bytes:
+    return np.zeros(int(seconds * 16000), dtype=np.int16).tobytes()
+
+
+def test_decode_goes_through_backend(live):
+    live_asr, submitted = live
+    session = live_asr.LiveSession("whisper", {"punc": "rule"})
+    # 建立会话时预热一次
+    assert len(submitted) == 1 and submitted[0][0] == session.key
+    events = session.feed(_speech(1.0))
+    assert [e["type"] for e in events] == ["partial"]
+    assert submitted[-1][2].mode == "none"
+    events = session.feed(_silence(1.0))
+    final = [e for e in events if e["type"] == "final"]
+    assert final and final[0]["start"] == 0.0
+    assert submitted[-1][1].samples is not None and submitted[-1][2].mode == "rule"
+    assert not hasattr(session, "model")
+
+
+def test_unknown_model(live):
+    live_asr, _ = live
+    with pytest.raises(ValueError):
+        live_asr.LiveSession("no-such-model")
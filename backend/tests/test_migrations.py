@@ -0,0 +1,115 @@
+"""数据库迁移：从版本管理之前的库结构升级到最新版本，重复执行不产生变化"""
+import json
+import sqlite3
+import pytest
+from sqlalchemy import inspect, text
+from app.db import database, migrations
+from app.db.models import Base
+from app.services import search_index
+
+# 版本管理之前（仓库初始提交中 asr_data.db）的表结构
+BASELINE_SCHEMA = """
+CREATE TABLE audio_files (
+    id INTEGER NOT NULL, filename VARCHAR NOT NULL, filepath VARCHAR NOT NULL, duration FLOAT,
+    samplerate INTEGER, upload_time DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE asr_tasks (
+    id INTEGER NOT NULL, audio_file_id INTEGER, model_name VARCHAR NOT NULL, model_params TEXT, status VARCHAR,
+    progress FLOAT, submit_time DATETIME, finish_time DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(audio_file_id) REFERENCES audio_files (id)
+);
+CREATE TABLE asr_results (
+    id INTEGER NOT NULL, task_id INTEGER, recognized_text TEXT, summary TEXT, summary_algo VARCHAR,
+    export_formats VARCHAR, create_time DATETIME, PRIMARY KEY (id), FOREIGN KEY(task_id) REFERENCES asr_tasks (id)
+);
+CREATE TABLE model_info (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, display_name VARCHAR NOT NULL, type VARCHAR NOT NULL,
+    status VARCHAR NOT NULL, local_path VARCHAR, config JSON, version VARCHAR, size INTEGER, create_time DATETIME,
+    update_time DATETIME, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE INDEX ix_audio_files_id ON audio_files (id);
+CREATE INDEX ix_asr_tasks_id ON asr_tasks (id);
+CREATE INDEX ix_asr_results_id ON asr_results (id);
+CREATE INDEX ix_model_info_id ON model_info (id);
+INSERT INTO audio_files (id, filename, filepath) VALUES (1, 'meeting.wav', 'uploads/meeting.wav');
+INSERT INTO asr_tasks (id, audio_file_id, model_name, status, progress) VALUES (1, 1, 'whisper', 'finished', 1.0);
+INSERT INTO asr_results (id, task_id, recognized_text, summary) VALUES (1, 1, '今天讨论项目预算', '预算待定');
+INSERT INTO model_info (id, name, display_name, type, status) VALUES (1, 'whisper', 'Whisper', 'asr', '已下载');
+"""
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    engine = database.create_db_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def _snapshot(engine):
+    with engine.connect() as conn:
+        schema = conn.execute(text("SELECT type, name, sql FROM sqlite_master ORDER BY type, name")).fetchall()
+        versions = conn.execute(text("SELECT version, description, applied_at FROM schema_version "
+                                     "ORDER BY version")).fetchall()
+        indexed = conn.execute(text(f"SELECT rowid, recognized_text, summary FROM {search_index.FTS_TABLE}")).fetchall()
+    return schema, versions, indexed
+
+
+def test_upgrade_from_baseline(baseline_engine):
+    migrations.upgrade(baseline_engine)
+    inspector = inspect(baseline_engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {col["name"] for col in inspector.get_columns(table.name)}
+        assert columns == {col.name for col in table.columns}, table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+    assert {"ix_asr_tasks_status", "ix_asr_tasks_audio_file_id", "ix_asr_results_task_id"} <= \
+        {index["name"] for name in ("asr_tasks", "asr_results") for index in inspector.get_indexes(name)}
+    with baseline_engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0] == 7
+        # 已有的识别结果在建立全文索引时补录
+        assert conn.execute(text(f"SELECT rowid FROM {search_index.FTS_TABLE} WHERE {search_index.FTS_TABLE} "
+                                 f"MATCH :q"), {"q": '"预算"'}).scalars().all() == [1]
+        # 已有数据保留，新增列为空
+        row = conn.execute(text("SELECT model_name, status, segments_done, summary_options FROM asr_tasks")).one()
+        assert tuple(row) == ("whisper", "finished", None, None)
+
+
+def test_upgrade_is_idempotent(baseline_engine):
+    migrations.upgrade(baseline_engine)
+    before = _snapshot(baseline_engine)
+    migrations.upgrade(baseline_engine)
+    assert _snapshot(baseline_engine) == before
+    assert [row[0] for row in before[1]] == [version for version, _, _ in migrations.MIGRATIONS]
+
+
+def test_migrations_can_run_twice(baseline_engine):
+    # 迁移函数本身可重复执行：模拟版本记录丢失后重新执行全部迁移
+    migrations.upgrade(baseline_engine)
+    schema, _, indexed = _snapshot(baseline_engine)
+    with baseline_engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_version"))
+    migrations.upgrade(baseline_engine)
+    after_schema, versions, after_indexed = _snapshot(baseline_engine)
+    assert after_schema == schema and after_indexed == indexed
+    assert versions[-1][0] == 7
+
+
+def test_strip_summary_secrets(baseline_engine):
+    migrations.upgrade(baseline_engine)
+    config = {"model": "qwen", "api_key": "sk-secret"}
+    with baseline_engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_version WHERE version = 7"))
+        conn.execute(text("INSERT INTO summary_tasks (id, task_id, result_id, algo, config, options_key) "
+                          "VALUES (1, 1, 1, 'llm', :config, 'old')"), {"config": json.dumps(config)})
+        conn.execute(text("UPDATE asr_tasks SET summary_options = :options"),
+                     {"options": json.dumps({"algo": "llm", "config": config})})
+    migrations.upgrade(baseline_engine)
+    with baseline_engine.connect() as conn:
+        saved_config, key = conn.execute(text("SELECT config, options_key FROM summary_tasks")).one()
+        options = conn.execute(text("SELECT summary_options FROM asr_tasks")).scalar()
+    assert json.loads(saved_config) == {"model": "qwen"}
+    assert "sk-secret" not in key and "sk-secret" not in options
+    assert json.loads(options) == {"algo": "llm", "config": {"model": "qwen"}}
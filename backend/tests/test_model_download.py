@@ -0,0 +1,241 @@
+"""模型下载：本地http.server替身，覆盖并行分段、断点续传、校验失败、不支持Range和多进程抢锁"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import random
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services import model_download
+from app.db import database
+from app.db.models import ModelInfo
+
+CHUNK = 64 * 1024
+
+
+class FileServer:
+    """提供一个文件，ranges=False时忽略Range头；记录每个请求的Range、发送字节数和最大并发数"""
+
+    def __init__(self, data: bytes, ranges: bool = True, delay: float = 0.0):
+        self.data = data
+        self.requests = []
+        self.bytes_sent = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                header = self.headers.get("Range")
+                match = re.match(r"bytes=(\d+)-(\d*)", header or "") if ranges else None
+                start, end = 0, len(data) - 1
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else end, end)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                with lock:
+                    server.requests.append(header)
+                    server.inflight += 1
+                    server.max_inflight = max(server.max_inflight, server.inflight)
+                try:
+                    if delay:
+                        time.sleep(delay)
+                    self.wfile.write(data[start:end + 1])
+                    with lock:
+                        server.bytes_sent += end - start + 1
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with lock:
+                        server.inflight -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/model.bin"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def ranged_requests(self):
+        # 探测请求只取第一个字节
+        return [r for r in self.requests if r and r != "bytes=0-0"]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def data():
+    return random.Random(0).randbytes(CHUNK * 8 + 123)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(model_download, "DOWNLOAD_CHUNK_SIZE", CHUNK)
+    monkeypatch.setattr(model_download, "DOWNLOAD_CONNECTIONS", 4)
+    monkeypatch.setattr(model_download, "DOWNLOAD_RETRY_BASE", 0.01)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(FileServer(*args, **kwargs))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_parallel_ranges(tmp_path, data, serve):
+    server = serve(data, delay=0.05)
+    path = str(tmp_path / "model.bin")
+    size, digest = asyncio.run(model_download.download(server.url, path, hashlib.sha256(data).hexdigest()))
+    assert size == len(data)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert _read(path) == data
+    assert len(server.ranged_requests()) == 9
+    assert server.max_inflight > 1
+    assert os.listdir(tmp_path) == ["model.bin"]
+
+
+def test_resume_skips_finished_chunks(tmp_path, data, serve):
+    server = serve(data)
+    path = str(tmp_path / "model.bin")
+    part_path, state_path = model_download.partial_paths(path)
+    done = [0, 1, 2, 3]
+    with open(part_path, "wb") as f:
+        f.write(data[:CHUNK * len(done)])
+        f.truncate(len(data))
+    with open(state_path, "w") as f:
+        json.dump({"url": server.url, "size": len(data), "done": done}, f)
+    asyncio.run(model_download.download(server.url, path))
+    assert _read(path) == data
+    assert len(server.ranged_requests()) == 9 - len(done)
+    assert server.bytes_sent - 1 == len(data) - CHUNK * len(done)
+    assert not os.path.exists(part_path) and not os.path.exists(state_path)
+
+
+def test_resume_ignores_state_for_other_url(tmp_path, data, serve):
+    server = serve(data)
+    path = str(tmp_path / "model.bin")
+    part_path, state_path = model_download.partial_paths(path)
+    with open(part_path, "wb") as f:
+        f.truncate(len(data))
+    with open(state_path, "w") as f:
+        json.dump({"url": "http://example.invalid/other.bin", "size": len(data), "done": [0, 1]}, f)
+    asyncio.run(model_download.download(server.url, path))
+    assert _read(path) == data
+    assert len(server.ranged_requests()) == 9
+
+
+def test_sha256_mismatch_removes_partial_files(tmp_path, data, serve):
+    server = serve(data)
+    path = str(tmp_path / "model.bin")
+    with pytest.raises(model_download.DownloadError):
+        asyncio.run(model_download.download(server.url, path, "0" * 64))
+    assert os.listdir(tmp_path) == []
+
+
+def test_without_range_support_uses_one_stream(tmp_path, data, serve):
+    server = serve(data, ranges=False)
+    path = str(tmp_path / "model.bin")
+    asyncio.run(model_download.download(server.url, path, hashlib.sha256(data).hexdigest()))
+    assert _read(path) == data
+    # 探测请求 + 一次完整下载
+    assert len(server.requests) == 2
+    assert os.listdir(tmp_path) == ["model.bin"]
+
+
+def _hold_lock_worker(local_path, result, acquired, release):
+    fd = model_download._try_lock(local_path)
+    result.value = fd is not None
+    acquired.set()
+    release.wait(30)
+
+
+@pytest.mark.skipif(model_download.fcntl is None, reason="需要fcntl")
+def test_lock_is_exclusive_across_processes(tmp_path):
+    path = str(tmp_path / "m" / "model.bin")
+    ctx = multiprocessing.get_context("spawn")
+    result, acquired, release = ctx.Value("b", False), ctx.Event(), ctx.Event()
+    holder = ctx.Process(target=_hold_lock_worker, args=(path, result, acquired, release))
+    holder.start()
+    try:
+        assert acquired.wait(30)
+        assert result.value
+        # 另一个进程持有锁时拿不到
+        assert model_download._try_lock(path) is None
+    finally:
+        release.set()
+        holder.join(30)
+    # 持有锁的进程退出后由操作系统释放
+    fd = model_download._try_lock(path)
+    assert fd is not None
+    os.close(fd)
+
+
+def _add_model(path, url, sha256=None):
+    with database.SessionLocal() as session:
+        model = ModelInfo(name=os.path.basename(os.path.dirname(path)), display_name="test", type="asr",
+                          status=model_download.STATUS_DOWNLOADING, local_path=path, remote_url=url, sha256=sha256)
+        session.add(model)
+        session.commit()
+        return model.id
+
+
+def _status(model_id):
+    with database.SessionLocal() as session:
+        return session.get(ModelInfo, model_id).status
+
+
+@pytest.mark.skipif(model_download.fcntl is None, reason="需要fcntl")
+def test_run_skips_download_locked_by_other_process(tmp_path, data, serve, db_engine):
+    server = serve(data)
+    path = str(tmp_path / "m" / "model.bin")
+    model_id = _add_model(path, server.url)
+    ctx = multiprocessing.get_context("spawn")
+    result, acquired, release = ctx.Value("b", False), ctx.Event(), ctx.Event()
+    holder = ctx.Process(target=_hold_lock_worker, args=(path, result, acquired, release))
+    holder.start()
+    try:
+        assert acquired.wait(30) and result.value
+        asyncio.run(model_download._run(model_id, server.url, path, None))
+        assert server.requests == []
+        assert _status(model_id) == model_download.STATUS_DOWNLOADING
+    finally:
+        release.set()
+        holder.join(30)
+    asyncio.run(model_download._run(model_id, server.url, path, None))
+    assert _status(model_id) == model_download.STATUS_READY
+    assert _read(path) == data
+    assert os.listdir(os.path.dirname(path)) == ["model.bin"]
+
+
+def test_run_removes_lock_file_after_failure(tmp_path, data, serve, db_engine):
+    server = serve(data)
+    path = str(tmp_path / "m" / "model.bin")
+    model_id = _add_model(path, server.url, "0" * 64)
+    asyncio.run(model_download._run(model_id, server.url, path, "0" * 64))
+    assert _status(model_id) == model_download.STATUS_FAILED
+    assert os.listdir(os.path.dirname(path)) == []
@@ -0,0 +1,33 @@
+"""识别进度：节流上报，最后一个片段完成时必定上报；短音频同样按片段上报"""
+from concurrent.futures import Future
+import pytest
+from app.services.progress import ProgressTracker
+
+
+def test_last_segment_is_always_reported():
+    events = []
+    tracker = ProgressTracker(events.append, duration=30.0, interval=3600)
+    tracker.start()
+    tracker.set_total(3)
+    for _ in range(3):
+        tracker.segment_done(10.0)
+    # 中间片段被节流，最后一个片段强制上报
+    assert [e["segments_done"] for e in events] == [0, 0, 3]
+    assert events[-1]["segments_total"] == 3
+    assert events[-1]["processed_seconds"] == 30.0
+    assert events[-1]["progress"] == 0.99
+
+
+def test_short_audio_reports_one_segment(monkeypatch):
+    pytest.importorskip("whisper")
+    pytest.importorskip("funasr")
+    from app.services import asr_service, punctuation
+    recognized = Future()
+    monkeypatch.setattr(asr_service, "probe_duration", lambda path: 4.0)
+    monkeypatch.setattr(asr_service, "_recognize", lambda key, post, item: recognized)
+    events, result = [], Future()
+    asr_service._run_pipeline(("whisper", "{}"), punctuation.PostConfig(), "a.wav", result, events.append, None)
+    assert events[-1]["segments_total"] == 1 and events[-1]["segments_done"] == 0
+    recognized.set_result({"text": "好", "segments": []})
+    assert result.result(timeout=5)["text"] == "好"
+    assert events[-1]["segments_done"] == 1 and events[-1]["processed_seconds"] == 4.0
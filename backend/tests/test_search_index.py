@@ -0,0 +1,114 @@
+"""全文检索：中日韩二元组、单字前缀、短语和英文查询，以及ORM写入时的索引维护"""
+import pytest
+from sqlalchemy import text
+from app.db import models
+from app.services import search_index
+
+TEXTS = [
+    "今天我们讨论项目进度和预算安排",
+    "客户反馈产品质量问题，需要尽快修复",
+    "项目上线时间推迟到下周",
+    "The Quarterly Budget review meeting",
+]
+
+
+@pytest.fixture
+def results(db):
+    rows = []
+    for i, content in enumerate(TEXTS):
+        task = models.ASRTask(model_name="whisper" if i % 2 == 0 else "funasr", status="finished")
+        result = models.ASRResult(task=task, recognized_text=content)
+        db.add(result)
+        rows.append(result)
+    db.commit()
+    return rows
+
+
+def _ids(db, query, **kwargs):
+    return sorted(item["result_id"] for item in search_index.search(db, query, **kwargs)["items"])
+
+
+def test_cjk_bigrams(db, results):
+    assert _ids(db, "项目") == [results[0].id, results[2].id]
+    assert _ids(db, "项目进度") == [results[0].id]
+    # 两个词都出现但在原文中不相连时不算命中
+    assert _ids(db, "项目预算") == []
+    assert _ids(db, "进度 预算") == [results[0].id]
+    assert _ids(db, "进度 上线") == []
+
+
+def test_single_char_prefix(db, results):
+    # 单字查询匹配以该字开头的二元组，也能匹配到每段末尾的字
+    assert _ids(db, "项") == [results[0].id, results[2].id]
+    assert _ids(db, "排") == [results[0].id]
+    assert _ids(db, "复") == [results[1].id]
+
+
+def test_phrase(db, results):
+    assert _ids(db, '"项目上线"') == [results[2].id]
+    assert _ids(db, '"上线项目"') == []
+    assert _ids(db, '"budget review"') == [results[3].id]
+    assert _ids(db, '"review budget"') == []
+
+
+def test_latin_words(db, results):
+    assert _ids(db, "budget") == [results[3].id]
+    assert _ids(db, "QUARTERLY meeting") == [results[3].id]
+    assert _ids(db, "budge") == []
+    found = search_index.search(db, "budget")["items"][0]
+    assert found["snippet"] == "The Quarterly <mark>Budget</mark> review meeting"
+
+
+def test_filters(db, results):
+    assert _ids(db, "项目", model_name="whisper") == [results[0].id, results[2].id]
+    assert _ids(db, "项目", model_name="funasr") == []
+    assert _ids(db, "项目", field="summary") == []
+
+
+def test_summary_update_is_reindexed(db, results):
+    result = results[1]
+    result.summary = "质量问题已经定位"
+    db.commit()
+    assert _ids(db, "定位") == [result.id]
+    assert _ids(db, "定位", field="summary") == [result.id]
+    assert _ids(db, "定位", field="text") == []
+    result.summary = "改为下个版本处理"
+    db.commit()
+    assert _ids(db, "定位") == []
+    assert _ids(db, "版本") == [result.id]
+
+
+def test_text_update_is_reindexed(db, results):
+    result = results[0]
+    result.recognized_text = "会议改期"
+    db.commit()
+    assert _ids(db, "预算") == []
+    assert _ids(db, "改期") == [result.id]
+
+
+def test_delete_removes_from_index(db, results):
+    result_id = results[2].id
+    db.delete(results[2])
+    db.commit()
+    assert _ids(db, "上线") == []
+    assert _ids(db, "项目") == [results[0].id]
+    count = db.execute(text(f"SELECT count(*) FROM {search_index.FTS_TABLE} WHERE rowid = :id"),
+                       {"id": result_id}).scalar()
+    assert count == 0
+
+
+def test_rebuild_after_bulk_update(db, results):
+    # 批量update不经过ORM事件，索引不会更新，需要重建
+    db.query(models.ASRResult).filter(models.ASRResult.id == results[0].id).update(
+        {models.ASRResult.recognized_text: "会议改期"}, synchronize_session=False)
+    db.commit()
+    assert _ids(db, "改期") == []
+    search_index.rebuild_index(db.connection())
+    db.commit()
+    assert _ids(db, "改期") == [results[0].id]
+    assert _ids(db, "预算") == []
+
+
+def test_empty_query(db, results):
+    with pytest.raises(ValueError):
+        search_index.search(db, ' "" ')
@@ -0,0 +1,32 @@
+"""摘要：大模型摘要失败时的提示格式，配置错误的后台摘要任务不重试"""
+import asyncio
+import pytest
+from app.db import models
+from app.db.models import Job
+from app.services import job_queue, summary_jobs, summary_service
+
+
+@pytest.fixture
+def no_doubao_key(monkeypatch):
+    monkeypatch.delenv("DOUBAO_API_KEY", raising=False)
+
+
+def test_missing_key_uses_provider_prefix(no_doubao_key):
+    expected = "[豆包摘要失败]豆包API密钥未配置"
+    assert summary_service.generate_summary("文本", "doubao") == expected
+    assert asyncio.run(summary_service.generate_summary_async("文本", "doubao")) == expected
+
+
+def test_missing_key_fails_summary_job_at_once(db, no_doubao_key):
+    task = models.ASRTask(model_name="whisper", status="finished")
+    task.result = models.ASRResult(recognized_text="今天讨论项目预算")
+    db.add(task)
+    db.flush()
+    summary_task = summary_jobs.create_summary_task(db, task, "doubao")
+    db.commit()
+    worker = job_queue.JobWorker()
+    worker._run(worker._claim(1)[0])
+    db.expire_all()
+    job = db.query(Job).filter(Job.kind == summary_jobs.JOB_KIND).one()
+    assert job.status == "failed" and job.attempts == 1
+    assert summary_task.status == "failed" and summary_task.error == "豆包API密钥未配置"
@@ -0,0 +1,103 @@
+"""识别文本后处理：整段处理和任意分块的流式处理，输出都必须与原先的多遍正则实现一致"""
+import random
+import re
+import pytest
+from app.services import text_postprocess
+
+
+# 原先 asr_service 中的 clean_text / add_punctuation，作为对照基准
+def baseline_clean_text(text: str) -> str:
+    text = re.sub(r'(的|啊|嗯|吧|呢|嘛|哦|呃|这个|那个|就是|然后|所以|就是的|就是说|就是说的|就是说啊|就是说呢|就是说嘛|就是说吧|就是说哦|就是说呃|就是说这个|就是说那个|就是说就是)+', r'\1', text)
+    text = re.sub(r'(.)\1{2,}', r'\1', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def baseline_add_punctuation(text: str) -> str:
+    text = re.sub(r'([吗吧呢])', r'\1？', text)
+    text = re.sub(r'([啊呀哇])', r'\1！', text)
+    text = re.sub(r'([^。！？\?！\?]{20,})', lambda m: m.group(0) + '。', text)
+    text = re.sub(r'([。！？\?]){2,}', r'\1', text)
+    return text
+
+
+MODES = {
+    "all": (dict(), lambda text: baseline_add_punctuation(baseline_clean_text(text))),
+    "clean": (dict(punctuate=False), baseline_clean_text),
+    "punctuate": (dict(clean=False), baseline_add_punctuation),
+}
+
+EDGE_CASES = [
+    "",
+    "   ",
+    # 口头禅跨块："就是"+"说"，"这"+"个"，连续口头禅只保留最后一个
+    "我们就是说然后这个那个项目进度",
+    "就是就是就是说就是说的",
+    "嗯嗯嗯啊啊好的的的",
+    # 重复字跨块，恰好两个不合并
+    "好好好好好的，对对，哈哈哈哈",
+    "。。。！！？？??",
+    # 20字断句：19字、20字、21字，以及长片段后已有句末标点
+    "一二三四五六七八九十一二三四五六七八九",
+    "一二三四五六七八九十一二三四五六七八九十",
+    "一二三四五六七八九十一二三四五六七八九十一",
+    "一二三四五六七八九十一二三四五六七八九十一二。后面还有内容",
+    "问题吗好的吧走呢快啊来呀哇",
+    "  开头 有\t空白\n\n和  换行   ",
+]
+
+WORDS = ["我们", "今天", "讨论", "项目", "进度", "预算", "客户", "反馈", "测试", "上线", "好好", "对"]
+FILLERS = ["的", "啊", "嗯", "吧", "呢", "吗", "呀", "这个", "那个", "就是", "就是说", "然后", "所以", "嗯嗯嗯"]
+MARKS = ["，", "。", "？", "！", "?", " ", "  ", "\n"]
+
+
+def make_transcript(seed: int, words: int = 400) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(words):
+        r = rng.random()
+        parts.append(rng.choice(FILLERS) if r < 0.3 else rng.choice(MARKS) if r < 0.4 else rng.choice(WORDS))
+    return "".join(parts)
+
+
+def streamed(text: str, chunk: int, **options) -> str:
+    processor = text_postprocess.StreamProcessor(**options)
+    out = [processor.feed(text[i:i + chunk]) for i in range(0, len(text), chunk)]
+    out.append(processor.finish())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_edge_cases_every_split(mode, text):
+    options, baseline = MODES[mode]
+    expected = baseline(text)
+    assert text_postprocess.process(text, "zh", **options) == expected
+    # 每一种分块大小都覆盖到，保证每个边界位置都被切开过
+    for chunk in range(1, len(text) + 1):
+        assert streamed(text, chunk, **options) == expected, chunk
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("seed", range(5))
+def test_random_transcripts(mode, seed):
+    options, baseline = MODES[mode]
+    text = make_transcript(seed)
+    expected = baseline(text)
+    assert text_postprocess.process(text, "zh", **options) == expected
+    for chunk in (1, 2, 3, 7, 20, 64, len(text)):
+        assert streamed(text, chunk, **options) == expected, chunk
+
+
+def test_uneven_chunks():
+    text = make_transcript(42)
+    expected = MODES["all"][1](text)
+    rng = random.Random(42)
+    processor = text_postprocess.StreamProcessor()
+    out, i = [], 0
+    while i < len(text):
+        size = rng.randint(0, 9)
+        out.append(processor.feed(text[i:i + size]))
+        i += size
+    out.append(processor.finish())
+    assert "".join(out) == expected